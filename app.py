@@ -1,10 +1,34 @@
 #!/usr/bin/env python3
 
-from flask import Flask, request, jsonify, abort
-from flask_migrate import Migrate
+import click
+from flask import Flask, request, jsonify, abort, make_response
+from flask.cli import ScriptInfo
 from flask_restful import Api, Resource
-from models import db, Hero, Power, HeroPower
+from models import db, Hero, Power, STRENGTHS
+from pagination import list_response
+from serializers import HERO, POWER, HERO_POWER, run
+from loading import load
+import cache
+import coalescing
+import compression
+import encoding
+import idempotency
+import listing
+import versions
+import bulk
+import seeding
+import metrics
+import serving
+import search
+import stats
+import transfer
+import readmodel
+import routing
+from pagination import NDJSON_MIMETYPE
+import atexit
 import os
+import shutil
+import tempfile
 
 # Configuration
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -12,38 +36,100 @@ DATABASE = os.environ.get(
     "DB_URI", f"sqlite:///{os.path.join(BASE_DIR, 'app.db')}"
 )
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.json.compact = False
+def configure(app, database_uri):
+    """Load the settings of ``app`` from the environment, for the database at ``database_uri``."""
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Read replicas for the GETs of heroes and powers, e.g.
+    # DB_REPLICA_URIS=sqlite:///replica1.db,sqlite:///replica2.db
+    app.config['SQLALCHEMY_BINDS'] = routing.replica_binds(os.environ.get("DB_REPLICA_URIS", ""))
+    app.config['READ_YOUR_WRITES_WINDOW'] = float(os.environ.get("READ_YOUR_WRITES_WINDOW", 5))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = serving.engine_options(
+        database_uri,
+        pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        pool_pre_ping=os.environ.get("DB_POOL_PRE_PING", "1") == "1",
+        pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 3600)),
+    )
+    app.config['SQLITE_TUNING'] = os.environ.get("SQLITE_TUNING", "1") == "1"
+    app.config['JSON_BACKEND'] = os.environ.get("JSON_BACKEND")
+    app.config['MAX_PAGE_SIZE'] = int(os.environ.get("MAX_PAGE_SIZE", 1000))
+    app.config['STREAM_BATCH_SIZE'] = int(os.environ.get("STREAM_BATCH_SIZE", 500))
+    app.config['LOADING_POLICIES'] = {
+        'hero_detail': os.environ.get("HERO_LOADING_POLICY", "join"),
+        'power_detail': os.environ.get("POWER_LOADING_POLICY", "join"),
+    }
+    app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get("RESPONSE_CACHE_SIZE", 1024))
+    app.config['RESPONSE_CACHE_TTL'] = float(os.environ.get("RESPONSE_CACHE_TTL", 60))
+    app.config['COALESCE_ENABLED'] = os.environ.get("COALESCE_ENABLED", "1") == "1"
+    app.config['COALESCE_TIMEOUT'] = float(os.environ.get("COALESCE_TIMEOUT", 10))
+    app.config['VERSION_SNAPSHOT_TTL'] = float(os.environ.get("VERSION_SNAPSHOT_TTL", 1))
+    app.config['IDEMPOTENCY_TTL'] = int(os.environ.get("IDEMPOTENCY_TTL", 24 * 60 * 60))
+    app.config['BULK_MAX_ITEMS'] = int(os.environ.get("BULK_MAX_ITEMS", 50000))
+    app.config['READ_MODEL_ENABLED'] = os.environ.get("READ_MODEL_ENABLED", "1") == "1"
+    app.config['READ_MODEL_REFRESH_LIMIT'] = int(os.environ.get("READ_MODEL_REFRESH_LIMIT", 10000))
+    app.config['STATS_TOP_POWERS'] = int(os.environ.get("STATS_TOP_POWERS", 10))
+    app.config['SEARCH_PAGE_SIZE'] = int(os.environ.get("SEARCH_PAGE_SIZE", 20))
+    app.config['COMPRESSION_ENABLED'] = os.environ.get("COMPRESSION_ENABLED", "1") == "1"
+    app.config['COMPRESSION_MIN_SIZE'] = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+    app.config['COMPRESSION_GZIP_LEVEL'] = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+    app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 4))
+    app.config['METRICS_ENABLED'] = os.environ.get("METRICS_ENABLED", "1") == "1"
+    app.config['METRICS_QUERY_LOG_THRESHOLD'] = int(os.environ.get("METRICS_QUERY_LOG_THRESHOLD", 50))
 
-# Initialize extensions
-db.init_app(app)
-migrate = Migrate(app, db)
-api = Api(app)
+def testing_config():
+    """Settings of the test suite.
+
+    Each process gets an empty database file of its own, on tmpfs when there
+    is one, deleted at exit, so runs neither share nor accumulate data. An
+    in-memory SQLite database would not do: the threaded and ASGI tests open
+    several connections, and each would see a database of its own.
+    """
+    uri = os.environ.get("TEST_DB_URI")
+    if uri is None:
+        directory = tempfile.mkdtemp(prefix='superheroes-test-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+        atexit.register(shutil.rmtree, directory, ignore_errors=True)
+        uri = f"sqlite:///{os.path.join(directory, 'app.db')}"
+    return {'TESTING': True, 'SQLALCHEMY_DATABASE_URI': uri}
+
+# Settings selected by APP_CONFIG
+CONFIGS = {
+    'testing': testing_config,
+}
 
 # Define Resource Classes
 class HeroResource(Resource):
+    method_decorators = {'get': [coalescing.coalesced('heroes'), cache.cached('heroes'),
+                                 versions.conditional('heroes'), routing.replica_reads]}
+
     def get(self, id=None):
         if id:
-            hero = Hero.query.get(id)
+            if readmodel.read_model.enabled:
+                response = readmodel.document_response(id)
+                if response is not None:
+                    return response
+            hero = load('hero_detail', HERO, id)
             if hero is None:
                 abort(404, description="Hero not found")
-            return jsonify(hero.to_dict())
+            return jsonify(hero)
         else:
-            heroes = Hero.query.all()
-            return jsonify([hero.to_dict() for hero in heroes])
+            return list_response(*listing.list_query(HERO))
 
 class PowerResource(Resource):
+    method_decorators = {'get': [coalescing.coalesced(listing.resource('powers')),
+                                 cache.cached(listing.resource('powers')),
+                                 versions.conditional(listing.resource('powers')),
+                                 routing.replica_reads],
+                         'patch': [routing.sticky_writes]}
+
     def get(self, id=None):
         if id:
-            power = Power.query.get(id)
+            power = load('power_detail', POWER, id)
             if power is None:
                 abort(404, description="Power not found")
-            return jsonify(power.to_dict())
+            return jsonify(power)
         else:
-            powers = Power.query.all()
-            return jsonify([power.to_dict() for power in powers])
+            return list_response(*listing.list_query(POWER))
 
     def patch(self, id):
         power = Power.query.get(id)
@@ -58,13 +144,61 @@ class PowerResource(Resource):
                 abort(400, description="Description must be at least 20 characters long.")
             power.description = description
             db.session.commit()
-            return jsonify(power.to_dict())
+            return jsonify(POWER.dump_object(power))
         else:
             abort(400, description="Description field is required.")
 
+class HeroSearchResource(Resource):
+    method_decorators = {'get': [coalescing.coalesced('heroes'), cache.cached('heroes'),
+                                 versions.conditional('heroes')]}
+
+    def get(self):
+        return search.search_response(HERO)
+
+class PowerSearchResource(Resource):
+    method_decorators = {'get': [coalescing.coalesced('powers'), cache.cached('powers'),
+                                 versions.conditional('powers')]}
+
+    def get(self):
+        return search.search_response(POWER)
+
+class StatsResource(Resource):
+    method_decorators = {'get': [coalescing.coalesced('stats'), cache.cached('stats'),
+                                 versions.conditional('stats')]}
+
+    def get(self):
+        return stats.summary_response()
+
+class PowerStatsResource(Resource):
+    method_decorators = {'get': [coalescing.coalesced('stats'), cache.cached('stats'),
+                                 versions.conditional('stats')]}
+
+    def get(self, id=None):
+        return stats.power_stats_response(id)
+
+class TopPowersResource(Resource):
+    method_decorators = {'get': [coalescing.coalesced('stats'), cache.cached('stats'),
+                                 versions.conditional('stats')]}
+
+    def get(self):
+        return stats.top_powers_response()
+
 class HeroPowerResource(Resource):
+    method_decorators = {'get': [coalescing.coalesced('hero_powers'), cache.cached('hero_powers'),
+                                 versions.conditional('hero_powers')],
+                         'post': [idempotency.idempotent, routing.sticky_writes]}
+
+    def get(self):
+        return list_response(*listing.list_query(HERO_POWER))
+
     def post(self):
+        # Bulk mode: a JSON array or an NDJSON body of hero_powers
+        if request.mimetype == NDJSON_MIMETYPE:
+            return bulk.create_hero_powers(bulk.parse_ndjson())
         data = request.get_json()
+        if isinstance(data, list):
+            return bulk.create_hero_powers(data)
+
         hero_id = data.get('hero_id')
         power_id = data.get('power_id')
         strength = data.get('strength')
@@ -78,41 +212,109 @@ class HeroPowerResource(Resource):
         if not hero or not power:
             abort(404, description="Hero or Power not found")
 
-        if strength not in ['Strong', 'Weak', 'Average']:
+        if strength not in STRENGTHS:
             abort(400, description="Invalid strength value")
 
         try:
-            hero_power = HeroPower(hero_id=hero_id, power_id=power_id, strength=strength)
-            db.session.add(hero_power)
+            # An existing link is updated in place, so retries never duplicate it
+            written = run(bulk.plan_upsert([{'hero_id': hero.id, 'power_id': power.id, 'strength': strength}],
+                                           db.engine.dialect.name))
+            # Dumped before the commit expires the loaded hero and power
+            hero_power = HERO_POWER.dump_returned(written[hero.id, power.id], hero=hero, power=power)
             db.session.commit()
-            return jsonify(hero_power.to_dict()), 201
+            return make_response(jsonify(hero_power), 201)
         except Exception as e:
             db.session.rollback()
             abort(500, description=f"Server error: {str(e)}")
 
-# Add Resource Routes
-api.add_resource(HeroResource, '/heroes', '/heroes/<int:id>')
-api.add_resource(PowerResource, '/powers', '/powers/<int:id>')
-api.add_resource(HeroPowerResource, '/hero_powers')
+class MigrateGroup(click.Group):
+    """The ``flask db`` commands of Flask-Migrate.
+
+    Importing Flask-Migrate loads Alembic, which only db commands use, so it
+    is imported when one runs rather than on every start.
+    """
+
+    def migrate_commands(self, ctx):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as commands
+
+        app = ctx.ensure_object(ScriptInfo).load_app()
+        if 'migrate' not in app.extensions:
+            Migrate(app, db, include_object=search.include_object)
+        return commands
+
+    def list_commands(self, ctx):
+        return self.migrate_commands(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.migrate_commands(ctx).get_command(ctx, name)
+
+# Resource Routes
+ROUTES = [
+    (HeroResource, '/heroes', '/heroes/<int:id>'),
+    (PowerResource, '/powers', '/powers/<int:id>'),
+    (HeroSearchResource, '/heroes/search'),
+    (PowerSearchResource, '/powers/search'),
+    (StatsResource, '/stats'),
+    (PowerStatsResource, '/stats/powers', '/stats/powers/<int:id>'),
+    (TopPowersResource, '/stats/powers/top'),
+    (HeroPowerResource, '/hero_powers'),
+]
 
 # Default Route
-@app.route('/')
 def index():
     return '<h1>Code challenge</h1>'
 
 # Error handling
-@app.errorhandler(404)
 def not_found_error(error):
     return jsonify({'error': str(error)}), 404
 
-@app.errorhandler(400)
 def bad_request_error(error):
     return jsonify({'error': str(error)}), 400
 
-@app.errorhandler(500)
 def internal_server_error(error):
     return jsonify({'error': str(error)}), 500
 
+def create_app(config=None):
+    """Create the application from the environment's settings updated with ``config``.
+
+    Extensions keep their settings in module-level objects, so the app
+    created last in a process configures them.
+    """
+    config = dict(config or {})
+    app = Flask(__name__)
+    configure(app, config.get('SQLALCHEMY_DATABASE_URI', DATABASE))
+    app.config.update(config)
+
+    # Initialize extensions
+    encoding.init_app(app)
+    db.init_app(app)
+    serving.init_app(app)
+    routing.init_app(app)
+    metrics.init_app(app)
+    app.cli.add_command(MigrateGroup('db', help="Perform database migrations."))
+    cache.init_app(app)
+    coalescing.init_app(app)
+    compression.init_app(app)
+    versions.init_app(app)
+    seeding.init_app(app)
+    search.init_app(app)
+    readmodel.init_app(app)
+    stats.init_app(app)
+    idempotency.init_app(app)
+    transfer.init_app(app)
+
+    api = Api(app)
+    for resource, *urls in ROUTES:
+        api.add_resource(resource, *urls)
+    app.add_url_rule('/', view_func=index)
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(400, bad_request_error)
+    app.register_error_handler(500, internal_server_error)
+    return app
+
+app = create_app(CONFIGS[os.environ["APP_CONFIG"]]() if os.environ.get("APP_CONFIG") else None)
+
 # Run the application
 if __name__ == '__main__':
     app.run(port=5555, debug=True)
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""ASGI entry point serving the routes and JSON contracts of app.py.
+
+Queries run on SQLAlchemy's asyncio extension (aiosqlite for SQLite) through
+the same loading plans as the WSGI app, so both modes return identical bodies:
+
+    uvicorn asgi:application --port 5555
+
+Detail endpoints always use the single-join plan, since the ORM loading
+policies rely on lazy loads that an AsyncSession cannot perform. GETs of
+heroes and powers read from the replicas of routing.py like the WSGI app. The response
+cache, request coalescing, conditional GETs, compression and /metrics are only
+served by the WSGI app.
+"""
+import json
+import re
+from functools import partial
+from urllib.parse import parse_qsl
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from werkzeug.datastructures import MIMEAccept, MultiDict
+from werkzeug.exceptions import BadRequest, HTTPException, InternalServerError, MethodNotAllowed, NotFound
+from werkzeug.http import parse_accept_header, parse_cookie
+
+import bulk
+import idempotency
+from app import app as flask_app
+from listing import list_query
+from models import Hero, Power, STRENGTHS
+from pagination import (DEFAULT_MAX_PAGE_SIZE, DEFAULT_STREAM_BATCH_SIZE, NDJSON_MIMETYPE,
+                        encode_cursor, next_page_url, parse_limit, stream_format, wants_pagination)
+from serializers import HERO, POWER, HERO_POWER, run_async
+from readmodel import document_statement, read_model, render
+from search import DEFAULT_SEARCH_PAGE_SIZE, plan_search, search_page_args
+from stats import DEFAULT_TOP_POWERS, plan_power_stats, plan_summary, plan_top_powers, require_triggers
+from serving import DEFAULT_SQLITE_PRAGMAS, apply_sqlite_pragmas
+from routing import prepare_replica, router
+
+# Async drivers for the sync database URLs app.py is configured with
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+    'mysql+pymysql': 'mysql+aiomysql',
+}
+
+
+def async_url(uri):
+    url = make_url(uri)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+class Request:
+    """The parts of an ASGI HTTP request the handlers need."""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope['headers']}
+        self.accept_mimetypes = parse_accept_header(self.headers.get('accept'), MIMEAccept)
+        self.mimetype = self.headers.get('content-type', '').split(';')[0].strip().lower()
+        self.cookies = parse_cookie(self.headers.get('cookie'))
+        self._receive = receive
+        self._body = None
+
+    @property
+    def base_url(self):
+        host = self.headers.get('host')
+        if host is None:
+            server = self.scope.get('server') or ('localhost', 80)
+            host = f'{server[0]}:{server[1]}'
+        return f"{self.scope.get('scheme', 'http')}://{host}{self.scope.get('root_path', '')}{self.path}"
+
+    async def get_data(self):
+        if self._body is None:
+            body = b''
+            while True:
+                message = await self._receive()
+                body += message.get('body', b'')
+                if not message.get('more_body'):
+                    break
+            self._body = body
+        return self._body
+
+    async def get_json(self):
+        # Same rules as flask.Request.get_json outside debug mode
+        if not (self.mimetype == 'application/json'
+                or (self.mimetype.startswith('application/') and self.mimetype.endswith('+json'))):
+            raise BadRequest()
+        try:
+            return flask_app.json.loads(await self.get_data())
+        except ValueError:
+            raise BadRequest()
+
+
+class Response:
+    def __init__(self, body=b'', status=200, content_type='application/json', headers=()):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.status = status
+        self.headers = [('content-type', content_type), *headers]
+
+    def raw_headers(self):
+        return [(name.lower().encode('latin-1'), str(value).encode('latin-1')) for name, value in self.headers]
+
+    async def __call__(self, send):
+        headers = self.raw_headers() + [(b'content-length', str(len(self.body)).encode())]
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': self.body})
+
+class StreamingResponse(Response):
+    def __init__(self, chunks, status=200, content_type='application/json', headers=()):
+        super().__init__(b'', status, content_type, headers)
+        self.chunks = chunks
+
+    async def __call__(self, send):
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': self.raw_headers()})
+        async for chunk in self.chunks:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+class Application:
+    """ASGI application serving the routes of app.py on an async engine."""
+
+    def __init__(self, database_uri=None, config=None, **engine_options):
+        self.config = flask_app.config if config is None else config
+        uri = database_uri or self.config['SQLALCHEMY_DATABASE_URI']
+        self.engine_options = {**self.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}), **engine_options}
+        self.engine = self.create_engine(uri)
+        require_triggers(self.engine.dialect.name)
+        if self.engine.dialect.name == 'sqlite' and self.config.get('SQLITE_TUNING', True):
+            apply_sqlite_pragmas(self.engine.sync_engine, self.config.get('SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS))
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        # Async twin of each replica engine of routing.router, made on first use
+        self.replicas = {}
+        self.replica_reads = {self.get_hero, self.get_power}
+        self.sticky_writes = {self.patch_power, self.post_hero_power}
+        self.routes = [
+            (re.compile(r'/'), {'GET': self.index}),
+            (re.compile(r'/heroes(?:/(?P<id>\d+))?'), {'GET': self.get_hero}),
+            (re.compile(r'/heroes/search'), {'GET': partial(self.search, serializer=HERO)}),
+            (re.compile(r'/powers/search'), {'GET': partial(self.search, serializer=POWER)}),
+            (re.compile(r'/powers'), {'GET': self.get_power}),
+            (re.compile(r'/powers/(?P<id>\d+)'), {'GET': self.get_power, 'PATCH': self.patch_power}),
+            (re.compile(r'/hero_powers'), {'GET': partial(self.list_response, serializer=HERO_POWER),
+                                           'POST': self.post_hero_power}),
+            (re.compile(r'/stats'), {'GET': self.get_stats}),
+            (re.compile(r'/stats/powers/top'), {'GET': self.get_top_powers}),
+            (re.compile(r'/stats/powers(?:/(?P<id>\d+))?'), {'GET': self.get_power_stats}),
+        ]
+
+    def create_engine(self, url):
+        options = dict(self.engine_options)
+        # aiosqlite defaults to NullPool for files; pool them like the sync engine
+        if 'pool_size' in options and make_url(url).get_backend_name() == 'sqlite':
+            options.setdefault('poolclass', AsyncAdaptedQueuePool)
+        return create_async_engine(async_url(url), **options)
+
+    def replica(self, engine):
+        replica = self.replicas.get(engine)
+        if replica is None:
+            replica = self.replicas[engine] = self.create_engine(engine.url)
+            prepare_replica(replica.sync_engine, self.config)
+        return replica
+
+    async def dispose(self):
+        await self.engine.dispose()
+        for replica in self.replicas.values():
+            await replica.dispose()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        request = Request(scope, receive)
+        response = await self.dispatch(request)
+        await response(send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def dispatch(self, request):
+        for pattern, methods in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match:
+                break
+        else:
+            # Mirrors the app-level 404 handler in app.py
+            return self.json(request, {'error': str(NotFound())}, 404)
+
+        kwargs = {key: int(value) for key, value in match.groupdict().items() if value is not None}
+        try:
+            handler = methods.get(request.method)
+            if handler is None:
+                raise MethodNotAllowed(valid_methods=sorted(methods))
+            bind = self.engine
+            if handler in self.replica_reads:
+                replica = router.choose(request.cookies)
+                if replica is not None:
+                    bind = self.replica(replica)
+            async with self.sessions(bind=bind) as session:
+                response = await handler(request, session, **kwargs)
+            # Mirrors routing.sticky_writes
+            if handler in self.sticky_writes and router.replicas and 200 <= response.status < 300:
+                response.headers.append(('Set-Cookie', router.pin_cookie()))
+            return response
+        except HTTPException as error:
+            return self.error(error)
+        except Exception:
+            flask_app.logger.exception("Exception on %s [%s]", request.path, request.method)
+            return self.error(InternalServerError())
+
+    # Responses, encoded exactly like the Flask JSON provider and Flask-RESTful
+
+    def json(self, request, obj, status=200, headers=()):
+        provider = flask_app.json
+        return Response(provider.dumps_bytes(obj, provider.pretty(request.args)) + b'\n', status, headers=headers)
+
+    def error(self, error):
+        settings = {'indent': 4} if flask_app.debug else {}
+        headers = [(name, value) for name, value in error.get_headers() if name.lower() == 'allow']
+        return Response(json.dumps({'message': error.description}, **settings) + '\n', error.code, headers=headers)
+
+    # Lists
+
+    async def list_response(self, request, session, serializer):
+        serializer, statement, order = list_query(serializer, request.args)
+        fmt = stream_format(request.args, request.accept_mimetypes)
+        if fmt:
+            chunks = self.stream(statement, serializer, fmt, order, order.parse_after(request.args), session.bind)
+            return StreamingResponse(chunks, content_type=NDJSON_MIMETYPE if fmt == 'ndjson' else 'application/json')
+        if wants_pagination(request.args):
+            max_size = self.config.get('MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+            limit = parse_limit(request.args, max_size) or max_size
+            statement = order.apply(statement, order.parse_after(request.args)).limit(limit + 1)
+            rows = (await session.execute(statement)).all()
+            has_next = len(rows) > limit
+            rows = rows[:limit]
+            headers = self.link_next(request, order.cursor(rows[-1])) if has_next else []
+            return self.json(request, await run_async(serializer.plan_rows(rows), session), headers=headers)
+        if not order.default:
+            statement = order.apply(statement)
+        rows = (await session.execute(statement)).all()
+        return self.json(request, await run_async(serializer.plan_rows(rows), session))
+
+    def link_next(self, request, cursor):
+        return [('Link', f'<{next_page_url(cursor, request.base_url, request.args)}>; rel="next"'),
+                ('X-Next-Cursor', cursor)]
+
+    async def stream(self, statement, serializer, fmt, order, after, bind):
+        dumps = flask_app.json.dumps_bytes
+        batch_size = self.config.get('STREAM_BATCH_SIZE', DEFAULT_STREAM_BATCH_SIZE)
+        first = True
+        if fmt == 'json':
+            yield b'['
+        # The request session is closed by the time the body is sent
+        async with self.sessions(bind=bind) as session:
+            while True:
+                rows = (await session.execute(order.apply(statement, after).limit(batch_size))).all()
+                if not rows:
+                    break
+                items = await run_async(serializer.plan_rows(rows), session)
+                if fmt == 'ndjson':
+                    yield b''.join(dumps(item) + b'\n' for item in items)
+                else:
+                    chunk = b','.join(dumps(item) for item in items)
+                    yield chunk if first else b',' + chunk
+                    first = False
+                if len(rows) < batch_size:
+                    break
+                after = order.values(rows[-1])
+        if fmt == 'json':
+            yield b']\n'
+
+    # Routes
+
+    async def index(self, request, session):
+        return Response('<h1>Code challenge</h1>', content_type='text/html; charset=utf-8')
+
+    async def get_hero(self, request, session, id=None):
+        if id:
+            if read_model.enabled:
+                body = await session.scalar(document_statement(id))
+                if body is not None:
+                    return Response(render(body, flask_app.json.pretty(request.args)))
+            hero = await run_async(HERO.plan_get_joined(id), session)
+            if hero is None:
+                raise NotFound("Hero not found")
+            return self.json(request, hero)
+        else:
+            return await self.list_response(request, session, HERO)
+
+    async def get_power(self, request, session, id=None):
+        if id:
+            power = await run_async(POWER.plan_get_joined(id), session)
+            if power is None:
+                raise NotFound("Power not found")
+            return self.json(request, power)
+        else:
+            return await self.list_response(request, session, POWER)
+
+    async def search(self, request, session, serializer):
+        terms, limit, offset = search_page_args(
+            request.args, self.config.get('MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE),
+            self.config.get('SEARCH_PAGE_SIZE', DEFAULT_SEARCH_PAGE_SIZE))
+        plan = plan_search(serializer, terms, limit, offset, self.engine.dialect.name)
+        items, has_next = await run_async(plan, session)
+        headers = self.link_next(request, encode_cursor([offset + limit])) if has_next else []
+        return self.json(request, items, headers=headers)
+
+    async def get_stats(self, request, session):
+        return self.json(request, await run_async(plan_summary(), session))
+
+    async def get_power_stats(self, request, session, id=None):
+        stats = await run_async(plan_power_stats(id), session)
+        if stats is None:
+            raise NotFound("Power not found")
+        return self.json(request, stats)
+
+    async def get_top_powers(self, request, session):
+        max_size = self.config.get('MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+        limit = parse_limit(request.args, max_size) or self.config.get('STATS_TOP_POWERS', DEFAULT_TOP_POWERS)
+        return self.json(request, await run_async(plan_top_powers(limit), session))
+
+    async def patch_power(self, request, session, id):
+        power = await session.get(Power, id)
+        if power is None:
+            raise NotFound("Power not found")
+
+        data = await request.get_json()
+        description = data.get('description')
+
+        if description:
+            if len(description) < 20:
+                raise BadRequest("Description must be at least 20 characters long.")
+            power.description = description
+            await session.commit()
+            return self.json(request, POWER.dump_object(power))
+        else:
+            raise BadRequest("Description field is required.")
+
+    async def post_hero_power(self, request, session):
+        # Mirrors idempotency.idempotent around the handler
+        key = idempotency.parse_key(request.headers.get(idempotency.HEADER.lower()))
+        if key is None:
+            return await self.create_hero_power(request, session)
+        ttl = self.config.get('IDEMPOTENCY_TTL', idempotency.DEFAULT_IDEMPOTENCY_TTL)
+        digest = idempotency.fingerprint(request.method, request.path, request.mimetype, await request.get_data())
+        stored = await run_async(idempotency.plan_lookup(key, digest, ttl), session)
+        if stored is None:
+            response = await self.create_hero_power(request, session)
+            if not idempotency.stores(response.status):
+                return response
+            plan = idempotency.plan_store(key, digest, response.status, response.body, ttl, self.engine.dialect.name)
+            if await run_async(plan, session):
+                await session.commit()
+                return response
+            stored = await run_async(idempotency.plan_lookup(key, digest, ttl), session)
+        status, body = stored
+        return Response(body, status, headers=[(idempotency.REPLAYED_HEADER, 'true')])
+
+    async def create_hero_power(self, request, session):
+        # Bulk mode: a JSON array or an NDJSON body of hero_powers
+        if request.mimetype == NDJSON_MIMETYPE:
+            data = bulk.parse_ndjson((await request.get_data()).decode())
+        else:
+            data = await request.get_json()
+        if isinstance(data, list):
+            return await self.create_hero_powers(request, session, data)
+
+        hero_id = data.get('hero_id')
+        power_id = data.get('power_id')
+        strength = data.get('strength')
+
+        if not all([hero_id, power_id, strength]):
+            raise BadRequest("Missing required fields")
+
+        hero = await session.get(Hero, hero_id)
+        power = await session.get(Power, power_id)
+
+        if not hero or not power:
+            raise NotFound("Hero or Power not found")
+
+        if strength not in STRENGTHS:
+            raise BadRequest("Invalid strength value")
+
+        try:
+            written = await run_async(bulk.plan_upsert(
+                [{'hero_id': hero.id, 'power_id': power.id, 'strength': strength}], self.engine.dialect.name), session)
+            hero_power = HERO_POWER.dump_returned(written[hero.id, power.id], hero=hero, power=power)
+            await session.commit()
+            return self.json(request, hero_power, 201)
+        except Exception as e:
+            await session.rollback()
+            raise InternalServerError(f"Server error: {str(e)}")
+
+    async def create_hero_powers(self, request, session, items):
+        bulk.check_size(items, self.config.get('BULK_MAX_ITEMS', bulk.DEFAULT_BULK_MAX_ITEMS))
+        try:
+            results, status = await run_async(bulk.plan_create_hero_powers(items, self.engine.dialect.name), session)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            raise InternalServerError(f"Server error: {str(e)}")
+        return self.json(request, results, status)
+
+
+application = Application()
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(application, port=5555)
@@ -0,0 +1,301 @@
+"""HTTP benchmark for every route in app.py.
+
+Seeds a dataset of the chosen size into its own SQLite file, drives each route
+through the Flask test client and through a local threaded WSGI server, and
+writes latency percentiles, throughput, query counts and the peak RSS growth
+of each route as JSON.
+
+    python -m benchmarks.http_bench --size 1k --out results.json
+    python -m benchmarks.http_bench --size 100k --save-baseline
+    python -m benchmarks.http_bench --size 100k --baseline benchmarks/baseline.json
+
+Exits with status 1 when a route regressed against the baseline.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# heroes, powers, powers per hero
+SIZES = {
+    '1k': (1000, 100, 3),
+    '100k': (100000, 1000, 3),
+    '1m': (1000000, 5000, 3),
+}
+
+# Resident set size of this process, sampled while each route runs
+STATM = '/proc/self/statm'
+RSS_SAMPLE_INTERVAL = 0.01
+
+# Common name prefixes, so searches return full pages
+SEARCH_TERMS = ('an', 'mar', 'jo', 'el', 'chr', 'da')
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+def current_rss_kb():
+    with open(STATM) as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+class RssSampler:
+    """Peak growth of the process's RSS while a block runs, in kilobytes.
+
+    ru_maxrss is the high-water mark of the whole process, so every route
+    would report the peak of those run before it. Sampling /proc/self/statm
+    from a baseline taken as the block starts measures each route alone.
+    ``peak_kb`` stays None where /proc is missing.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak_kb = None
+        self._thread = None
+
+    def __enter__(self):
+        if os.path.exists(STATM):
+            gc.collect()
+            self._start = self._peak = current_rss_kb()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, current_rss_kb())
+
+    def __exit__(self, *exc_info):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak_kb = max(self._peak, current_rss_kb()) - self._start
+
+def summarize(latencies, elapsed, queries, errors, rss_growth_kb):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'queries_per_request': round(queries / len(latencies), 2),
+        'peak_rss_growth_kb': rss_growth_kb,
+    }
+
+
+def routes(heroes, powers, list_limit):
+    """(name, method, path factory, body factory) for every route."""
+    rng = random.Random(0)
+    hero_id = lambda: rng.randint(1, heroes)
+    power_id = lambda: rng.randint(1, powers)
+    return [
+        ('GET /heroes', 'GET', lambda: f'/heroes?limit={list_limit}' if list_limit else '/heroes', None),
+        ('GET /heroes/<id>', 'GET', lambda: f'/heroes/{hero_id()}', None),
+        ('GET /powers', 'GET', lambda: '/powers', None),
+        ('GET /powers/<id>', 'GET', lambda: f'/powers/{power_id()}', None),
+        ('GET /heroes?power_id', 'GET', lambda: f'/heroes?power_id={power_id()}&fields=id,name&sort=name&limit=50',
+         None),
+        ('GET /hero_powers?hero_id', 'GET', lambda: f'/hero_powers?hero_id={hero_id()}', None),
+        ('GET /heroes/search', 'GET', lambda: f'/heroes/search?q={rng.choice(SEARCH_TERMS)}', None),
+        ('GET /powers/search', 'GET', lambda: f'/powers/search?q={rng.choice(SEARCH_TERMS)}', None),
+        ('GET /stats', 'GET', lambda: '/stats', None),
+        ('GET /stats/powers/top', 'GET', lambda: '/stats/powers/top', None),
+        ('PATCH /powers/<id>', 'PATCH', lambda: f'/powers/{power_id()}',
+         lambda: {'description': f'Benchmark description number {rng.random()}'}),
+        ('POST /hero_powers', 'POST', lambda: '/hero_powers',
+         lambda: {'hero_id': hero_id(), 'power_id': power_id(), 'strength': rng.choice(['Strong', 'Weak', 'Average'])}),
+    ]
+
+
+def engine_of(app):
+    from models import db
+
+    with app.app_context():
+        return db.engine
+
+def run_test_client(app, route, requests):
+    from loading import count_queries
+
+    name, method, path, body = route
+    client = app.test_client()
+    latencies, errors = [], 0
+    with count_queries(engine_of(app)) as counter, RssSampler() as rss:
+        started = time.perf_counter()
+        for _ in range(requests):
+            request_started = time.perf_counter()
+            response = client.open(path(), method=method, json=body() if body else None)
+            response.get_data()
+            latencies.append(time.perf_counter() - request_started)
+            errors += response.status_code >= 400
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, counter.count, errors, rss.peak_kb)
+
+def run_server(app, route, requests, concurrency, base_url):
+    from loading import count_queries
+
+    name, method, path, body = route
+    lock = threading.Lock()
+    latencies, errors = [], [0]
+
+    def one(_):
+        data = json.dumps(body()).encode() if body else None
+        request = urllib.request.Request(base_url + path(), data=data, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        request_started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+            failed = False
+        except urllib.error.HTTPError as error:
+            error.read()
+            failed = True
+        elapsed = time.perf_counter() - request_started
+        with lock:
+            latencies.append(elapsed)
+            errors[0] += failed
+
+    with count_queries(engine_of(app)) as counter, RssSampler() as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(requests)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, counter.count, errors[0], rss.peak_kb)
+
+
+def prepare_database(path, heroes, powers, per_hero, reuse):
+    os.environ['DB_URI'] = f'sqlite:///{path}'
+    from app import app
+    from models import db
+    from seeding import seed_database
+
+    if reuse and os.path.exists(path):
+        return app
+    with app.app_context():
+        db.create_all()
+        seed_database(heroes, powers, per_hero, seed=0, chunk_size=20000, fast=True, echo=lambda message: None)
+    return app
+
+def compare(results, baseline, threshold):
+    """Return human readable regressions of ``results`` against ``baseline``."""
+    regressions = []
+    for mode, routes in results['results'].items():
+        for name, current in routes.items():
+            previous = baseline.get('results', {}).get(mode, {}).get(name)
+            if not previous:
+                continue
+            if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+                regressions.append(f"{mode} {name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+            if current['throughput_rps'] < previous['throughput_rps'] * (1 - threshold):
+                regressions.append(f"{mode} {name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} rps")
+            if current['queries_per_request'] > previous['queries_per_request']:
+                regressions.append(f"{mode} {name}: queries {previous['queries_per_request']} -> {current['queries_per_request']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', choices=SIZES, default='1k', help="dataset preset")
+    parser.add_argument('--heroes', type=int, help="override the number of heroes")
+    parser.add_argument('--requests', type=int, default=200, help="requests per route and mode")
+    parser.add_argument('--concurrency', type=int, default=8, help="client threads against the server")
+    parser.add_argument('--mode', choices=('client', 'server', 'both'), default='both')
+    parser.add_argument('--list-limit', type=int, default=100,
+                        help="page size for GET /heroes; 0 fetches the whole table")
+    parser.add_argument('--no-cache', action='store_true', help="disable the response cache")
+    parser.add_argument('--no-coalesce', action='store_true', help="disable request coalescing")
+    parser.add_argument('--db', help="SQLite file to seed (default: a temporary file)")
+    parser.add_argument('--reuse', action='store_true', help="reuse an already seeded --db")
+    parser.add_argument('--out', help="write results as JSON to this file")
+    parser.add_argument('--baseline', help="compare against this results file")
+    parser.add_argument('--save-baseline', action='store_true', help=f"write results to {BASELINE}")
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    heroes, powers, per_hero = SIZES[args.size]
+    heroes = args.heroes or heroes
+    if args.no_cache:
+        os.environ['RESPONSE_CACHE_SIZE'] = '0'
+    if args.no_coalesce:
+        os.environ['COALESCE_ENABLED'] = '0'
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    print(f"Seeding {heroes} heroes into {path}...", file=sys.stderr)
+    app = prepare_database(path, heroes, powers, per_hero, args.reuse)
+
+    results = {
+        'meta': {
+            'dataset': {'heroes': heroes, 'powers': powers, 'powers_per_hero': per_hero},
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'list_limit': args.list_limit,
+            'cache': not args.no_cache,
+            'coalesce': not args.no_coalesce,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'results': {},
+    }
+
+    if args.mode in ('client', 'both'):
+        results['results']['client'] = {}
+        for route in routes(heroes, powers, args.list_limit):
+            print(f"client {route[0]}...", file=sys.stderr)
+            results['results']['client'][route[0]] = run_test_client(app, route, args.requests)
+
+    if args.mode in ('server', 'both'):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        results['results']['server'] = {}
+        try:
+            for route in routes(heroes, powers, args.list_limit):
+                print(f"server {route[0]}...", file=sys.stderr)
+                results['results']['server'][route[0]] = run_server(app, route, args.requests, args.concurrency, base_url)
+        finally:
+            server.shutdown()
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    if args.save_baseline:
+        with open(BASELINE, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+    baseline_path = args.baseline
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
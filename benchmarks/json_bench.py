@@ -0,0 +1,97 @@
+"""Benchmark of the JSON providers on GET /heroes.
+
+Seeds a dataset into its own SQLite file, then serves the unpaginated /heroes
+list through the Flask test client under each provider:
+
+    flask-pretty - Flask's default provider with indented output, as before
+    json         - the compact provider in encoding.py on the stdlib
+    orjson       - the compact provider in encoding.py on orjson
+
+    python -m benchmarks.json_bench --heroes 100000 --out results.json
+
+Reports request latency, the time spent encoding the list alone and the body
+size per provider.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.http_bench import percentile, prepare_database
+
+
+def providers(app):
+    from flask.json.provider import DefaultJSONProvider
+
+    from encoding import JSONProvider, orjson
+
+    pretty = DefaultJSONProvider(app)
+    pretty.compact = False
+    profiles = {'flask-pretty': pretty, 'json': JSONProvider(app, 'json')}
+    if orjson is not None:
+        profiles['orjson'] = JSONProvider(app, 'orjson')
+    return profiles
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - started)
+    return samples, result
+
+def run_provider(app, provider, items, repeat):
+    app.json = provider
+    client = app.test_client()
+    with app.test_request_context('/heroes'):
+        encode_samples, body = timed(lambda: provider.response(items).get_data(), repeat)
+    request_samples, response = timed(lambda: client.get('/heroes').get_data(), repeat)
+    assert json.loads(response) == json.loads(body)
+    return {
+        'body_bytes': len(body),
+        'encode_p50_ms': round(percentile(encode_samples, 0.50) * 1000, 3),
+        'request_p50_ms': round(percentile(request_samples, 0.50) * 1000, 3),
+        'request_p95_ms': round(percentile(request_samples, 0.95) * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--heroes', type=int, default=100000)
+    parser.add_argument('--powers', type=int, default=1000)
+    parser.add_argument('--powers-per-hero', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=10, help="requests per provider")
+    parser.add_argument('--db', help="SQLite file to seed (default: a temporary file)")
+    parser.add_argument('--reuse', action='store_true', help="reuse an already seeded --db")
+    parser.add_argument('--out', help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    os.environ['RESPONSE_CACHE_SIZE'] = '0'
+    os.environ['METRICS_QUERY_LOG_THRESHOLD'] = '0'
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    print(f"Seeding {args.heroes} heroes into {path}...", file=sys.stderr)
+    app = prepare_database(path, args.heroes, args.powers, args.powers_per_hero, args.reuse)
+
+    from models import db
+    from serializers import HERO
+
+    with app.app_context():
+        items = HERO.dump_rows(db.session.execute(HERO.statement).all())
+
+    results = {'meta': {'heroes': args.heroes, 'repeat': args.repeat}, 'results': {}}
+    for name, provider in providers(app).items():
+        print(f"{name}...", file=sys.stderr)
+        results['results'][name] = run_provider(app, provider, items, args.repeat)
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
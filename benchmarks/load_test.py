@@ -0,0 +1,178 @@
+"""Concurrent read/write load test of the serve command.
+
+Seeds one SQLite file, then for each profile copies it, starts ``flask serve``
+on the copy and drives a mixed workload of reads and writes from client
+threads for a fixed duration:
+
+    default - SQLite's rollback journal and SQLAlchemy's default pool
+    tuned   - WAL, synchronous=NORMAL, mmap, busy_timeout and a larger pool
+
+    python -m benchmarks.load_test --workers 2 --threads 8 --concurrency 32
+
+Reports throughput, latency percentiles and failed requests per profile.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.http_bench import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'default': {'SQLITE_TUNING': '0', 'DB_POOL_SIZE': '5', 'DB_MAX_OVERFLOW': '10', 'DB_POOL_PRE_PING': '0'},
+    'tuned': {},
+}
+
+
+def flask(database, *args, env=None):
+    environ = {**os.environ, 'FLASK_APP': 'app.py', 'DB_URI': f'sqlite:///{database}',
+               'RESPONSE_CACHE_SIZE': '0', 'METRICS_QUERY_LOG_THRESHOLD': '0', **(env or {})}
+    return [sys.executable, '-m', 'flask', *args], environ
+
+def seed(database, heroes, powers):
+    for args in (('db', 'upgrade'), ('seed', '--heroes', str(heroes), '--powers', str(powers),
+                                     '--powers-per-hero', '3', '--fast')):
+        command, environ = flask(database, *args, env=PROFILES['default'])
+        subprocess.run(command, env=environ, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_until_up(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            urllib.request.urlopen(base_url + '/').read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def workload(rng, heroes, powers, write_ratio):
+    """Return (method, path, body) for one random request."""
+    if rng.random() < write_ratio:
+        if rng.random() < 0.5:
+            return 'PATCH', f'/powers/{rng.randint(1, powers)}', {
+                'description': f'Load test description number {rng.random()}'}
+        return 'POST', '/hero_powers', {
+            'hero_id': rng.randint(1, heroes), 'power_id': rng.randint(1, powers),
+            'strength': rng.choice(['Strong', 'Weak', 'Average'])}
+    if rng.random() < 0.8:
+        return 'GET', f'/heroes/{rng.randint(1, heroes)}', None
+    return 'GET', f'/powers?limit=50', None
+
+def drive(base_url, heroes, powers, write_ratio, concurrency, duration):
+    lock = threading.Lock()
+    latencies, failures = [], []
+    deadline = time.monotonic() + duration
+
+    def client(number):
+        rng = random.Random(number)
+        while time.monotonic() < deadline:
+            method, path, body = workload(rng, heroes, powers, write_ratio)
+            data = json.dumps(body).encode() if body else None
+            request = urllib.request.Request(base_url + path, data=data, method=method,
+                                             headers={'Content-Type': 'application/json'})
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                failed = None
+            except urllib.error.HTTPError as error:
+                failed = f'{error.code} {error.read()[:80].decode(errors="replace").strip()}'
+            except OSError as error:
+                failed = str(error)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if failed:
+                    failures.append(failed)
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    reasons = {}
+    for failure in failures:
+        reasons[failure] = reasons.get(failure, 0) + 1
+    return {
+        'requests': len(latencies),
+        'failed': len(failures),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'failure_reasons': dict(sorted(reasons.items(), key=lambda item: -item[1])[:5]),
+    }
+
+def run_profile(name, seeded, args):
+    database = os.path.join(os.path.dirname(seeded), f'{name}.db')
+    shutil.copy(seeded, database)
+    port = free_port()
+    command, environ = flask(database, 'serve', '--bind', f'127.0.0.1:{port}',
+                             '--workers', str(args.workers), '--threads', str(args.threads),
+                             env=PROFILES[name])
+    process = subprocess.Popen(command, env=environ, cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        wait_until_up(base_url, process)
+        return drive(base_url, args.heroes, args.powers, args.write_ratio, args.concurrency, args.duration)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--heroes', type=int, default=10000)
+    parser.add_argument('--powers', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=2, help="server worker processes")
+    parser.add_argument('--threads', type=int, default=8, help="threads per worker")
+    parser.add_argument('--concurrency', type=int, default=32, help="client threads")
+    parser.add_argument('--duration', type=float, default=10, help="seconds per profile")
+    parser.add_argument('--write-ratio', type=float, default=0.2, help="fraction of requests that write")
+    parser.add_argument('--profile', choices=PROFILES, action='append', help="run only these profiles")
+    parser.add_argument('--out', help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    seeded = os.path.join(tempfile.mkdtemp(), 'seed.db')
+    print(f"Seeding {args.heroes} heroes into {seeded}...", file=sys.stderr)
+    seed(seeded, args.heroes, args.powers)
+
+    results = {'meta': {key: value for key, value in vars(args).items() if key not in ('out', 'profile')},
+               'results': {}}
+    for name in args.profile or PROFILES:
+        print(f"{name}...", file=sys.stderr)
+        results['results'][name] = run_profile(name, seeded, args)
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Benchmark of cold starts: importing app.py and serving the first request.
+
+Seeds a dataset into its own SQLite file, then starts fresh interpreters that
+import the app and send one request through the Flask test client:
+
+    python -m benchmarks.startup_bench --heroes 100000 --out results.json
+
+Reports the median import time, first request time and whole process time,
+and which of the heavy optional modules were loaded on the way.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.http_bench import prepare_database
+
+# Modules that are only needed by some CLI commands
+HEAVY_MODULES = ('flask_migrate', 'alembic', 'pyarrow', 'faker', 'gunicorn')
+
+CHILD = f"""
+import json, sys, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (served - imported) * 1000,
+    'loaded': [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def start(route, env):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', CHILD, route], env=env, check=True, capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    result = json.loads(output)
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--heroes', type=int, default=1000)
+    parser.add_argument('--powers', type=int, default=100)
+    parser.add_argument('--powers-per-hero', type=int, default=3)
+    parser.add_argument('--route', default='/heroes?limit=100', help="path of the first request")
+    parser.add_argument('--runs', type=int, default=7, help="interpreters started")
+    parser.add_argument('--db', help="SQLite file to seed (default: a temporary file)")
+    parser.add_argument('--reuse', action='store_true', help="reuse an already seeded --db")
+    parser.add_argument('--out', help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+    print(f"Seeding {args.heroes} heroes into {path}...", file=sys.stderr)
+    prepare_database(path, args.heroes, args.powers, args.powers_per_hero, args.reuse)
+
+    env = {**os.environ, 'DB_URI': f'sqlite:///{path}'}
+    runs = [start(args.route, env) for _ in range(args.runs)]
+    results = {
+        'meta': {'heroes': args.heroes, 'route': args.route, 'runs': args.runs},
+        'results': {name: round(statistics.median(run[name] for run in runs), 1)
+                    for name in ('import_ms', 'first_request_ms', 'process_ms')},
+        'loaded': sorted({name for run in runs for name in run['loaded']}),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import json
+
+from flask import abort, current_app, jsonify, make_response, request
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Hero, Power, HeroPower, STRENGTHS, upsert, upserts
+from serializers import IN_CHUNK_SIZE, run
+
+# Default settings, overridable through app.config
+DEFAULT_BULK_MAX_ITEMS = 50000
+
+# Tries of an upsert without ON CONFLICT that races inserts of the same links
+UPSERT_ATTEMPTS = 3
+
+
+def parse_ndjson(text=None):
+    """Parse an NDJSON request body, keeping unparseable lines as errors."""
+    if text is None:
+        text = request.get_data(as_text=True)
+    items = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(ValueError("Invalid JSON"))
+    return items
+
+def validate(item):
+    if isinstance(item, ValueError):
+        return str(item)
+    if not isinstance(item, dict):
+        return "Item must be an object"
+    hero_id = item.get('hero_id')
+    power_id = item.get('power_id')
+    strength = item.get('strength')
+    if not all([hero_id, power_id, strength]):
+        return "Missing required fields"
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in (hero_id, power_id)):
+        return "hero_id and power_id must be integers"
+    if strength not in STRENGTHS:
+        return "Invalid strength value"
+    return None
+
+def existing_ids(model, ids):
+    found = set()
+    ids = list(ids)
+    for offset in range(0, len(ids), IN_CHUNK_SIZE):
+        chunk = ids[offset:offset + IN_CHUNK_SIZE]
+        rows = yield select(model.id).where(model.id.in_(chunk))
+        found.update(row[0] for row in rows)
+    return found
+
+def check_size(items, max_items):
+    if not items:
+        abort(400, description="No hero_powers given")
+    if len(items) > max_items:
+        abort(400, description=f"At most {max_items} hero_powers can be created at once")
+
+def existing_links(pairs):
+    """Plan reading the hero_powers linking ``pairs``, by (hero_id, power_id)."""
+    found = {}
+    hero_ids = sorted({hero_id for hero_id, power_id in pairs})
+    for offset in range(0, len(hero_ids), IN_CHUNK_SIZE):
+        rows = yield (select(HeroPower.id, HeroPower.hero_id, HeroPower.power_id, HeroPower.strength)
+                      .where(HeroPower.hero_id.in_(hero_ids[offset:offset + IN_CHUNK_SIZE])))
+        found.update(((row.hero_id, row.power_id), row) for row in rows if (row.hero_id, row.power_id) in pairs)
+    return found
+
+def plan_select_upsert(latest):
+    """Plan the write of plan_upsert as a SELECT, then an UPDATE and an INSERT.
+
+    For backends without INSERT ... ON CONFLICT. A link inserted by another
+    transaction after the SELECT fails the INSERT with IntegrityError, and
+    the next attempt updates it instead.
+    """
+    hero_powers = HeroPower.__table__
+    for attempt in range(1, UPSERT_ATTEMPTS + 1):
+        existing = yield from existing_links(latest.keys())
+        # link_hero_id tells readmodel.py which documents the update changes
+        updates = [{'link_id': existing[pair].id, 'link_strength': row['strength'], 'link_hero_id': pair[0]}
+                   for pair, row in latest.items() if pair in existing]
+        inserts = [row for pair, row in latest.items() if pair not in existing]
+        try:
+            if updates:
+                yield (update(hero_powers).where(hero_powers.c.id == bindparam('link_id'))
+                       .values(strength=bindparam('link_strength'))), updates
+            if inserts:
+                yield insert(hero_powers), inserts
+            break
+        except IntegrityError:
+            if attempt == UPSERT_ATTEMPTS:
+                raise
+    return (yield from existing_links(latest.keys()))
+
+def plan_upsert(rows, dialect_name):
+    """Plan writing hero_power ``rows`` with one INSERT ... ON CONFLICT.
+
+    A row whose (hero_id, power_id) link exists updates its strength instead,
+    so a retried write costs the same single statement and never duplicates
+    the link. Later rows for the same pair win. Returns the written rows by
+    (hero_id, power_id). Dialects without ON CONFLICT run plan_select_upsert.
+    """
+    # Collapsed first, since an upsert may not touch the same row twice on every backend
+    latest = {(row['hero_id'], row['power_id']): row for row in rows}
+    if not upserts(dialect_name):
+        return (yield from plan_select_upsert(latest))
+    statement = upsert(HeroPower, dialect_name)
+    statement = statement.on_conflict_do_update(
+        index_elements=[HeroPower.hero_id, HeroPower.power_id],
+        set_={'strength': statement.excluded.strength},
+    ).returning(HeroPower.id, HeroPower.hero_id, HeroPower.power_id, HeroPower.strength)
+    written = yield statement, list(latest.values())
+    return {(row.hero_id, row.power_id): row for row in written}
+
+def plan_create_hero_powers(items, dialect_name):
+    """Plan upserting ``items``; returns (per-item results, status).
+
+    Written as a plan (see serializers.run) so the sync and async apps share
+    it. The caller commits.
+    """
+    results = [None] * len(items)
+    candidates = []
+    for index, item in enumerate(items):
+        error = validate(item)
+        if error:
+            results[index] = {'index': index, 'status': 400, 'error': error}
+        else:
+            candidates.append(index)
+
+    heroes = yield from existing_ids(Hero, {items[index]['hero_id'] for index in candidates})
+    powers = yield from existing_ids(Power, {items[index]['power_id'] for index in candidates})
+
+    accepted = []
+    for index in candidates:
+        item = items[index]
+        if item['hero_id'] not in heroes or item['power_id'] not in powers:
+            results[index] = {'index': index, 'status': 404, 'error': "Hero or Power not found"}
+        else:
+            accepted.append(index)
+
+    if accepted:
+        rows = [{'hero_id': items[index]['hero_id'],
+                 'power_id': items[index]['power_id'],
+                 'strength': items[index]['strength']} for index in accepted]
+        written = yield from plan_upsert(rows, dialect_name)
+        # Items repeating a pair all report the link as finally written
+        for index, row in zip(accepted, rows):
+            hero_power = written[row['hero_id'], row['power_id']]
+            results[index] = {'index': index, 'status': 201, 'hero_power': dict(hero_power._mapping)}
+
+    status = 201 if len(accepted) == len(items) else 207
+    return results, status
+
+def create_hero_powers(items):
+    """Upsert many hero_powers in one transaction with a single statement.
+
+    Every item gets its own result, in request order. Valid items are written
+    even if others fail; the response is 201 when all items were written and
+    207 when some were rejected.
+    """
+    check_size(items, current_app.config.get('BULK_MAX_ITEMS', DEFAULT_BULK_MAX_ITEMS))
+    try:
+        results, status = run(plan_create_hero_powers(items, db.engine.dialect.name))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        abort(500, description=f"Server error: {str(e)}")
+    return make_response(jsonify(results), status)
@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, request
+
+import routing
+from metrics import collector
+from versions import version_key
+from tracking import ALL_ROWS, RESOURCE_TABLES, on_commit
+
+# Default settings, overridable through app.config
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_CACHE_TTL = 60
+
+
+
+class ResponseCache:
+    """Bounded LRU cache of serialized GET response bodies with a TTL.
+
+    Keys are ``(resource, id, path and query string, read source, table
+    versions)``; ``id`` is None for list and search endpoints. Responses read
+    from a replica are kept apart, so they never answer clients pinned to the
+    primary, and for at most the read-your-writes window, since the replica
+    may not have had the write whose commit last invalidated them. The cache
+    is per process: writes committed by other workers are picked up when
+    versions.py reloads its snapshot, which changes the key.
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation, so a read that started before a
+        # write committed never stores its now stale body
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, generation, ttl=None):
+        """Store ``value`` for ``ttl`` seconds, by default the cache's TTL."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, resource, ids=ALL_ROWS):
+        """Drop cached lists of ``resource`` and its entries for ``ids`` (all when None)."""
+        with self._lock:
+            self.generation += 1
+            stale = [key for key in self._entries
+                     if key[0] == resource and (ids is ALL_ROWS or key[1] is None or key[1] in ids)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+response_cache = ResponseCache()
+
+
+@collector
+def cache_metrics():
+    return {f'response_cache_{name}' + ('' if name == 'size' else '_total'): value
+            for name, value in response_cache.stats().items()}
+
+@on_commit
+def invalidate_changes(changes):
+    for resource, tables in RESOURCE_TABLES.items():
+        for table_name in tables:
+            if table_name in changes:
+                # Only the resource backed by the table itself can be narrowed to ids
+                ids = changes[table_name] if resource == table_name else ALL_ROWS
+                response_cache.invalidate(resource, ids)
+
+def cached(resource):
+    """Cache successful GET responses of a resource method by route and id.
+
+    ``resource`` is a key of RESOURCE_TABLES, or a function returning the key
+    for the current request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            source = routing.source()
+            name = resource() if callable(resource) else resource
+            key = (name, kwargs.get('id'), request.full_path, source, version_key(name))
+            entry = response_cache.get(key)
+            if entry is not None:
+                body, headers, compressed_bodies = entry
+                response = Response(body, headers=headers)
+                response.compressed_bodies = compressed_bodies
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            generation = response_cache.generation
+            response = view(*args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200 and not response.is_streamed:
+                headers = [(name, value) for name, value in response.headers.items()
+                           if name not in ('Content-Length', 'X-Cache')]
+                # Filled with the body in each content coding as compression.py
+                # encodes it, so hits skip the compressor
+                response.compressed_bodies = {}
+                ttl = min(response_cache.ttl, routing.router.window) if source == routing.REPLICA else None
+                response_cache.set(key, (response.get_data(), headers, response.compressed_bodies), generation, ttl)
+                response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+def init_app(app):
+    response_cache.maxsize = app.config.get('RESPONSE_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+    response_cache.ttl = app.config.get('RESPONSE_CACHE_TTL', DEFAULT_CACHE_TTL)
+    response_cache.clear()
@@ -0,0 +1,157 @@
+import copy
+import threading
+import time
+from functools import wraps
+
+from flask import Response, request
+from werkzeug.exceptions import HTTPException
+
+import routing
+from metrics import collector
+from pagination import stream_format
+from tracking import RESOURCE_TABLES, on_commit
+from versions import version_key
+
+# Default settings, overridable through app.config
+DEFAULT_COALESCE_TIMEOUT = 10.0
+
+
+class Flight:
+    """One in-flight computation of a GET and what it produced."""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        # (body, status, headers) once the leader returned a shareable response
+        self.result = None
+        # HTTPException raised by the leader, re-raised by its followers
+        self.error = None
+
+
+class Coalescer:
+    """Single-flight table of GETs being computed in this process.
+
+    The first request for a key leads: it runs the view while identical
+    requests arriving meanwhile wait up to ``timeout`` seconds and answer
+    with a copy of its response. Followers whose wait runs out, or whose
+    leader failed with anything but an HTTP error, run the view themselves.
+    """
+
+    def __init__(self, enabled=True, timeout=DEFAULT_COALESCE_TIMEOUT):
+        self.enabled = enabled
+        self.timeout = timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def join(self, key):
+        """The flight of ``key`` and whether the caller leads it."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.counts['leaders'] += 1
+            return flight, True
+
+    def land(self, key, flight, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.result = result
+        flight.error = error
+        flight.done.set()
+
+    def invalidate(self, resource):
+        """Stop new requests for ``resource`` from joining flights that started before a write."""
+        with self._lock:
+            for key in [key for key in self._flights if key[0] == resource]:
+                del self._flights[key]
+
+    def record(self, name, waited=0.0):
+        with self._lock:
+            self.counts[name] += 1
+            self.counts['wait_seconds'] += waited
+
+    def reset(self):
+        with self._lock:
+            self.counts = {'leaders': 0, 'coalesced': 0, 'timeouts': 0, 'fallbacks': 0, 'wait_seconds': 0.0}
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, 'in_flight': len(self._flights)}
+
+
+coalescer = Coalescer()
+
+
+@collector
+def coalescing_metrics():
+    return {f'request_coalescing_{name}' + ('' if name == 'in_flight' else '_total'): value
+            for name, value in coalescer.stats().items()}
+
+@on_commit
+def invalidate_flights(changes):
+    for resource, tables in RESOURCE_TABLES.items():
+        if any(table_name in changes for table_name in tables):
+            coalescer.invalidate(resource)
+
+def shareable(response):
+    """Snapshot of ``response`` that followers can rebuild, or None."""
+    if not isinstance(response, Response) or response.is_streamed:
+        return None
+    headers = [(name, value) for name, value in response.headers.items()
+               if name not in ('Content-Length', 'X-Cache')]
+    return response.get_data(), response.status_code, headers
+
+def coalesced(resource):
+    """Share one computation of a resource method between concurrent identical GETs.
+
+    Requests are identical when they have the same resource, path with query
+    string, read source and table versions. Streamed formats are never coalesced, since their body is
+    produced while it is sent.
+
+    ``resource`` is a key of RESOURCE_TABLES, or a function returning the key
+    for the current request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not coalescer.enabled or stream_format():
+                return view(*args, **kwargs)
+            name = resource() if callable(resource) else resource
+            key = (name, request.full_path, routing.source(), version_key(name))
+            flight, leader = coalescer.join(key)
+            if leader:
+                try:
+                    response = view(*args, **kwargs)
+                except HTTPException as error:
+                    coalescer.land(key, flight, error=error)
+                    raise
+                except BaseException:
+                    coalescer.land(key, flight)
+                    raise
+                coalescer.land(key, flight, shareable(response))
+                return response
+
+            started = time.perf_counter()
+            if not flight.done.wait(coalescer.timeout):
+                coalescer.record('timeouts', time.perf_counter() - started)
+                return view(*args, **kwargs)
+            waited = time.perf_counter() - started
+            if flight.error is not None:
+                coalescer.record('coalesced', waited)
+                raise copy.copy(flight.error)
+            if flight.result is None:
+                coalescer.record('fallbacks', waited)
+                return view(*args, **kwargs)
+            coalescer.record('coalesced', waited)
+            body, status, headers = flight.result
+            return Response(body, status=status, headers=headers)
+        return wrapper
+    return decorator
+
+def init_app(app):
+    coalescer.enabled = app.config.get('COALESCE_ENABLED', True)
+    coalescer.timeout = app.config.get('COALESCE_TIMEOUT', DEFAULT_COALESCE_TIMEOUT)
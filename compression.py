@@ -0,0 +1,151 @@
+import threading
+import zlib
+
+from flask import request
+
+from metrics import collector
+from pagination import NDJSON_MIMETYPE
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Default settings, overridable through app.config
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 4
+
+COMPRESSIBLE_MIMETYPES = {'application/json', NDJSON_MIMETYPE, 'text/html', 'text/plain'}
+
+
+class Compression:
+    """Settings and counters of response compression.
+
+    Bodies of at least ``min_size`` bytes, and every streamed body, are sent
+    in the coding the client prefers among brotli (when installed) and gzip.
+    Brotli runs at a low quality, which compresses better than gzip at a
+    similar cost; the high qualities are meant for static assets.
+    """
+
+    def __init__(self, enabled=True, min_size=DEFAULT_MIN_SIZE, gzip_level=DEFAULT_GZIP_LEVEL,
+                 brotli_quality=DEFAULT_BROTLI_QUALITY):
+        self.enabled = enabled
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._lock = threading.Lock()
+        self.reset()
+
+    def codings(self):
+        """Supported codings in order of preference."""
+        return ('gzip',) if brotli is None else ('br', 'gzip')
+
+    def record(self, bytes_in, bytes_out, reused=False):
+        with self._lock:
+            self.counts['reused' if reused else 'compressed'] += 1
+            self.counts['bytes_in'] += bytes_in
+            self.counts['bytes_out'] += bytes_out
+
+    def reset(self):
+        with self._lock:
+            self.counts = {'compressed': 0, 'reused': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+compression = Compression()
+
+
+@collector
+def compression_metrics():
+    return {f'response_compression_{name}_total': value for name, value in compression.stats().items()}
+
+
+def negotiate(accept_encodings, codings):
+    """The coding of ``codings`` with the highest quality in ``accept_encodings``, or None.
+
+    Ties go to the earlier coding.
+    """
+    best, best_quality = None, 0
+    for coding in codings:
+        quality = accept_encodings[coding]
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+def compress(data, coding):
+    if coding == 'br':
+        return brotli.compress(data, quality=compression.brotli_quality)
+    compressor = zlib.compressobj(compression.gzip_level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+def compress_stream(chunks, coding):
+    """Compress ``chunks`` incrementally.
+
+    Each chunk is flushed, so clients can decode every batch as soon as it
+    arrives instead of waiting for the compressor's window to fill.
+    """
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=compression.brotli_quality)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(compression.gzip_level, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+    bytes_in = bytes_out = 0
+    for chunk in chunks:
+        if chunk:
+            out = process(chunk) + flush()
+            bytes_in += len(chunk)
+            bytes_out += len(out)
+            yield out
+    out = finish()
+    compression.record(bytes_in, bytes_out + len(out))
+    yield out
+
+def compress_response(response):
+    """Encode ``response`` in the best coding accepted by the client."""
+    if (not compression.enabled or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    coding = negotiate(request.accept_encodings, compression.codings())
+    if coding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), coding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < compression.min_size:
+            return response
+        # The response cache hands over a dict that keeps bodies across requests
+        bodies = getattr(response, 'compressed_bodies', None)
+        body = bodies.get(coding) if bodies is not None else None
+        if body is None:
+            body = compress(data, coding)
+            if bodies is not None:
+                bodies[coding] = body
+            compression.record(len(data), len(body))
+        else:
+            compression.record(len(data), len(body), reused=True)
+        response.set_data(body)
+    response.headers['Content-Encoding'] = coding
+
+    # A strong ETag names one exact byte sequence, which the coding changes
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_app(app):
+    compression.enabled = app.config.get('COMPRESSION_ENABLED', True)
+    compression.min_size = app.config.get('COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+    compression.gzip_level = app.config.get('COMPRESSION_GZIP_LEVEL', DEFAULT_GZIP_LEVEL)
+    compression.brotli_quality = app.config.get('COMPRESSION_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY)
+    app.after_request(compress_response)
@@ -0,0 +1,88 @@
+import json
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ('orjson', 'json')
+
+
+def default_backend():
+    return 'json' if orjson is None else 'orjson'
+
+def dumps(obj, pretty=False, sort_keys=True, backend=None, default=DefaultJSONProvider.default):
+    """Encode ``obj`` as UTF-8 JSON bytes, compact unless ``pretty``.
+
+    Both backends produce the same bytes for the values this API serves:
+    non-ASCII text is written as UTF-8 and pretty output indents by two.
+    orjson encodes straight to bytes; the stdlib goes through a str.
+    """
+    if (backend or default_backend()) == 'orjson':
+        # Dates and dataclasses go through ``default`` so they render as Flask renders them
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=default, option=option)
+    if pretty:
+        text = json.dumps(obj, default=default, ensure_ascii=False, sort_keys=sort_keys, indent=2)
+    else:
+        text = json.dumps(obj, default=default, ensure_ascii=False, sort_keys=sort_keys, separators=(',', ':'))
+    return text.encode()
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes responses straight to bytes.
+
+    Uses orjson when it is installed and the stdlib otherwise. Responses are
+    compact; ``?pretty=1`` indents them. Setting ``compact`` to False, or to
+    None in debug mode, indents every response as Flask's provider does.
+    """
+
+    compact = True
+    ensure_ascii = False
+
+    def __init__(self, app, backend=None):
+        super().__init__(app)
+        self.backend = backend or default_backend()
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown JSON backend {self.backend!r}")
+        if self.backend == 'orjson' and orjson is None:
+            raise RuntimeError("The orjson JSON backend needs the orjson package")
+
+    def dumps_bytes(self, obj, pretty=False):
+        return dumps(obj, pretty, self.sort_keys, self.backend, self.default)
+
+    def dumps(self, obj, **kwargs):
+        # Keyword arguments are stdlib json options, which orjson lacks
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs or self.backend != 'orjson':
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def pretty(self, args=None):
+        """Whether to indent the response to the current request."""
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return True
+        if args is None:
+            if not has_request_context():
+                return False
+            args = request.args
+        return args.get('pretty', '').lower() in ('1', 'true')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj, self.pretty()) + b'\n', mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.json = JSONProvider(app, app.config.get('JSON_BACKEND'))
@@ -0,0 +1,143 @@
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+
+import click
+from flask import Response, abort, current_app, request
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, IdempotencyKey, upsert, upserts
+from serializers import run
+
+# Default settings, overridable through app.config
+DEFAULT_IDEMPOTENCY_TTL = 24 * 60 * 60
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def parse_key(key):
+    """Validate the Idempotency-Key header value ``key``; None without one."""
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        abort(400, description=f"{HEADER} must be between 1 and {MAX_KEY_LENGTH} characters")
+    return key
+
+def fingerprint(method, path, mimetype, body):
+    """Digest of what a request asks for, compared when its key is reused."""
+    digest = hashlib.sha256(f'{method} {path} {mimetype}\n'.encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+def expired_before(ttl):
+    return datetime.utcnow() - timedelta(seconds=ttl)
+
+
+def plan_lookup(key, fingerprint, ttl):
+    """Plan reading the (status, body) stored for ``key``, None when absent or expired.
+
+    Reusing a live key for a different request is an error.
+    """
+    rows = yield (select(IdempotencyKey.fingerprint, IdempotencyKey.status, IdempotencyKey.body)
+                  .where(IdempotencyKey.key == key, IdempotencyKey.created_at >= expired_before(ttl)))
+    if not rows:
+        return None
+    if rows[0].fingerprint != fingerprint:
+        abort(422, description=f"{HEADER} was already used for a different request")
+    return rows[0].status, rows[0].body
+
+def plan_store(key, fingerprint, status, body, ttl, dialect_name):
+    """Plan storing the response to ``key``; returns False when a live entry already holds it.
+
+    An expired entry is overwritten in the same statement.
+    """
+    now = datetime.utcnow()
+    values = {'key': key, 'fingerprint': fingerprint, 'status': status, 'body': body, 'created_at': now}
+    if not upserts(dialect_name):
+        return (yield from plan_replace_expired(values, ttl))
+    statement = upsert(IdempotencyKey, dialect_name).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[IdempotencyKey.key],
+        set_={name: statement.excluded[name] for name in values if name != 'key'},
+        where=IdempotencyKey.created_at < expired_before(ttl),
+    ).returning(IdempotencyKey.key)
+    rows = yield statement
+    return bool(rows)
+
+def plan_replace_expired(values, ttl):
+    """Plan the store of plan_store as a DELETE of an expired entry, then an INSERT.
+
+    For backends without INSERT ... ON CONFLICT. An INSERT failing on the key
+    means a live entry holds it, stored by a concurrent request.
+    """
+    yield delete(IdempotencyKey).where(IdempotencyKey.key == values['key'],
+                                       IdempotencyKey.created_at < expired_before(ttl))
+    try:
+        yield insert(IdempotencyKey).values(values)
+    except IntegrityError:
+        return False
+    return True
+
+def stores(status):
+    # Rejected requests changed nothing, so their retries may run again
+    return 200 <= status < 300
+
+def replay(status, body):
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Replay the stored response of a write that repeats an Idempotency-Key.
+
+    Responses are stored after the view commits. The writes behind them are
+    upserts, so a retry that finds no entry, because the first attempt died
+    before storing it or is still running, converges on the same rows; when
+    both finish, every response to the key is the one stored first.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = parse_key(request.headers.get(HEADER))
+        if key is None:
+            return view(*args, **kwargs)
+        ttl = current_app.config.get('IDEMPOTENCY_TTL', DEFAULT_IDEMPOTENCY_TTL)
+        digest = fingerprint(request.method, request.path, request.mimetype, request.get_data())
+        stored = run(plan_lookup(key, digest, ttl))
+        if stored is not None:
+            return replay(*stored)
+
+        response = view(*args, **kwargs)
+        if isinstance(response, Response) and stores(response.status_code):
+            plan = plan_store(key, digest, response.status_code, response.get_data(), ttl, db.engine.dialect.name)
+            stored = run(plan)
+            db.session.commit()
+            if not stored:
+                # A concurrent request with the same key stored its response first
+                return replay(*run(plan_lookup(key, digest, ttl)))
+        return response
+    return wrapper
+
+
+def purge(ttl):
+    """Delete expired keys; returns how many."""
+    result = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < expired_before(ttl)))
+    db.session.commit()
+    return result.rowcount
+
+
+idempotency_cli = AppGroup('idempotency', help="Manage stored Idempotency-Key responses.")
+
+@idempotency_cli.command('purge')
+def purge_command():
+    """Delete stored responses older than IDEMPOTENCY_TTL."""
+    count = purge(current_app.config.get('IDEMPOTENCY_TTL', DEFAULT_IDEMPOTENCY_TTL))
+    click.echo(f"Purged {count} idempotency keys.")
+
+def init_app(app):
+    app.cli.add_command(idempotency_cli)
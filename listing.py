@@ -0,0 +1,112 @@
+from flask import abort, request
+from sqlalchemy import select
+
+from models import HeroPower, STRENGTHS
+from pagination import Order
+from serializers import IN_CHUNK_SIZE
+
+# Columns each list can be sorted by. Every one is served in order by an
+# index, which SQLite extends with the rowid to break ties on id
+SORTABLE = {
+    'heroes': ('id', 'name'),
+    'powers': ('id', 'name'),
+    'hero_powers': ('id', 'hero_id', 'power_id'),
+}
+
+# Filter parameters of each list. All of them are hero_powers columns:
+# /heroes and /powers keep the rows linked through a matching hero_power
+FILTERS = {
+    'heroes': ('power_id', 'strength'),
+    'powers': ('hero_id', 'strength'),
+    'hero_powers': ('hero_id', 'power_id', 'strength'),
+}
+
+# Column of hero_powers that links it to each filtered table
+_LINKS = {'heroes': 'hero_id', 'powers': 'power_id'}
+
+
+def parse_fields(serializer, args):
+    """Project ``serializer`` to ?fields, a comma separated list of keys."""
+    fields = args.get('fields')
+    if fields is None:
+        return serializer
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    unknown = [name for name in names if name not in serializer.names]
+    if not names or unknown:
+        abort(400, description=f"fields must be a comma separated list of {', '.join(serializer.names)}")
+    return serializer.project(names)
+
+def parse_sort(table, args):
+    """Parse ?sort, one sortable column with a leading - for descending order."""
+    sort = args.get('sort', '').strip()
+    if not sort:
+        return Order(table)
+    name = sort.lstrip('-')
+    if name not in SORTABLE[table.name] or len(sort) - len(name) > 1:
+        allowed = ', '.join(SORTABLE[table.name])
+        abort(400, description=f"sort must be one of {allowed}, optionally prefixed with -")
+    return Order(table, name, descending=sort.startswith('-'))
+
+def parse_filters(table, args):
+    """Parse the filter parameters of ``table`` into ``{column: values}``."""
+    filters = {}
+    for name in FILTERS[table.name]:
+        raw = args.get(name)
+        if raw is None:
+            continue
+        values = [value.strip() for value in raw.split(',') if value.strip()]
+        if name == 'strength':
+            if not values or any(value not in STRENGTHS for value in values):
+                abort(400, description=f"strength must be a comma separated list of {', '.join(STRENGTHS)}")
+        else:
+            try:
+                values = [int(value) for value in values]
+            except ValueError:
+                values = []
+            if not values:
+                abort(400, description=f"{name} must be a comma separated list of integers")
+        if len(values) > IN_CHUNK_SIZE:
+            abort(400, description=f"{name} accepts at most {IN_CHUNK_SIZE} values")
+        filters[name] = values
+    return filters
+
+def filter_clause(table, filters):
+    """WHERE clause keeping the rows of ``table`` that match ``filters``.
+
+    /heroes and /powers match through an IN subquery on hero_powers, which
+    the composite (power_id, strength, hero_id) and (hero_id, strength,
+    power_id) indexes answer without reading the table.
+    """
+    hero_powers = HeroPower.__table__
+    conditions = [hero_powers.c[name].in_(values) for name, values in filters.items()]
+    if table is hero_powers:
+        return conditions
+    return [table.c.id.in_(select(hero_powers.c[_LINKS[table.name]]).where(*conditions))]
+
+def list_query(serializer, args=None):
+    """Compile ?fields, ?sort and the filters of a list request.
+
+    Returns the projected serializer, its filtered statement and the order
+    to page it in.
+    """
+    args = request.args if args is None else args
+    table = serializer.table
+    order = parse_sort(table, args)
+    filters = parse_filters(table, args)
+    serializer = parse_fields(serializer, args)
+    statement = serializer.statement
+    if filters:
+        statement = statement.where(*filter_clause(table, filters))
+    return serializer, statement, order
+
+def resource(name):
+    """Cache and version resource of list requests on ``name``.
+
+    Filtered /powers lists select powers through hero_powers, so they are
+    tracked as ``filtered_powers``, which also changes with hero_powers.
+    """
+    def current():
+        if name == 'powers' and any(parameter in request.args for parameter in FILTERS['powers']):
+            return 'filtered_powers'
+        return name
+    return current
@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import db
+
+# Loading policies for detail endpoints:
+#   lazy     - ORM object with default lazy relationships (1 + 1 + N queries)
+#   selectin - ORM object with selectinload on every relationship (1 per level)
+#   joined   - ORM object with joinedload on every relationship (1 query)
+#   in       - column projection plus one IN query per child relation (2 queries)
+#   join     - column projection through a single hand-written join (1 query)
+POLICIES = ('lazy', 'selectin', 'joined', 'in', 'join')
+
+DEFAULT_LOADING_POLICIES = {
+    'hero_detail': 'join',
+    'power_detail': 'join',
+}
+
+ORM_STRATEGIES = {
+    'lazy': None,
+    'selectin': selectinload,
+    'joined': joinedload,
+}
+
+
+def policy_for(endpoint):
+    policies = current_app.config.get('LOADING_POLICIES', {})
+    policy = policies.get(endpoint, DEFAULT_LOADING_POLICIES.get(endpoint, 'join'))
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown loading policy {policy!r} for {endpoint}")
+    return policy
+
+def loader_options(serializer, strategy):
+    """Build ORM loader options that cover every relation of ``serializer``."""
+    options = []
+    for key, child, *_ in serializer.joined:
+        options.append(strategy(getattr(serializer.model, key)))
+    for key, child, foreign_key in serializer.children:
+        option = strategy(getattr(serializer.model, key))
+        nested = loader_options(child, strategy)
+        options.append(option.options(*nested) if nested else option)
+    return options
+
+def load(endpoint, serializer, id):
+    """Load and serialize one row using the policy configured for ``endpoint``."""
+    policy = policy_for(endpoint)
+    if policy == 'join':
+        return serializer.get_joined(id)
+    if policy == 'in':
+        return serializer.get(id)
+
+    strategy = ORM_STRATEGIES[policy]
+    options = loader_options(serializer, strategy) if strategy else []
+    obj = db.session.get(serializer.model, id, options=options)
+    return serializer.dump_object(obj) if obj is not None else None
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+@contextmanager
+def count_queries(engine=None):
+    """Count the SQL statements sent to ``engine`` inside the block."""
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
@@ -0,0 +1,254 @@
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from flask import Response, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Default settings, overridable through app.config
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_QUERY_LOG_THRESHOLD = 50
+
+
+class RequestMetrics:
+    """Counters for the request running on the current thread."""
+
+    __slots__ = ('started', 'statements', 'db_seconds', 'serialize_seconds', 'serializing')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.serializing = False
+
+_state = threading.local()
+
+def current():
+    return getattr(_state, 'request', None)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if getattr(_state, 'request', None) is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = getattr(_state, 'request', None)
+    started = conn.info.get('query_started')
+    if metrics is not None and started:
+        metrics.statements += 1
+        metrics.db_seconds += time.perf_counter() - started.pop()
+
+@contextmanager
+def serialization():
+    """Time the block as serialization, excluding the queries it runs."""
+    metrics = current()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    started = time.perf_counter()
+    db_before = metrics.db_seconds
+    try:
+        yield
+    finally:
+        metrics.serializing = False
+        metrics.serialize_seconds += time.perf_counter() - started - (metrics.db_seconds - db_before)
+
+
+class RouteStats:
+    __slots__ = ('buckets', 'count', 'seconds', 'statements', 'db_seconds', 'serialize_seconds')
+
+    def __init__(self, size):
+        self.buckets = [0] * size
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+    def merge(self, other):
+        for index, value in enumerate(other.buckets):
+            self.buckets[index] += value
+        self.count += other.count
+        self.seconds += other.seconds
+        self.statements += other.statements
+        self.db_seconds += other.db_seconds
+        self.serialize_seconds += other.serialize_seconds
+
+class Shard:
+    __slots__ = ('routes', '__weakref__')
+
+    def __init__(self):
+        self.routes = {}
+
+class Registry:
+    """Per-route request histograms.
+
+    Every thread records into its own shard without taking a lock; scrapes sum
+    the live shards. When a thread exits, its shard is folded into a retired
+    total so short-lived request threads do not leak shards.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._live = weakref.WeakSet()
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = Shard()
+            with self._lock:
+                self._live.add(shard)
+            weakref.finalize(shard, self._retire, shard.routes)
+        return shard
+
+    def _retire(self, routes):
+        with self._lock:
+            self._merge(self._retired, routes)
+
+    def _merge(self, into, routes):
+        for key, stats in list(routes.items()):
+            if key not in into:
+                into[key] = RouteStats(len(self.buckets) + 1)
+            into[key].merge(stats)
+
+    def observe(self, key, seconds, metrics):
+        routes = self._shard().routes
+        stats = routes.get(key)
+        if stats is None:
+            stats = routes[key] = RouteStats(len(self.buckets) + 1)
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        stats.buckets[index] += 1
+        stats.count += 1
+        stats.seconds += seconds
+        stats.statements += metrics.statements
+        stats.db_seconds += metrics.db_seconds
+        stats.serialize_seconds += metrics.serialize_seconds
+
+    def snapshot(self):
+        totals = {}
+        with self._lock:
+            self._merge(totals, self._retired)
+            shards = list(self._live)
+        for shard in shards:
+            self._merge(totals, shard.routes)
+        return totals
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._retired.clear()
+        for shard in self._live:
+            shard.routes.clear()
+
+    def set_buckets(self, buckets):
+        """Use the upper ``buckets`` bounds, dropping counts kept under other ones.
+
+        Shards count into the bucket layout they were recorded with, which
+        cannot be mapped onto different bounds.
+        """
+        buckets = tuple(buckets)
+        with self._lock:
+            if buckets != self.buckets:
+                self.buckets = buckets
+                self._reset()
+
+
+registry = Registry()
+
+# Extra "name value" samples appended to /metrics, e.g. cache counters
+_collectors = []
+
+def collector(function):
+    """Register ``function() -> {metric name: value}`` to be exported on /metrics."""
+    _collectors.append(function)
+    return function
+
+
+def _labels(route, method):
+    return f'route="{route}",method="{method}"'
+
+def render():
+    lines = []
+    routes = sorted(registry.snapshot().items())
+
+    lines.append('# HELP http_request_duration_seconds Request latency by route.')
+    lines.append('# TYPE http_request_duration_seconds histogram')
+    for (route, method), stats in routes:
+        labels = _labels(route, method)
+        cumulative = 0
+        for bound, count in zip(registry.buckets + ('+Inf',), stats.buckets):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'http_request_duration_seconds_sum{{{labels}}} {stats.seconds:.6f}')
+        lines.append(f'http_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+    for name, attribute, help in (
+        ('http_request_db_statements_total', 'statements', 'SQL statements executed by route.'),
+        ('http_request_db_seconds_total', 'db_seconds', 'Time spent in SQL by route.'),
+        ('http_request_serialization_seconds_total', 'serialize_seconds', 'Time spent serializing by route.'),
+    ):
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} counter')
+        for (route, method), stats in routes:
+            value = getattr(stats, attribute)
+            value = f'{value:.6f}' if isinstance(value, float) else value
+            lines.append(f'{name}{{{_labels(route, method)}}} {value}')
+
+    for function in _collectors:
+        for name, value in function().items():
+            lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    registry.set_buckets(app.config.get('METRICS_BUCKETS', DEFAULT_BUCKETS))
+
+    @app.before_request
+    def start_request_metrics():
+        _state.request = RequestMetrics()
+
+    @app.after_request
+    def add_server_timing(response):
+        metrics = current()
+        if metrics is not None:
+            total = (time.perf_counter() - metrics.started) * 1000
+            response.headers['Server-Timing'] = (
+                f'db;dur={metrics.db_seconds * 1000:.3f};desc="{metrics.statements} queries", '
+                f'ser;dur={metrics.serialize_seconds * 1000:.3f}, '
+                f'total;dur={total:.3f}'
+            )
+        return response
+
+    # Recorded on teardown so streamed responses count their full duration
+    @app.teardown_request
+    def record_request_metrics(exc):
+        metrics = current()
+        _state.request = None
+        if metrics is None:
+            return
+        seconds = time.perf_counter() - metrics.started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        registry.observe((route, request.method), seconds, metrics)
+        threshold = app.config.get('METRICS_QUERY_LOG_THRESHOLD', DEFAULT_QUERY_LOG_THRESHOLD)
+        if threshold and metrics.statements > threshold:
+            app.logger.warning("%s %s ran %d queries (%.1f ms in the database)",
+                               request.method, request.path, metrics.statements, metrics.db_seconds * 1000)
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(render(), mimetype='text/plain; version=0.0.4')
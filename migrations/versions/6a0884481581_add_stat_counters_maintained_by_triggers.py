@@ -0,0 +1,141 @@
+"""Add stat counters maintained by triggers
+
+Revision ID: 6a0884481581
+Revises: c31e5ed0a252
+Create Date: 2026-10-17 02:04:23.818572
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a0884481581'
+down_revision = 'c31e5ed0a252'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of stats.create_statements at this revision
+HERO_POWER_COUNTERS = "UPDATE stat_counters SET value = value {sign} 1 WHERE name IN ('hero_powers', 'hero_powers.' || {row}.strength)"
+POWER_STAT = ("UPDATE power_stats SET hero_count = hero_count {sign} 1, "
+              "strong = strong {sign} ({row}.strength = 'Strong'), weak = weak {sign} ({row}.strength = 'Weak'), "
+              "average = average {sign} ({row}.strength = 'Average') WHERE power_id = {row}.power_id")
+
+def hero_power_change(row, sign):
+    return f"{HERO_POWER_COUNTERS.format(row=row, sign=sign)}; {POWER_STAT.format(row=row, sign=sign)};"
+
+TRIGGERS = {
+    'heroes_stats_insert': "AFTER INSERT ON heroes BEGIN "
+                           "UPDATE stat_counters SET value = value + 1 WHERE name IN ('heroes'); END",
+    'heroes_stats_delete': "AFTER DELETE ON heroes BEGIN "
+                           "UPDATE stat_counters SET value = value - 1 WHERE name IN ('heroes'); END",
+    'powers_stats_insert': "AFTER INSERT ON powers BEGIN "
+                           "UPDATE stat_counters SET value = value + 1 WHERE name IN ('powers'); "
+                           "INSERT INTO power_stats (power_id, hero_count, strong, weak, average) "
+                           "VALUES (new.id, 0, 0, 0, 0); END",
+    'powers_stats_delete': "AFTER DELETE ON powers BEGIN "
+                           "UPDATE stat_counters SET value = value - 1 WHERE name IN ('powers'); "
+                           "DELETE FROM power_stats WHERE power_id = old.id; END",
+    'hero_powers_stats_insert': f"AFTER INSERT ON hero_powers BEGIN {hero_power_change('new', '+')} END",
+    'hero_powers_stats_delete': f"AFTER DELETE ON hero_powers BEGIN {hero_power_change('old', '-')} END",
+    'hero_powers_stats_update': f"AFTER UPDATE OF power_id, strength ON hero_powers BEGIN "
+                                f"{hero_power_change('old', '-')} {hero_power_change('new', '+')} END",
+}
+
+# The same counting on PostgreSQL, one trigger function per table
+PG_POWER_STAT = ("UPDATE power_stats SET hero_count = hero_count {sign} 1, "
+                 "strong = strong {sign} CAST({row}.strength = 'Strong' AS INTEGER), "
+                 "weak = weak {sign} CAST({row}.strength = 'Weak' AS INTEGER), "
+                 "average = average {sign} CAST({row}.strength = 'Average' AS INTEGER) WHERE power_id = {row}.power_id")
+
+def pg_hero_power_change(row, sign):
+    return f"{HERO_POWER_COUNTERS.format(row=row, sign=sign)}; {PG_POWER_STAT.format(row=row, sign=sign)};"
+
+PG_TRIGGERS = {
+    'heroes': ('INSERT OR DELETE',
+               "IF TG_OP = 'INSERT' THEN UPDATE stat_counters SET value = value + 1 WHERE name IN ('heroes'); "
+               "ELSE UPDATE stat_counters SET value = value - 1 WHERE name IN ('heroes'); END IF;"),
+    'powers': ('INSERT OR DELETE',
+               "IF TG_OP = 'INSERT' THEN UPDATE stat_counters SET value = value + 1 WHERE name IN ('powers'); "
+               "INSERT INTO power_stats (power_id, hero_count, strong, weak, average) VALUES (new.id, 0, 0, 0, 0); "
+               "ELSE UPDATE stat_counters SET value = value - 1 WHERE name IN ('powers'); "
+               "DELETE FROM power_stats WHERE power_id = old.id; END IF;"),
+    'hero_powers': ('INSERT OR DELETE OR UPDATE OF power_id, strength',
+                    f"IF TG_OP IN ('DELETE', 'UPDATE') THEN {pg_hero_power_change('old', '-')} END IF; "
+                    f"IF TG_OP IN ('INSERT', 'UPDATE') THEN {pg_hero_power_change('new', '+')} END IF;"),
+}
+
+# Dialects with triggers; elsewhere nothing would keep the tables current and
+# the app refuses to start, so the migration fails rather than half-applies
+TRIGGER_DIALECTS = ('sqlite', 'postgresql')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect not in TRIGGER_DIALECTS:
+        raise RuntimeError(f"The stat counters need triggers, which this migration creates on "
+                           f"{' and '.join(TRIGGER_DIALECTS)} only, not on {dialect}")
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('stat_counters',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('power_stats',
+    sa.Column('power_id', sa.Integer(), nullable=False),
+    sa.Column('hero_count', sa.Integer(), nullable=False),
+    sa.Column('strong', sa.Integer(), nullable=False),
+    sa.Column('weak', sa.Integer(), nullable=False),
+    sa.Column('average', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['power_id'], ['powers.id'], name=op.f('fk_power_stats_power_id_powers'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('power_id')
+    )
+    with op.batch_alter_table('power_stats', schema=None) as batch_op:
+        batch_op.create_index('ix_power_stats_hero_count_power_id', ['hero_count', 'power_id'], unique=False)
+
+    # ### end Alembic commands ###
+
+    # Count the rows that already exist
+    op.execute("INSERT INTO stat_counters (name, value) "
+               "SELECT 'heroes', count(*) FROM heroes UNION ALL "
+               "SELECT 'powers', count(*) FROM powers UNION ALL "
+               "SELECT 'hero_powers', count(*) FROM hero_powers UNION ALL "
+               "SELECT 'hero_powers.Strong', count(*) FROM hero_powers WHERE strength = 'Strong' UNION ALL "
+               "SELECT 'hero_powers.Weak', count(*) FROM hero_powers WHERE strength = 'Weak' UNION ALL "
+               "SELECT 'hero_powers.Average', count(*) FROM hero_powers WHERE strength = 'Average'")
+    op.execute("INSERT INTO power_stats (power_id, hero_count, strong, weak, average) "
+               "SELECT powers.id, count(hero_powers.id), "
+               "count(CASE WHEN hero_powers.strength = 'Strong' THEN 1 END), "
+               "count(CASE WHEN hero_powers.strength = 'Weak' THEN 1 END), "
+               "count(CASE WHEN hero_powers.strength = 'Average' THEN 1 END) "
+               "FROM powers LEFT OUTER JOIN hero_powers ON hero_powers.power_id = powers.id GROUP BY powers.id")
+
+    if dialect == 'sqlite':
+        for name, body in TRIGGERS.items():
+            op.execute(f"CREATE TRIGGER {name} {body}")
+    else:
+        for table, (events, body) in PG_TRIGGERS.items():
+            op.execute(f"CREATE FUNCTION {table}_stats() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+                       f"{body} RETURN NULL; END $$")
+            op.execute(f"CREATE TRIGGER {table}_stats AFTER {events} ON {table} "
+                       f"FOR EACH ROW EXECUTE FUNCTION {table}_stats()")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for name in TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    elif dialect == 'postgresql':
+        for table in PG_TRIGGERS:
+            op.execute(f"DROP FUNCTION IF EXISTS {table}_stats() CASCADE")
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('power_stats', schema=None) as batch_op:
+        batch_op.drop_index('ix_power_stats_hero_count_power_id')
+
+    op.drop_table('power_stats')
+    op.drop_table('stat_counters')
+    # ### end Alembic commands ###
@@ -0,0 +1,53 @@
+"""Add full-text search indexes
+
+Revision ID: 70b53ffa35b2
+Revises: f21c3f02cfb3
+Create Date: 2026-10-17 01:31:36.689212
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '70b53ffa35b2'
+down_revision = 'f21c3f02cfb3'
+branch_labels = None
+depends_on = None
+
+
+# Frozen copy of search.create_statements at this revision
+INDEXES = {
+    'heroes': ('name', 'super_name'),
+    'powers': ('name', 'description'),
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, columns in INDEXES.items():
+        fts = f'{table}_fts'
+        names = ', '.join(columns)
+        new = ', '.join(f'new.{column}' for column in columns)
+        old = ', '.join(f'old.{column}' for column in columns)
+        op.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5({names}, content='{table}', content_rowid='id', "
+                   f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+        op.execute(f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+                   f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END")
+        op.execute(f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+                   f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); END")
+        op.execute(f"CREATE TRIGGER {table}_fts_update AFTER UPDATE ON {table} BEGIN "
+                   f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+                   f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END")
+        # Index the rows that already exist
+        op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in INDEXES:
+        for trigger in ('insert', 'delete', 'update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{trigger}")
+        op.execute(f"DROP TABLE IF EXISTS {table}_fts")
@@ -1,5 +1,9 @@
+import importlib
+
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import MetaData
+from flask_sqlalchemy.session import Session
+from sqlalchemy import MetaData, Select, event, func
+from sqlalchemy.sql.dml import UpdateBase
 from sqlalchemy.orm import validates, relationship
 from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy_serializer import SerializerMixin
@@ -7,10 +11,31 @@ from sqlalchemy_serializer import SerializerMixin
 # Define metadata naming conventions for foreign keys
 metadata = MetaData(naming_convention={
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+    "ix": "ix_%(column_0_label)s",
 })
 
+class RoutingSession(Session):
+    """Session sending the reads of a request routed to a replica there.
+
+    routing.py stores the replica engine chosen for a request in
+    ``info['replica']``. Flushes and every other statement use the primary,
+    and the first write drops the replica so later reads see what it wrote.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get('replica')
+        if replica is not None and bind is None:
+            if isinstance(clause, Select) and not self._flushing:
+                return replica
+            if self._flushing or isinstance(clause, UpdateBase):
+                del self.info['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 # Initialize SQLAlchemy with custom metadata
-db = SQLAlchemy(metadata=metadata)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
+
+# Allowed HeroPower strengths
+STRENGTHS = ['Strong', 'Weak', 'Average']
 
 class Hero(db.Model, SerializerMixin):
     __tablename__ = 'heroes'
@@ -19,8 +44,9 @@ class Hero(db.Model, SerializerMixin):
     name = db.Column(db.String, nullable=False, index=True)
     super_name = db.Column(db.String, nullable=False)
 
-    # Define relationship with HeroPower
-    hero_powers = relationship('HeroPower', back_populates='hero', cascade="all, delete-orphan")
+    # Define relationship with HeroPower, in id order whichever index loads it
+    hero_powers = relationship('HeroPower', back_populates='hero', cascade="all, delete-orphan",
+                               order_by='HeroPower.id')
 
     # Define association proxy for powers
     powers = association_proxy('hero_powers', 'power')
@@ -38,8 +64,9 @@ class Power(db.Model, SerializerMixin):
     name = db.Column(db.String, nullable=False, index=True)
     description = db.Column(db.String, nullable=False)
 
-    # Define relationship with HeroPower
-    hero_powers = relationship('HeroPower', back_populates='power', cascade="all, delete-orphan")
+    # Define relationship with HeroPower, in id order whichever index loads it
+    hero_powers = relationship('HeroPower', back_populates='power', cascade="all, delete-orphan",
+                               order_by='HeroPower.id')
 
     # Define serialization rules
     serialize_rules = ('-hero_powers',)
@@ -58,10 +85,20 @@ class HeroPower(db.Model, SerializerMixin):
     __tablename__ = 'hero_powers'
 
     id = db.Column(db.Integer, primary_key=True)
-    hero_id = db.Column(db.Integer, db.ForeignKey('heroes.id'), nullable=False, index=True)
-    power_id = db.Column(db.Integer, db.ForeignKey('powers.id'), nullable=False, index=True)
+    hero_id = db.Column(db.Integer, db.ForeignKey('heroes.id'), nullable=False)
+    power_id = db.Column(db.Integer, db.ForeignKey('powers.id'), nullable=False)
     strength = db.Column(db.String, nullable=False)
 
+    __table_args__ = (
+        # One link per hero and power, the conflict target of upserts. Also
+        # serves lookups by hero_id
+        db.Index('uq_hero_powers_hero_id_power_id', 'hero_id', 'power_id', unique=True),
+        # Covering indexes for the hero_powers filters of the list endpoints.
+        # The first also serves lookups by power_id
+        db.Index('ix_hero_powers_power_id_strength_hero_id', 'power_id', 'strength', 'hero_id'),
+        db.Index('ix_hero_powers_hero_id_strength_power_id', 'hero_id', 'strength', 'power_id'),
+    )
+
     # Define relationships
     hero = relationship('Hero', back_populates='hero_powers')
     power = relationship('Power', back_populates='hero_powers')
@@ -72,10 +109,104 @@ class HeroPower(db.Model, SerializerMixin):
     # Validate strength
     @validates('strength')
     def validate_strength(self, key, strength):
-        allowed_strengths = ['Strong', 'Weak', 'Average']
-        if strength not in allowed_strengths:
-            raise ValueError(f"Strength must be one of {allowed_strengths}.")
+        if strength not in STRENGTHS:
+            raise ValueError(f"Strength must be one of {STRENGTHS}.")
         return strength
 
     def __repr__(self):
         return f'<HeroPower {self.id}>'
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_versions'
+
+    table_name = db.Column(db.String, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
+
+    def __repr__(self):
+        return f'<TableVersion {self.table_name} v{self.version}>'
+
+class HeroDocument(db.Model):
+    __tablename__ = 'hero_documents'
+
+    # Precomputed GET /heroes/<id> body, kept current by readmodel.py
+    hero_id = db.Column(db.Integer, db.ForeignKey('heroes.id', ondelete='CASCADE'), primary_key=True)
+    body = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
+
+    def __repr__(self):
+        return f'<HeroDocument {self.hero_id}>'
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counters'
+
+    # Row counts named in STAT_COUNTERS, kept current by triggers in stats.py
+    name = db.Column(db.String, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+class PowerStat(db.Model):
+    __tablename__ = 'power_stats'
+
+    # Hero_powers linking each power, by strength, kept current by triggers in stats.py
+    power_id = db.Column(db.Integer, db.ForeignKey('powers.id', ondelete='CASCADE'), primary_key=True)
+    hero_count = db.Column(db.Integer, nullable=False, default=0)
+    strong = db.Column(db.Integer, nullable=False, default=0)
+    weak = db.Column(db.Integer, nullable=False, default=0)
+    average = db.Column(db.Integer, nullable=False, default=0)
+
+    # Serves the top powers in order
+    __table_args__ = (
+        db.Index('ix_power_stats_hero_count_power_id', 'hero_count', 'power_id'),
+    )
+
+    def __repr__(self):
+        return f'<PowerStat {self.power_id} {self.hero_count}>'
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+
+    # Response stored for an Idempotency-Key header, replayed by idempotency.py
+    key = db.Column(db.String, primary_key=True)
+    fingerprint = db.Column(db.String, nullable=False)
+    status = db.Column(db.Integer, nullable=False)
+    body = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key} {self.status}>'
+
+# Dialect modules whose INSERT takes an ON CONFLICT clause
+UPSERT_DIALECTS = {
+    'sqlite': 'sqlalchemy.dialects.sqlite',
+    'postgresql': 'sqlalchemy.dialects.postgresql',
+}
+
+def upserts(dialect_name):
+    """Whether ``dialect_name`` writes upserts with INSERT ... ON CONFLICT.
+
+    The others SELECT first, then UPDATE or INSERT.
+    """
+    return dialect_name in UPSERT_DIALECTS
+
+def upsert(model, dialect_name):
+    """INSERT into ``model`` that takes an ON CONFLICT clause, for a dialect that ``upserts``."""
+    # Imported on use, since the PostgreSQL dialect alone slows every start
+    return importlib.import_module(UPSERT_DIALECTS[dialect_name]).insert(model)
+
+# Tables whose writes bump a version row
+VERSIONED_TABLES = ('heroes', 'powers', 'hero_powers')
+
+# Seed one version row per table whenever the table is created
+@event.listens_for(TableVersion.__table__, 'after_create')
+def seed_table_versions(target, connection, **kw):
+    connection.execute(target.insert(), [{'table_name': name, 'version': 0} for name in VERSIONED_TABLES])
+
+# Counter names of stat_counters, seeded whenever the table is created
+STAT_COUNTERS = ('heroes', 'powers', 'hero_powers', *(f'hero_powers.{strength}' for strength in STRENGTHS))
+
+@event.listens_for(StatCounter.__table__, 'after_create')
+def seed_stat_counters(target, connection, **kw):
+    connection.execute(target.insert(), [{'name': name, 'value': 0} for name in STAT_COUNTERS])
@@ -0,0 +1,207 @@
+import base64
+import binascii
+import json
+from urllib.parse import urlencode
+
+from flask import Response, abort, current_app, request, stream_with_context
+from sqlalchemy import tuple_
+
+from models import db
+
+# Default settings, overridable through app.config
+DEFAULT_MAX_PAGE_SIZE = 1000
+DEFAULT_STREAM_BATCH_SIZE = 500
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+# Cursors are opaque to clients: a url-safe base64 encoded JSON list of the
+# keyset values of the last row on the previous page.
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_values(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        abort(400, description="Invalid cursor")
+    if not isinstance(values, list) or not values:
+        abort(400, description="Invalid cursor")
+    return values
+
+def decode_cursor(cursor):
+    values = decode_values(cursor)
+    if len(values) != 1 or not isinstance(values[0], int):
+        abort(400, description="Invalid cursor")
+    return values[0]
+
+def parse_limit(args=None, max_size=None):
+    limit = (request.args if args is None else args).get('limit')
+    if limit is None:
+        return None
+    if max_size is None:
+        max_size = current_app.config.get('MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except ValueError:
+        abort(400, description="limit must be an integer")
+    if limit < 1 or limit > max_size:
+        abort(400, description=f"limit must be between 1 and {max_size}")
+    return limit
+
+def parse_after(args=None):
+    after = (request.args if args is None else args).get('after')
+    return decode_cursor(after) if after else None
+
+def wants_pagination(args=None):
+    args = request.args if args is None else args
+    return 'limit' in args or 'after' in args
+
+def stream_format(args=None, accept=None):
+    # ?stream=ndjson or an NDJSON Accept header selects NDJSON, any other
+    # truthy ?stream value selects a chunked JSON array
+    if args is None:
+        args, accept = request.args, request.accept_mimetypes
+    stream = args.get('stream', '').lower()
+    if stream == 'ndjson':
+        return 'ndjson'
+    if stream in ('1', 'true', 'json'):
+        return 'json'
+    if accept is not None and accept.best == NDJSON_MIMETYPE:
+        return 'ndjson'
+    return None
+
+
+class Order:
+    """Keyset order of a list by one column, with id breaking ties.
+
+    Cursors of the default order, ascending id, hold the last id alone.
+    Cursors of other orders also hold the sort spec and the last sort value,
+    so a cursor is rejected under a different ``sort``.
+    """
+
+    def __init__(self, table, name='id', descending=False):
+        self.table = table
+        self.name = name
+        self.descending = descending
+        self.keys = (table.c.id,) if name == 'id' else (table.c[name], table.c.id)
+
+    @property
+    def spec(self):
+        return ('-' if self.descending else '') + self.name
+
+    @property
+    def default(self):
+        return self.name == 'id' and not self.descending
+
+    def apply(self, statement, after=None):
+        """Order ``statement``, keeping only rows past the keyset values ``after``."""
+        if after is not None:
+            keys, values = (self.keys[0], after[0]) if len(self.keys) == 1 else (tuple_(*self.keys), tuple_(*after))
+            statement = statement.where(keys < values if self.descending else keys > values)
+        if len(self.keys) > 1:
+            # Selected under its own label, so cursors work whatever ?fields projects
+            statement = statement.add_columns(self.keys[0].label('sort_value'))
+        return statement.order_by(*(key.desc() if self.descending else key for key in self.keys))
+
+    def values(self, row):
+        return (row.id,) if len(self.keys) == 1 else (row.sort_value, row.id)
+
+    def cursor(self, row):
+        values = self.values(row)
+        return encode_cursor(values if self.default else [self.spec, *values])
+
+    def decode(self, cursor):
+        if self.default:
+            return (decode_cursor(cursor),)
+        values = decode_values(cursor)
+        if len(values) != len(self.keys) + 1 or values[0] != self.spec or not isinstance(values[-1], int):
+            abort(400, description="Invalid cursor")
+        return tuple(values[1:])
+
+    def parse_after(self, args=None):
+        after = (request.args if args is None else args).get('after')
+        return self.decode(after) if after else None
+
+def next_page_url(cursor, base_url=None, args=None):
+    if args is None:
+        base_url, args = request.base_url, request.args
+    args = args.to_dict()
+    args['after'] = cursor
+    return f'{base_url}?{urlencode(args)}'
+
+def paginate(statement, serializer, order):
+    """Return one keyset page of ``statement`` as a JSON list response.
+
+    The list body is unchanged from the unpaginated endpoint; the cursor for
+    the following page travels in the ``Link`` and ``X-Next-Cursor`` headers.
+    """
+    limit = parse_limit() or current_app.config.get('MAX_PAGE_SIZE', DEFAULT_MAX_PAGE_SIZE)
+    # Fetch one extra row to learn whether another page exists
+    statement = order.apply(statement, order.parse_after()).limit(limit + 1)
+    rows = db.session.execute(statement).all()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    response = current_app.json.response(serializer.dump_rows(rows))
+    if has_next:
+        link_next(response, order.cursor(rows[-1]))
+    return response
+
+def link_next(response, cursor):
+    response.headers['Link'] = f'<{next_page_url(cursor)}>; rel="next"'
+    response.headers['X-Next-Cursor'] = cursor
+
+
+def iter_batches(statement, order, after=None, batch_size=None):
+    """Yield successive keyset batches of ``statement`` in ``order``."""
+    if batch_size is None:
+        batch_size = current_app.config.get('STREAM_BATCH_SIZE', DEFAULT_STREAM_BATCH_SIZE)
+    while True:
+        rows = db.session.execute(order.apply(statement, after).limit(batch_size)).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        after = order.values(rows[-1])
+
+def stream(statement, serializer, fmt, order):
+    """Stream ``statement`` as a chunked JSON array or NDJSON, one batch at a time."""
+    dumps = current_app.json.dumps_bytes
+    batches = iter_batches(statement, order, order.parse_after())
+
+    def generate_json():
+        yield b'['
+        first = True
+        for rows in batches:
+            chunk = b','.join(dumps(item) for item in serializer.dump_rows(rows))
+            yield chunk if first else b',' + chunk
+            first = False
+        yield b']\n'
+
+    def generate_ndjson():
+        for rows in batches:
+            yield b''.join(dumps(item) + b'\n' for item in serializer.dump_rows(rows))
+
+    if fmt == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype=NDJSON_MIMETYPE)
+    return Response(stream_with_context(generate_json()), mimetype='application/json')
+
+def list_response(serializer, statement=None, order=None):
+    """Serve a list endpoint as a full list, a keyset page or a stream."""
+    if statement is None:
+        statement = serializer.statement
+    if order is None:
+        order = Order(serializer.table)
+    fmt = stream_format()
+    if fmt:
+        return stream(statement, serializer, fmt, order)
+    if wants_pagination():
+        return paginate(statement, serializer, order)
+    if not order.default:
+        statement = order.apply(statement)
+    rows = db.session.execute(statement).all()
+    return current_app.json.response(serializer.dump_rows(rows))
@@ -0,0 +1,262 @@
+import json
+
+import click
+from flask import Response, current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from encoding import dumps
+from models import db, Hero, Power, HeroPower, HeroDocument, upsert, upserts
+from serializers import HERO, IN_CHUNK_SIZE, run
+from tracking import ALL_ROWS
+
+# Default settings, overridable through app.config
+DEFAULT_REFRESH_LIMIT = 10000
+
+
+class ReadModel:
+    """Settings of the hero_documents read model.
+
+    Every hero's GET /heroes/<id> body is stored as compact JSON with sorted
+    keys. Commits that touch up to ``refresh_limit`` heroes recompute their
+    documents in the same transaction. Larger or unbounded writes, such as
+    bulk loads, delete the affected documents instead. Those heroes are then
+    served from the live tables until ``flask documents rebuild`` runs.
+    """
+
+    def __init__(self, enabled=True, refresh_limit=DEFAULT_REFRESH_LIMIT):
+        self.enabled = enabled
+        self.refresh_limit = refresh_limit
+
+
+read_model = ReadModel()
+
+
+def encode(document):
+    return dumps(document)
+
+def plan_documents(hero_ids):
+    """Plan computing ``{hero id: document bytes}`` for existing heroes in ``hero_ids``."""
+    documents = {}
+    ids = sorted(hero_ids)
+    for offset in range(0, len(ids), IN_CHUNK_SIZE):
+        rows = yield (HERO.statement.where(HERO.table.c.id.in_(ids[offset:offset + IN_CHUNK_SIZE]))
+                      .order_by(HERO.table.c.id))
+        for item in (yield from HERO.plan_rows(rows)):
+            documents[item['id']] = encode(item)
+    return documents
+
+def document_statement(id):
+    return select(HeroDocument.body).where(HeroDocument.hero_id == id)
+
+def render(body, pretty=False):
+    """The response body for stored ``body``, which is already compact."""
+    if pretty:
+        return dumps(json.loads(body), pretty=True) + b'\n'
+    return body + b'\n'
+
+def document_response(id):
+    """Serve GET /heroes/<id> from its stored document, or None without one."""
+    body = db.session.scalar(document_statement(id))
+    if body is None:
+        return None
+    return Response(render(body, current_app.json.pretty()), mimetype='application/json')
+
+
+# Change collection. Heroes whose documents need recomputing, and powers
+# whose holders do, accumulate in session.info until the commit.
+
+def stale(session):
+    return session.info.setdefault('stale_documents', {'heroes': set(), 'powers': set()})
+
+def mark(session, kind, ids=ALL_ROWS):
+    marked = stale(session)
+    if ids is ALL_ROWS or marked[kind] is ALL_ROWS:
+        marked[kind] = ALL_ROWS
+    else:
+        marked[kind].update(ids)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flush(session, flush_context):
+    if not read_model.enabled:
+        return
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Hero):
+            mark(session, 'heroes', {obj.id})
+        elif isinstance(obj, HeroPower):
+            # A hero_power moved to another hero changes both documents
+            history = inspect(obj).attrs.hero_id.history
+            mark(session, 'heroes', {id for id in (obj.hero_id, *history.deleted) if id is not None})
+        elif isinstance(obj, Power) and obj not in session.new:
+            mark(session, 'powers', {obj.id})
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_statement(orm_execute_state):
+    if not read_model.enabled or not (orm_execute_state.is_insert or orm_execute_state.is_update
+                                      or orm_execute_state.is_delete):
+        return
+    session = orm_execute_state.session
+    table_name = orm_execute_state.statement.table.name
+    parameters = orm_execute_state.parameters
+    rows = parameters if isinstance(parameters, list) else [parameters] if parameters else []
+    if orm_execute_state.is_insert:
+        key = {'heroes': 'id', 'hero_powers': 'hero_id'}.get(table_name)
+    else:
+        key = {'hero_powers': 'link_hero_id'}.get(table_name) if orm_execute_state.is_update else None
+
+    # Inserts name their rows in the parameters, as do bulk updates of
+    # hero_powers passing link_hero_id; anything else is unbounded
+    if key and rows and all(key in row for row in rows):
+        mark(session, 'heroes', {row[key] for row in rows})
+    elif table_name in ('heroes', 'hero_powers'):
+        mark(session, 'heroes')
+    elif table_name == 'powers' and not orm_execute_state.is_insert:
+        mark(session, 'powers')
+
+@event.listens_for(Session, 'before_commit')
+def refresh_documents(session):
+    """Recompute or invalidate the documents of heroes written in this transaction."""
+    if not read_model.enabled:
+        return
+    session.flush()
+    marked = session.info.pop('stale_documents', None)
+    if not marked:
+        return
+    heroes, powers = marked['heroes'], marked['powers']
+    if heroes is ALL_ROWS or powers is ALL_ROWS:
+        session.execute(delete(HeroDocument))
+        return
+
+    if powers:
+        # A power change fans out to the heroes holding it
+        if len(powers) > IN_CHUNK_SIZE:
+            session.execute(delete(HeroDocument))
+            return
+        holders = select(HeroPower.hero_id).where(HeroPower.power_id.in_(sorted(powers)))
+        found = set(session.scalars(holders.distinct().limit(read_model.refresh_limit + 1)))
+        if len(heroes | found) > read_model.refresh_limit:
+            session.execute(delete(HeroDocument).where(HeroDocument.hero_id.in_(holders)))
+            invalidate(session, heroes)
+            return
+        heroes = heroes | found
+
+    if len(heroes) > read_model.refresh_limit:
+        invalidate(session, heroes)
+    elif heroes:
+        lock(session, heroes)
+        write(session, heroes, run(plan_documents(heroes), session))
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_stale(session):
+    session.info.pop('stale_documents', None)
+
+def invalidate(session, hero_ids):
+    ids = sorted(hero_ids)
+    for offset in range(0, len(ids), IN_CHUNK_SIZE):
+        session.execute(delete(HeroDocument).where(HeroDocument.hero_id.in_(ids[offset:offset + IN_CHUNK_SIZE])))
+
+def lock(session, hero_ids):
+    """Lock the heroes rows of ``hero_ids`` until the commit.
+
+    Transactions refreshing the same hero then recompute its document one
+    after the other, each reading what the one before committed. SQLite
+    already runs one writing transaction at a time.
+    """
+    if session.get_bind().dialect.name == 'sqlite':
+        return
+    ids = sorted(hero_ids)
+    for offset in range(0, len(ids), IN_CHUNK_SIZE):
+        session.execute(select(Hero.id).where(Hero.id.in_(ids[offset:offset + IN_CHUNK_SIZE]))
+                        .order_by(Hero.id).with_for_update())
+
+def write(session, hero_ids, documents):
+    """Store the documents of ``hero_ids``; heroes missing from ``documents`` lose theirs.
+
+    Documents are upserted, so a document a concurrent transaction inserted
+    is overwritten rather than failing the commit. Backends without
+    INSERT ... ON CONFLICT delete and insert them under the lock.
+    """
+    dialect_name = session.get_bind().dialect.name
+    invalidate(session, set(hero_ids) - documents.keys() if upserts(dialect_name) else hero_ids)
+    if not documents:
+        return
+    rows = [{'hero_id': id, 'body': body} for id, body in documents.items()]
+    if upserts(dialect_name):
+        statement = upsert(HeroDocument, dialect_name)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[HeroDocument.hero_id],
+            set_={'body': statement.excluded.body, 'updated_at': func.current_timestamp()},
+        ), rows)
+    else:
+        session.execute(insert(HeroDocument), rows)
+
+
+def batches(batch_size):
+    """Yield ascending batches of hero ids."""
+    after = 0
+    while True:
+        ids = db.session.scalars(select(Hero.id).where(Hero.id > after).order_by(Hero.id).limit(batch_size)).all()
+        if not ids:
+            return
+        yield ids
+        after = ids[-1]
+
+def rebuild(batch_size=IN_CHUNK_SIZE * 10, echo=lambda message: None):
+    """Recompute every document in one transaction; return the number written."""
+    count = 0
+    db.session.execute(delete(HeroDocument))
+    for ids in batches(batch_size):
+        documents = run(plan_documents(ids))
+        db.session.execute(insert(HeroDocument), [{'hero_id': id, 'body': body} for id, body in documents.items()])
+        count += len(documents)
+        echo(f"  {count} documents")
+    db.session.commit()
+    return count
+
+def check(batch_size=IN_CHUNK_SIZE * 10):
+    """Compare stored documents with freshly computed ones.
+
+    Returns counts of ``missing`` heroes without a document (served live),
+    ``stale`` documents that differ from the tables, and ``orphaned``
+    documents of deleted heroes.
+    """
+    report = {'checked': 0, 'missing': 0, 'stale': 0, 'orphaned': 0}
+    for ids in batches(batch_size):
+        documents = run(plan_documents(ids))
+        stored = dict(db.session.execute(
+            select(HeroDocument.hero_id, HeroDocument.body).where(HeroDocument.hero_id.in_(ids))).all())
+        report['checked'] += len(ids)
+        for id in ids:
+            if id not in stored:
+                report['missing'] += 1
+            elif stored[id] != documents[id]:
+                report['stale'] += 1
+    report['orphaned'] = db.session.scalar(
+        select(func.count()).select_from(HeroDocument)
+        .where(~select(Hero.id).where(Hero.id == HeroDocument.hero_id).exists()))
+    return report
+
+
+documents_cli = AppGroup('documents', help="Manage the hero_documents read model.")
+
+@documents_cli.command('rebuild')
+@click.option('--batch-size', default=IN_CHUNK_SIZE * 10, show_default=True, help="Heroes per batch.")
+def rebuild_command(batch_size):
+    """Recompute every hero document from the tables."""
+    count = rebuild(batch_size, echo=click.echo)
+    click.echo(f"Rebuilt {count} hero documents.")
+
+@documents_cli.command('check')
+@click.option('--batch-size', default=IN_CHUNK_SIZE * 10, show_default=True, help="Heroes per batch.")
+def check_command(batch_size):
+    """Report heroes whose stored document is missing, stale or orphaned."""
+    report = check(batch_size)
+    click.echo(' '.join(f'{name}={value}' for name, value in report.items()))
+    if report['missing'] or report['stale'] or report['orphaned']:
+        raise SystemExit(1)
+
+def init_app(app):
+    read_model.enabled = app.config.get('READ_MODEL_ENABLED', True)
+    read_model.refresh_limit = app.config.get('READ_MODEL_REFRESH_LIMIT', DEFAULT_REFRESH_LIMIT)
+    app.cli.add_command(documents_cli)
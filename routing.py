@@ -0,0 +1,167 @@
+import itertools
+import math
+import threading
+import time
+from functools import wraps
+
+from flask import Response, request
+from werkzeug.http import dump_cookie
+
+from metrics import collector
+from models import db
+from serving import DEFAULT_SQLITE_PRAGMAS, apply_sqlite_pragmas
+
+# Default settings, overridable through app.config
+DEFAULT_STICKY_WINDOW = 5.0
+
+# SQLALCHEMY_BINDS keys of the replicas, numbered from 1
+REPLICA_BIND_PREFIX = 'replica_'
+
+# Holds the time until which the client reads from the primary
+STICKY_COOKIE = 'read_primary_until'
+
+# Read sources, part of the keys of responses cached or shared per source
+PRIMARY = 'primary'
+REPLICA = 'replica'
+
+
+def replica_binds(uris):
+    """SQLALCHEMY_BINDS entries for the comma-separated replica ``uris``."""
+    uris = [uri.strip() for uri in uris.split(',') if uri.strip()]
+    return {f'{REPLICA_BIND_PREFIX}{number}': uri for number, uri in enumerate(uris, 1)}
+
+def replica_pragmas(config):
+    # query_only makes a write sent to a replica fail instead of diverging it
+    # from the primary; journal_mode and synchronous only matter to writers
+    pragmas = {'query_only': 1}
+    if config.get('SQLITE_TUNING', True):
+        tuning = config.get('SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS)
+        pragmas.update((name, tuning[name]) for name in ('mmap_size', 'busy_timeout') if name in tuning)
+    return pragmas
+
+def prepare_replica(engine, config):
+    """Configure the connections of replica ``engine`` as read-only."""
+    if engine.dialect.name == 'sqlite':
+        apply_sqlite_pragmas(engine, replica_pragmas(config))
+
+
+def pinned(cookies):
+    """Whether ``cookies`` hold an unexpired read-your-writes pin to the primary."""
+    try:
+        return float(cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class Router:
+    """Replica engines the routed GETs read from, in turn.
+
+    Writes always use the primary. A client whose write succeeded is pinned
+    to the primary for ``window`` seconds by a cookie, so it reads its own
+    writes while the replicas catch up. Other clients may read data up to
+    the replication lag old, plus up to ``window`` more when the response
+    cache kept a replica read made before the replica caught up.
+    """
+
+    def __init__(self, window=DEFAULT_STICKY_WINDOW):
+        self.window = window
+        self.replicas = []
+        self._turns = itertools.count()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def choose(self, cookies):
+        """The replica engine a client with ``cookies`` reads from, None for the primary."""
+        if not self.replicas:
+            return None
+        if pinned(cookies):
+            self.record('pinned_reads')
+            return None
+        self.record('replica_reads')
+        return self.replicas[next(self._turns) % len(self.replicas)]
+
+    def pin_cookie(self):
+        """Set-Cookie header value pinning the client to the primary for ``window`` seconds."""
+        self.record('pins')
+        until = time.time() + self.window
+        # Max-Age must be whole seconds; the value holds the exact deadline
+        return dump_cookie(STICKY_COOKIE, f'{until:.3f}', max_age=math.ceil(self.window), httponly=True,
+                           samesite='Lax')
+
+    def record(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def reset(self):
+        with self._lock:
+            self.counts = {'replica_reads': 0, 'pinned_reads': 0, 'pins': 0}
+
+    def stats(self):
+        with self._lock:
+            return {**self.counts, 'replicas': len(self.replicas)}
+
+
+router = Router()
+
+
+@collector
+def routing_metrics():
+    return {f'db_routing_{name}' + ('' if name == 'replicas' else '_total'): value
+            for name, value in router.stats().items()}
+
+def source():
+    """The database the current request reads from, PRIMARY or REPLICA."""
+    return REPLICA if db.session.info.get('replica') is not None else PRIMARY
+
+def replica_reads(view):
+    """Run a GET resource method on a replica unless the client is pinned to the primary.
+
+    The replica stays chosen until the response is sent, so streamed bodies
+    read from it too.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        replica = router.choose(request.cookies)
+        if replica is None:
+            return view(*args, **kwargs)
+
+        info = db.session.info
+        previous = info.get('replica')
+        info['replica'] = replica
+
+        def restore():
+            if previous is None:
+                info.pop('replica', None)
+            else:
+                info['replica'] = previous
+
+        try:
+            response = view(*args, **kwargs)
+        except BaseException:
+            restore()
+            raise
+        if isinstance(response, Response) and response.is_streamed:
+            response.call_on_close(restore)
+        else:
+            restore()
+        return response
+    return wrapper
+
+def sticky_writes(view):
+    """Pin the client of a successful write to the primary for the read-your-writes window."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = view(*args, **kwargs)
+        if router.replicas and isinstance(response, Response) and 200 <= response.status_code < 300:
+            response.headers.add('Set-Cookie', router.pin_cookie())
+        return response
+    return wrapper
+
+
+def init_app(app):
+    router.window = app.config.get('READ_YOUR_WRITES_WINDOW', DEFAULT_STICKY_WINDOW)
+    with app.app_context():
+        router.replicas = [db.engines[key] for key in app.config.get('SQLALCHEMY_BINDS', {})
+                           if key.startswith(REPLICA_BIND_PREFIX)]
+        for engine in router.replicas:
+            prepare_replica(engine, app.config)
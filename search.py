@@ -0,0 +1,183 @@
+import re
+
+import click
+from flask import abort, current_app, request
+from flask.cli import with_appcontext
+from sqlalchemy import (DDL, Column, Integer, MetaData, Table, Text, and_, bindparam, case, event, literal, or_,
+                        select, text, union_all)
+
+from models import db
+from pagination import encode_cursor, link_next, parse_after, parse_limit
+from serializers import run
+
+# Default settings, overridable through app.config
+DEFAULT_SEARCH_PAGE_SIZE = 20
+
+# Indexed text columns per table. The first one ranks highest: matches in
+# it come before matches found only in the other columns
+INDEXED_COLUMNS = {
+    'heroes': ('name', 'super_name'),
+    'powers': ('name', 'description'),
+}
+
+
+def create_statements(table_name):
+    """SQLite DDL for the FTS5 index of ``table_name`` and its sync triggers.
+
+    The index uses external content, so it stores only the token index and
+    reads text from the base table. Prefix indexes of 2 and 3 characters keep
+    short prefix queries from scanning the whole vocabulary.
+    """
+    fts = f'{table_name}_fts'
+    columns = ', '.join(INDEXED_COLUMNS[table_name])
+    new = ', '.join(f'new.{column}' for column in INDEXED_COLUMNS[table_name])
+    old = ', '.join(f'old.{column}' for column in INDEXED_COLUMNS[table_name])
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({columns}, content='{table_name}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER {table_name}_fts_insert AFTER INSERT ON {table_name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {table_name}_fts_delete AFTER DELETE ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER {table_name}_fts_update AFTER UPDATE ON {table_name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new}); END",
+    ]
+
+def drop_statements(table_name):
+    return [
+        f"DROP TRIGGER IF EXISTS {table_name}_fts_insert",
+        f"DROP TRIGGER IF EXISTS {table_name}_fts_delete",
+        f"DROP TRIGGER IF EXISTS {table_name}_fts_update",
+        f"DROP TABLE IF EXISTS {table_name}_fts",
+    ]
+
+def rebuild_statement(table_name):
+    return f"INSERT INTO {table_name}_fts({table_name}_fts) VALUES ('rebuild')"
+
+for _table_name in INDEXED_COLUMNS:
+    for _statement in create_statements(_table_name):
+        event.listen(db.metadata.tables[_table_name], 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+    for _statement in drop_statements(_table_name):
+        event.listen(db.metadata.tables[_table_name], 'before_drop', DDL(_statement).execute_if(dialect='sqlite'))
+
+
+# The FTS5 tables are not part of db.metadata, so create_all leaves them to
+# the DDL above
+_fts_metadata = MetaData()
+FTS_TABLES = {
+    table_name: Table(f'{table_name}_fts', _fts_metadata,
+                      Column('rowid', Integer), Column(f'{table_name}_fts', Text),
+                      *(Column(column, Text) for column in columns))
+    for table_name, columns in INDEXED_COLUMNS.items()
+}
+
+
+def parse_terms(q):
+    return re.findall(r'\w+', q.lower())
+
+def fts_statement(serializer):
+    """Compile the SQLite search statement for ``serializer`` once.
+
+    Takes the bound parameters ``tier0`` and ``tier1`` (FTS5 queries),
+    ``window``, ``limit`` and ``offset``.
+    """
+    statement = _fts_statements.get(serializer)
+    if statement is None:
+        table = serializer.table
+        fts = FTS_TABLES[table.name]
+        matches = union_all(*(
+            select(select(fts.c.rowid, literal(number).label('tier'))
+                   .where(fts.c[fts.name].match(bindparam(f'tier{number}')))
+                   .order_by(fts.c.rowid).limit(bindparam('window')).subquery())
+            for number in range(2)
+        )).subquery()
+        page = (select(matches).order_by(matches.c.tier, matches.c.rowid)
+                .limit(bindparam('limit')).offset(bindparam('offset')).subquery())
+        statement = _fts_statements[serializer] = (
+            serializer.statement.join(page, page.c.rowid == table.c.id).order_by(page.c.tier, table.c.id))
+    return statement
+
+_fts_statements = {}
+
+def plan_search(serializer, terms, limit, offset, dialect_name):
+    """Plan one ranked page of rows matching every term as a word prefix.
+
+    Returns (items, has_next). Rows whose first indexed column matches rank
+    first, then rows matching through the other columns, each tier in id
+    order. Unlike bm25, tiers walk the index in rowid order and stop after
+    the page, so broad prefixes cost the same as narrow ones. SQLite answers
+    from the FTS5 index; other backends fall back to LIKE.
+    """
+    table = serializer.table
+    primary = INDEXED_COLUMNS[table.name][0]
+    if dialect_name == 'sqlite':
+        query = ' '.join(f'"{term}"*' for term in terms)
+        statement = (fts_statement(serializer), {
+            'tier0': f'{primary} : ({query})',
+            'tier1': f'({query}) NOT {primary} : ({query})',
+            'window': offset + limit + 1,
+            'limit': limit + 1,
+            'offset': offset,
+        })
+    else:
+        columns = [table.c[column] for column in INDEXED_COLUMNS[table.name]]
+        conditions = [or_(*(or_(column.istartswith(term, autoescape=True),
+                                column.icontains(f' {term}', autoescape=True)) for column in columns))
+                      for term in terms]
+        tier = case((and_(*(or_(columns[0].istartswith(term, autoescape=True),
+                                columns[0].icontains(f' {term}', autoescape=True)) for term in terms)), 0), else_=1)
+        statement = (serializer.statement.where(and_(*conditions))
+                     .order_by(tier, table.c.id).limit(limit + 1).offset(offset))
+
+    rows = yield statement
+    items = yield from serializer.plan_rows(rows[:limit])
+    return items, len(rows) > limit
+
+def search_page_args(args=None, max_size=None, page_size=DEFAULT_SEARCH_PAGE_SIZE):
+    """Parse ?q, ?limit and ?after into (terms, limit, offset)."""
+    args = request.args if args is None else args
+    terms = parse_terms(args.get('q', ''))
+    if not terms:
+        abort(400, description="q must contain at least one word")
+    limit = parse_limit(args, max_size) or page_size
+    # Search cursors carry the offset of the next page, since rows are
+    # ordered by tier before id
+    offset = parse_after(args) or 0
+    if offset < 0:
+        abort(400, description="Invalid cursor")
+    return terms, limit, offset
+
+def search_response(serializer):
+    """Serve one page of ranked search results as a JSON list."""
+    terms, limit, offset = search_page_args(
+        page_size=current_app.config.get('SEARCH_PAGE_SIZE', DEFAULT_SEARCH_PAGE_SIZE))
+    items, has_next = run(plan_search(serializer, terms, limit, offset, db.engine.dialect.name))
+    response = current_app.json.response(items)
+    if has_next:
+        link_next(response, encode_cursor([offset + limit]))
+    return response
+
+
+def rebuild():
+    """Rebuild the FTS5 indexes from the base tables."""
+    if db.engine.dialect.name == 'sqlite':
+        for table_name in INDEXED_COLUMNS:
+            db.session.execute(text(rebuild_statement(table_name)))
+        db.session.commit()
+
+@click.command('rebuild-search')
+@with_appcontext
+def rebuild_search_command():
+    """Rebuild the full-text search indexes from the base tables."""
+    rebuild()
+    click.echo("Rebuilt search indexes.")
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Alembic filter that keeps autogenerate from dropping the FTS5 tables,
+    which db.metadata does not describe."""
+    return not (type_ == 'table' and reflected and compare_to is None
+                and re.fullmatch(r'(%s)_fts(_\w+)?' % '|'.join(INDEXED_COLUMNS), name))
+
+def init_app(app):
+    app.cli.add_command(rebuild_search_command)
@@ -0,0 +1,161 @@
+import random
+import time
+from contextlib import contextmanager
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, select
+
+from models import db, Hero, Power, HeroPower, STRENGTHS
+
+# Size of the Faker-generated pools that rows are assembled from; drawing from
+# pools keeps generation fast and deterministic at millions of rows
+POOL_SIZE = 1000
+
+# PRAGMAs that trade durability for speed while the load runs
+BULK_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'journal_mode': 'MEMORY',
+    'temp_store': 'MEMORY',
+    'cache_size': '-262144',
+}
+
+
+class Generator:
+    """Deterministic row generator for heroes, powers and hero_powers."""
+
+    def __init__(self, seed):
+        from faker import Faker
+
+        fake = Faker()
+        Faker.seed(seed)
+        self.random = random.Random(seed)
+        self.first_names = [fake.first_name() for _ in range(POOL_SIZE)]
+        self.last_names = [fake.last_name() for _ in range(POOL_SIZE)]
+        self.words = [fake.word().title() for _ in range(POOL_SIZE)]
+        self.sentences = [fake.sentence(nb_words=10) for _ in range(POOL_SIZE)]
+
+    def heroes(self, first_id, count):
+        choice = self.random.choice
+        for id in range(first_id, first_id + count):
+            yield {
+                'id': id,
+                'name': f'{choice(self.first_names)} {choice(self.last_names)}',
+                'super_name': f'{choice(self.words)} {choice(self.words)}',
+            }
+
+    def powers(self, first_id, count):
+        choice = self.random.choice
+        for id in range(first_id, first_id + count):
+            yield {
+                'id': id,
+                'name': f'{choice(self.words)} {choice(self.words)}'.lower(),
+                'description': choice(self.sentences).ljust(20, '.'),
+            }
+
+    def hero_powers(self, hero_ids, power_ids, per_hero):
+        randint, sample, choice = self.random.randint, self.random.sample, self.random.choice
+        for hero_id in hero_ids:
+            count = min(randint(0, 2 * per_hero), len(power_ids))
+            for power_id in sample(power_ids, count):
+                yield {'hero_id': hero_id, 'power_id': power_id, 'strength': choice(STRENGTHS)}
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def load(table, rows, chunk_size):
+    """Insert ``rows`` into ``table`` with chunked executemany; return the row count."""
+    count = 0
+    for chunk in chunked(rows, chunk_size):
+        db.session.execute(insert(table), chunk)
+        count += len(chunk)
+    return count
+
+def next_id(model):
+    return (db.session.scalar(select(func.max(model.id))) or 0) + 1
+
+@contextmanager
+def bulk_load_pragmas(enabled):
+    """Apply BULK_LOAD_PRAGMAS on SQLite, restoring the previous values after."""
+    if not enabled or db.engine.dialect.name != 'sqlite':
+        yield
+        return
+    connection = db.session.connection()
+    previous = {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in BULK_LOAD_PRAGMAS}
+    # Leaving WAL needs exclusive access to the file, and WAL loads fast anyway
+    if str(previous['journal_mode']).lower() == 'wal':
+        del previous['journal_mode']
+    for name in previous:
+        connection.exec_driver_sql(f'PRAGMA {name}={BULK_LOAD_PRAGMAS[name]}')
+    try:
+        yield
+    finally:
+        connection = db.session.connection()
+        for name, value in previous.items():
+            connection.exec_driver_sql(f'PRAGMA {name}={value}')
+
+def clear():
+    for model in (HeroPower, Hero, Power):
+        db.session.execute(delete(model.__table__))
+
+def seed_database(heroes, powers, powers_per_hero, seed=0, chunk_size=10000, append=False, fast=False, echo=print):
+    """Generate and bulk load a dataset in one transaction; return rows per table."""
+    generator = Generator(seed)
+    counts = {}
+    started = time.perf_counter()
+
+    with bulk_load_pragmas(fast):
+        try:
+            if not append:
+                echo("Clearing db...")
+                clear()
+            first_power, first_hero = next_id(Power), next_id(Hero)
+            power_ids = range(first_power, first_power + powers)
+            hero_ids = range(first_hero, first_hero + heroes)
+
+            for table, rows in (
+                ('powers', generator.powers(first_power, powers)),
+                ('heroes', generator.heroes(first_hero, heroes)),
+                ('hero_powers', generator.hero_powers(hero_ids, power_ids, powers_per_hero)),
+            ):
+                echo(f"Seeding {table}...")
+                table_started = time.perf_counter()
+                counts[table] = load(db.metadata.tables[table], rows, chunk_size)
+                elapsed = time.perf_counter() - table_started
+                echo(f"  {counts[table]} rows in {elapsed:.2f}s ({counts[table] / max(elapsed, 1e-9):,.0f} rows/sec)")
+
+            db.session.commit()
+        except BaseException:
+            db.session.rollback()
+            raise
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    echo(f"Done seeding! {total} rows in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/sec)")
+    return counts
+
+
+@click.command('seed')
+@click.option('--heroes', default=10, show_default=True, help="Number of heroes to generate.")
+@click.option('--powers', default=4, show_default=True, help="Number of powers to generate.")
+@click.option('--powers-per-hero', default=1, show_default=True, help="Average number of powers per hero.")
+@click.option('--seed', default=0, show_default=True, help="Random seed; the same seed gives the same data.")
+@click.option('--chunk-size', default=10000, show_default=True, help="Rows per executemany batch.")
+@click.option('--append', is_flag=True, help="Add to the existing rows instead of clearing the tables.")
+@click.option('--fast', is_flag=True, help="Relax SQLite durability PRAGMAs while loading.")
+@with_appcontext
+def seed_command(heroes, powers, powers_per_hero, seed, chunk_size, append, fast):
+    """Generate a deterministic synthetic dataset and bulk load it."""
+    seed_database(heroes, powers, powers_per_hero, seed=seed, chunk_size=chunk_size,
+                  append=append, fast=fast, echo=click.echo)
+
+def init_app(app):
+    app.cli.add_command(seed_command)
@@ -0,0 +1,220 @@
+from sqlalchemy import select
+from sqlalchemy.engine import CursorResult
+
+from metrics import serialization
+from models import db, Hero, Power, HeroPower
+
+# SQLite caps the number of bound parameters per statement
+IN_CHUNK_SIZE = 500
+
+
+class Serializer:
+    """Precompiled JSON shape of one model.
+
+    The SELECT statement and the row layout are built once at import time, so
+    serializing is a slice-and-zip over plain result rows instead of walking
+    ``serialize_rules`` and ORM relationships for every object.
+
+    ``joined`` holds many-to-one relations, fetched in the same statement
+    through an outer join. ``children`` holds one-to-many relations, fetched
+    with one extra ``IN`` query per batch of parents.
+    """
+
+    def __init__(self, model, fields=None, joined=(), children=()):
+        table = model.__table__
+        self.model = model
+        self.table = table
+        self.fields = tuple(fields or table.columns.keys())
+        self.joined = []
+        self.children = tuple(children)
+        self._joined_relations = tuple(joined)
+        self._projections = {}
+
+        columns = [table.c[name] for name in self.fields]
+        self.joins = []
+        for key, serializer, foreign_key in joined:
+            start = len(columns)
+            columns.extend(serializer.columns)
+            self.joined.append((key, serializer, start, len(columns)))
+            self.joins.append((serializer.table, foreign_key == serializer.table.c.id))
+
+        self.columns = tuple(columns)
+        self.statement = select(*columns).select_from(self._outerjoin(table, self.joins))
+        self._width = len(self.fields)
+
+    @property
+    def names(self):
+        """Every top-level key of the serialized shape."""
+        return self.fields + tuple(key for key, *_ in self._joined_relations) + tuple(key for key, *_ in self.children)
+
+    def project(self, names):
+        """The serializer limited to ``names`` and id, compiled once per set of names.
+
+        Columns and relations left out are neither selected nor loaded.
+        """
+        names = frozenset(names) | {'id'}
+        projected = self._projections.get(names)
+        if projected is None:
+            projected = self._projections[names] = Serializer(
+                self.model,
+                fields=[name for name in self.fields if name in names],
+                joined=[relation for relation in self._joined_relations if relation[0] in names],
+                children=[relation for relation in self.children if relation[0] in names],
+            )
+        return projected
+
+    @staticmethod
+    def _outerjoin(from_clause, joins):
+        for table, onclause in joins:
+            from_clause = from_clause.outerjoin(table, onclause)
+        return from_clause
+
+    def dump_row(self, row):
+        item = dict(zip(self.fields, row[:self._width]))
+        for key, serializer, start, end in self.joined:
+            values = row[start:end]
+            item[key] = serializer.dump_row(values) if values[0] is not None else None
+        return item
+
+    # Loading is written as plans: generators that yield the statements they
+    # need and receive the resulting rows, so the same plan runs on the sync
+    # session through run() and on an AsyncSession through run_async().
+
+    def plan_rows(self, rows):
+        items = [self.dump_row(row) for row in rows]
+        for key, serializer, foreign_key in self.children:
+            groups = {}
+            for item in items:
+                item[key] = groups.setdefault(item['id'], [])
+            ids = list(groups)
+            position = serializer.fields.index(foreign_key.key)
+            for offset in range(0, len(ids), IN_CHUNK_SIZE):
+                statement = (serializer.statement
+                             .where(foreign_key.in_(ids[offset:offset + IN_CHUNK_SIZE]))
+                             .order_by(serializer.table.c.id))
+                child_rows = yield statement
+                children = yield from serializer.plan_rows(child_rows)
+                for row, child in zip(child_rows, children):
+                    groups[row[position]].append(child)
+        return items
+
+    def plan_get(self, id):
+        rows = yield self.statement.where(self.table.c.id == id)
+        if not rows:
+            return None
+        return (yield from self.plan_rows(rows[:1]))[0]
+
+    def plan_get_joined(self, id):
+        """Load one row and its children with a single hand-written join."""
+        assert len(self.children) <= 1, "a single join can only follow one child relation"
+        columns = list(self.columns)
+        from_clause = self._outerjoin(self.table, self.joins)
+        order_by = []
+        for key, serializer, foreign_key in self.children:
+            start = len(columns)
+            columns.extend(serializer.columns)
+            from_clause = from_clause.outerjoin(serializer.table, foreign_key == self.table.c.id)
+            from_clause = self._outerjoin(from_clause, serializer.joins)
+            order_by.append(serializer.table.c.id)
+
+        rows = yield (select(*columns).select_from(from_clause)
+                      .where(self.table.c.id == id).order_by(*order_by))
+        if not rows:
+            return None
+
+        item = self.dump_row(rows[0])
+        for key, serializer, foreign_key in self.children:
+            item[key] = [serializer.dump_row(row[start:]) for row in rows if row[start] is not None]
+        return item
+
+    def dump_rows(self, rows):
+        with serialization():
+            return run(self.plan_rows(rows))
+
+    def get(self, id):
+        with serialization():
+            return run(self.plan_get(id))
+
+    def get_joined(self, id):
+        with serialization():
+            return run(self.plan_get_joined(id))
+
+    def dump_object(self, obj):
+        """Serialize an already loaded ORM object, e.g. after a write."""
+        with serialization():
+            item = {name: getattr(obj, name) for name in self.fields}
+            for key, serializer, start, end in self.joined:
+                related = getattr(obj, key)
+                item[key] = serializer.dump_object(related) if related is not None else None
+            for key, serializer, foreign_key in self.children:
+                related = sorted(getattr(obj, key), key=lambda child: child.id)
+                item[key] = [serializer.dump_object(child) for child in related]
+            return item
+
+    def dump_returned(self, row, **related):
+        """Serialize a row returned by a write, with joined relations from loaded objects."""
+        with serialization():
+            item = {name: row._mapping[name] for name in self.fields}
+            for key, serializer, start, end in self.joined:
+                obj = related.get(key)
+                item[key] = serializer.dump_object(obj) if obj is not None else None
+            return item
+
+
+# Plans yield either a statement or a (statement, parameters) pair
+def _arguments(step):
+    return step if isinstance(step, tuple) else (step,)
+
+# Writes without RETURNING send the plan no rows
+def _rows(result):
+    if isinstance(result, CursorResult) and not result.returns_rows:
+        return []
+    return result.all()
+
+def run(plan, session=None):
+    """Run a plan on ``session``, by default ``db.session``.
+
+    A statement that fails raises its error inside the plan, which may catch it.
+    """
+    if session is None:
+        session = db.session
+    try:
+        step = next(plan)
+        while True:
+            try:
+                rows = _rows(session.execute(*_arguments(step)))
+            except Exception as error:
+                step = plan.throw(error)
+            else:
+                step = plan.send(rows)
+    except StopIteration as stop:
+        return stop.value
+
+async def run_async(plan, session):
+    """Run a plan on an ``AsyncSession``, like run()."""
+    try:
+        step = next(plan)
+        while True:
+            try:
+                rows = _rows(await session.execute(*_arguments(step)))
+            except Exception as error:
+                step = plan.throw(error)
+            else:
+                step = plan.send(rows)
+    except StopIteration as stop:
+        return stop.value
+
+
+# Compiled shapes, mirroring the serialize_rules on the models
+POWER = Serializer(Power)
+HERO_SUMMARY = Serializer(Hero)
+HERO_POWER_OF_HERO = Serializer(HeroPower, joined=(
+    ('power', POWER, HeroPower.__table__.c.power_id),
+))
+HERO = Serializer(Hero, children=(
+    ('hero_powers', HERO_POWER_OF_HERO, HeroPower.__table__.c.hero_id),
+))
+HERO_POWER = Serializer(HeroPower, joined=(
+    ('hero', HERO_SUMMARY, HeroPower.__table__.c.hero_id),
+    ('power', POWER, HeroPower.__table__.c.power_id),
+))
@@ -0,0 +1,90 @@
+import os
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from models import db
+
+# Applied to every new SQLite connection. WAL lets readers run alongside a
+# writer, NORMAL is durable in WAL mode except on power loss, and
+# busy_timeout makes writers queue instead of failing with "database is locked"
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 268435456,
+    'busy_timeout': 5000,
+}
+
+
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory')
+
+def engine_options(uri, pool_size, max_overflow, pool_pre_ping, pool_recycle, pool_timeout=30):
+    """SQLALCHEMY_ENGINE_OPTIONS for ``uri``."""
+    options = {'pool_pre_ping': pool_pre_ping, 'pool_recycle': pool_recycle}
+    # In-memory SQLite uses a single shared connection, which has no size
+    if not is_memory_sqlite(uri):
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    return options
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Run ``PRAGMA name=value`` for ``pragmas`` on every new connection of ``engine``."""
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def dispose_engine(server, worker):
+    # Forked workers must not reuse the connections the master opened
+    with worker.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+@click.command('serve')
+@click.option('--bind', '-b', default='127.0.0.1:5555', show_default=True, help="Address to listen on.")
+@click.option('--workers', '-w', type=int, default=lambda: int(os.environ.get('WEB_CONCURRENCY', 2)),
+              show_default='WEB_CONCURRENCY or 2', help="Number of worker processes.")
+@click.option('--threads', '-t', type=int, default=4, show_default=True, help="Threads per worker process.")
+@click.option('--timeout', type=int, default=30, show_default=True, help="Seconds before a silent worker is restarted.")
+@with_appcontext
+def serve_command(bind, workers, threads, timeout):
+    """Serve the app with gunicorn worker processes and threads."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise click.ClickException("The serve command requires gunicorn (pip install gunicorn)")
+
+    app = current_app._get_current_object()
+
+    class Server(BaseApplication):
+        def load_config(self):
+            settings = {
+                'bind': bind,
+                'workers': workers,
+                'threads': threads,
+                'worker_class': 'gthread' if threads > 1 else 'sync',
+                'timeout': timeout,
+                'post_fork': dispose_engine,
+            }
+            for name, value in settings.items():
+                self.cfg.set(name, value)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+def init_app(app):
+    if app.config.get('SQLITE_TUNING', True):
+        with app.app_context():
+            if db.engine.dialect.name == 'sqlite':
+                apply_sqlite_pragmas(db.engine, app.config.get('SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS))
+    app.cli.add_command(serve_command)
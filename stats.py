@@ -0,0 +1,248 @@
+import click
+from flask import abort, current_app
+from flask.cli import AppGroup
+from sqlalchemy import DDL, case, delete, event, func, insert, select
+
+from models import db, Hero, Power, HeroPower, PowerStat, StatCounter, STAT_COUNTERS, STRENGTHS
+from pagination import parse_limit
+from serializers import run
+
+# Default settings, overridable through app.config
+DEFAULT_TOP_POWERS = 10
+
+# power_stats column of each strength
+STRENGTH_COLUMNS = {strength: strength.lower() for strength in STRENGTHS}
+
+TRIGGERS = ('heroes_stats_insert', 'heroes_stats_delete', 'powers_stats_insert', 'powers_stats_delete',
+            'hero_powers_stats_insert', 'hero_powers_stats_delete', 'hero_powers_stats_update')
+
+# Dialects whose triggers keep the counter tables current. /stats reads only
+# those tables, so the app refuses to start on any other backend
+TRIGGER_DIALECTS = ('sqlite', 'postgresql')
+
+
+def _count(names, sign):
+    return f"UPDATE stat_counters SET value = value {sign} 1 WHERE name IN ({names})"
+
+def _count_hero_power(row, sign):
+    return _count(f"'hero_powers', 'hero_powers.' || {row}.strength", sign)
+
+def _power_stat(row, sign):
+    strengths = ', '.join(f"{column} = {column} {sign} CAST({row}.strength = '{strength}' AS INTEGER)"
+                          for strength, column in STRENGTH_COLUMNS.items())
+    return f"UPDATE power_stats SET hero_count = hero_count {sign} 1, {strengths} WHERE power_id = {row}.power_id"
+
+def create_statements():
+    """SQLite triggers that keep stat_counters and power_stats exact.
+
+    They run inside the writing statement, so every path that writes the
+    tables - the API, bulk loads, cascading deletes, raw SQL - moves the
+    counters in the same transaction.
+    """
+    zeros = ', '.join('0' for _ in STRENGTH_COLUMNS)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS heroes_stats_insert AFTER INSERT ON heroes BEGIN "
+        f"{_count(repr('heroes'), '+')}; END",
+        f"CREATE TRIGGER IF NOT EXISTS heroes_stats_delete AFTER DELETE ON heroes BEGIN "
+        f"{_count(repr('heroes'), '-')}; END",
+        f"CREATE TRIGGER IF NOT EXISTS powers_stats_insert AFTER INSERT ON powers BEGIN "
+        f"{_count(repr('powers'), '+')}; "
+        f"INSERT INTO power_stats (power_id, hero_count, {', '.join(STRENGTH_COLUMNS.values())}) "
+        f"VALUES (new.id, 0, {zeros}); END",
+        f"CREATE TRIGGER IF NOT EXISTS powers_stats_delete AFTER DELETE ON powers BEGIN "
+        f"{_count(repr('powers'), '-')}; DELETE FROM power_stats WHERE power_id = old.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS hero_powers_stats_insert AFTER INSERT ON hero_powers BEGIN "
+        f"{_count_hero_power('new', '+')}; {_power_stat('new', '+')}; END",
+        f"CREATE TRIGGER IF NOT EXISTS hero_powers_stats_delete AFTER DELETE ON hero_powers BEGIN "
+        f"{_count_hero_power('old', '-')}; {_power_stat('old', '-')}; END",
+        f"CREATE TRIGGER IF NOT EXISTS hero_powers_stats_update AFTER UPDATE OF power_id, strength ON hero_powers BEGIN "
+        f"{_count_hero_power('old', '-')}; {_power_stat('old', '-')}; "
+        f"{_count_hero_power('new', '+')}; {_power_stat('new', '+')}; END",
+    ]
+
+def drop_statements():
+    return [f"DROP TRIGGER IF EXISTS {trigger}" for trigger in TRIGGERS]
+
+def _postgresql_trigger(table, events, body):
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_stats ON {table}",
+        f"CREATE OR REPLACE FUNCTION {table}_stats() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+        f"{body} RETURN NULL; END $$",
+        f"CREATE TRIGGER {table}_stats AFTER {events} ON {table} FOR EACH ROW EXECUTE FUNCTION {table}_stats()",
+    ]
+
+def postgresql_create_statements():
+    """PostgreSQL triggers doing what those of create_statements do on SQLite.
+
+    One trigger function per table branches on TG_OP, since PostgreSQL
+    triggers run functions rather than inline statements.
+    """
+    zeros = ', '.join('0' for _ in STRENGTH_COLUMNS)
+    return [
+        *_postgresql_trigger('heroes', 'INSERT OR DELETE',
+                             f"IF TG_OP = 'INSERT' THEN {_count(repr('heroes'), '+')}; "
+                             f"ELSE {_count(repr('heroes'), '-')}; END IF;"),
+        *_postgresql_trigger('powers', 'INSERT OR DELETE',
+                             f"IF TG_OP = 'INSERT' THEN {_count(repr('powers'), '+')}; "
+                             f"INSERT INTO power_stats (power_id, hero_count, {', '.join(STRENGTH_COLUMNS.values())}) "
+                             f"VALUES (new.id, 0, {zeros}); "
+                             f"ELSE {_count(repr('powers'), '-')}; DELETE FROM power_stats WHERE power_id = old.id; "
+                             f"END IF;"),
+        *_postgresql_trigger('hero_powers', 'INSERT OR DELETE OR UPDATE OF power_id, strength',
+                             f"IF TG_OP IN ('DELETE', 'UPDATE') THEN "
+                             f"{_count_hero_power('old', '-')}; {_power_stat('old', '-')}; END IF; "
+                             f"IF TG_OP IN ('INSERT', 'UPDATE') THEN "
+                             f"{_count_hero_power('new', '+')}; {_power_stat('new', '+')}; END IF;"),
+    ]
+
+def postgresql_drop_statements():
+    # Dropping a function drops the triggers calling it
+    return [f"DROP FUNCTION IF EXISTS {table}_stats() CASCADE" for table in ('heroes', 'powers', 'hero_powers')]
+
+# Registered on the metadata, so the triggers are created once every table exists
+for _dialect, _create, _drop in (('sqlite', create_statements, drop_statements),
+                                 ('postgresql', postgresql_create_statements, postgresql_drop_statements)):
+    for _statement in _create():
+        event.listen(db.metadata, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+    for _statement in _drop():
+        event.listen(db.metadata, 'before_drop', DDL(_statement).execute_if(dialect=_dialect))
+
+
+def require_triggers(dialect_name):
+    """Raise RuntimeError unless triggers keep the counter tables current on ``dialect_name``."""
+    if dialect_name not in TRIGGER_DIALECTS:
+        raise RuntimeError(f"The /stats counters need triggers, which exist on "
+                           f"{' and '.join(TRIGGER_DIALECTS)} only, not on {dialect_name}")
+
+def computed_power_stats():
+    """GROUP BY computing the rows of power_stats from the tables."""
+    hero_powers = HeroPower.__table__
+    return (select(Power.id.label('power_id'), func.count(hero_powers.c.id).label('hero_count'),
+                   *(func.count(case((hero_powers.c.strength == strength, 1))).label(column)
+                     for strength, column in STRENGTH_COLUMNS.items()))
+            .select_from(Power.__table__.outerjoin(hero_powers, hero_powers.c.power_id == Power.id))
+            .group_by(Power.id))
+
+def plan_counters(maintained=True):
+    """Plan reading ``{counter name: value}``, from stat_counters or the tables."""
+    if maintained:
+        rows = yield select(StatCounter.name, StatCounter.value)
+        return dict(rows)
+    counters = {}
+    for name, model in (('heroes', Hero), ('powers', Power)):
+        rows = yield select(func.count()).select_from(model)
+        counters[name] = rows[0][0]
+    rows = yield select(HeroPower.strength, func.count()).group_by(HeroPower.strength)
+    by_strength = dict(rows)
+    counters['hero_powers'] = sum(by_strength.values())
+    for strength in STRENGTHS:
+        counters[f'hero_powers.{strength}'] = by_strength.get(strength, 0)
+    return counters
+
+def plan_summary(maintained=True):
+    counters = yield from plan_counters(maintained)
+    return {
+        'heroes': counters.get('heroes', 0),
+        'powers': counters.get('powers', 0),
+        'hero_powers': counters.get('hero_powers', 0),
+        'strengths': {strength: counters.get(f'hero_powers.{strength}', 0) for strength in STRENGTHS},
+    }
+
+def power_stats_statement(maintained=True):
+    """Per-power stats with the power's name, in power id order."""
+    source = PowerStat.__table__ if maintained else computed_power_stats().subquery()
+    return (select(source.c.power_id, Power.name, source.c.hero_count,
+                   *(source.c[column] for column in STRENGTH_COLUMNS.values()))
+            .join_from(source, Power.__table__, Power.id == source.c.power_id)
+            .order_by(source.c.power_id))
+
+def dump_power_stat(row):
+    return {
+        'power_id': row.power_id,
+        'name': row.name,
+        'heroes': row.hero_count,
+        'strengths': {strength: row._mapping[column] for strength, column in STRENGTH_COLUMNS.items()},
+    }
+
+def plan_power_stats(id=None, maintained=True):
+    """Plan the stats of every power, or of power ``id`` (None when it does not exist)."""
+    statement = power_stats_statement(maintained)
+    if id is None:
+        rows = yield statement
+        return [dump_power_stat(row) for row in rows]
+    rows = yield statement.where(statement.selected_columns.power_id == id)
+    return dump_power_stat(rows[0]) if rows else None
+
+def plan_top_powers(limit, maintained=True):
+    """Plan the ``limit`` powers held by the most heroes.
+
+    Stored counts are read in order from ix_power_stats_hero_count_power_id,
+    so ties go to the newer power.
+    """
+    statement = power_stats_statement(maintained)
+    columns = statement.selected_columns
+    rows = yield statement.order_by(None).order_by(columns.hero_count.desc(), columns.power_id.desc()).limit(limit)
+    return [dump_power_stat(row) for row in rows]
+
+
+def summary_response():
+    return current_app.json.response(run(plan_summary()))
+
+def power_stats_response(id=None):
+    stats = run(plan_power_stats(id))
+    if stats is None:
+        abort(404, description="Power not found")
+    return current_app.json.response(stats)
+
+def top_powers_response(args=None):
+    limit = parse_limit(args) or current_app.config.get('STATS_TOP_POWERS', DEFAULT_TOP_POWERS)
+    return current_app.json.response(run(plan_top_powers(limit)))
+
+
+def rebuild():
+    """Recompute every counter from the tables in one transaction."""
+    counters = run(plan_counters(maintained=False))
+    db.session.execute(delete(StatCounter))
+    db.session.execute(insert(StatCounter), [{'name': name, 'value': counters[name]} for name in STAT_COUNTERS])
+    db.session.execute(delete(PowerStat))
+    db.session.execute(insert(PowerStat.__table__).from_select(
+        ['power_id', 'hero_count', *STRENGTH_COLUMNS.values()], computed_power_stats()))
+    db.session.commit()
+    return counters
+
+def check():
+    """Compare the stored counters with freshly computed ones.
+
+    Returns the names of ``counters`` that differ and the number of
+    ``powers`` whose stored stats differ or are missing.
+    """
+    stored = run(plan_counters())
+    computed = run(plan_counters(maintained=False))
+    counters = [name for name in STAT_COUNTERS if stored.get(name) != computed[name]]
+    stored = {item['power_id']: item for item in run(plan_power_stats())}
+    computed = run(plan_power_stats(maintained=False))
+    powers = sum(stored.get(item['power_id']) != item for item in computed) + len(stored.keys() - {
+        item['power_id'] for item in computed})
+    return {'counters': counters, 'powers': powers}
+
+
+stats_cli = AppGroup('stats', help="Manage the counters behind /stats.")
+
+@stats_cli.command('rebuild')
+def rebuild_command():
+    """Recompute the counters behind /stats from the tables."""
+    counters = rebuild()
+    click.echo(' '.join(f'{name}={counters[name]}' for name in STAT_COUNTERS))
+
+@stats_cli.command('check')
+def check_command():
+    """Report counters that differ from the tables."""
+    report = check()
+    click.echo(f"counters={','.join(report['counters']) or 'ok'} powers={report['powers']}")
+    if report['counters'] or report['powers']:
+        raise SystemExit(1)
+
+def init_app(app):
+    with app.app_context():
+        require_triggers(db.engine.dialect.name)
+    app.cli.add_command(stats_cli)
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+from json import dumps, loads
+from urllib.parse import urlsplit
+
+import pytest
+from flask import has_app_context
+from werkzeug.datastructures import Headers
+
+from app import app
+from models import db
+import app_test
+import encoding_test
+import idempotency_test
+import listing_test
+import pagination_test
+import routing_test
+import search_test
+import stats_test
+
+
+class AsgiResponse:
+    def __init__(self, status_code, headers, data):
+        self.status_code = status_code
+        self.headers = headers
+        self.data = data
+        self.content_type = headers.get('Content-Type')
+        self.is_streamed = 'Content-Length' not in headers
+
+    @property
+    def json(self):
+        return loads(self.data)
+
+class AsgiClient:
+    '''The parts of Flask's test client the contract tests use, sent through an ASGI app.'''
+
+    def __init__(self, application, loop):
+        self.application = application
+        self.loop = loop
+
+    def open(self, path, method='GET', json=None, data=None, headers=None, content_type=None):
+        if json is not None:
+            data, content_type = dumps(json), 'application/json'
+        body = data.encode() if isinstance(data, str) else data or b''
+        headers = Headers(headers or {})
+        if content_type:
+            headers['Content-Type'] = content_type
+        url = urlsplit(path)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': method, 'scheme': 'http', 'path': url.path, 'root_path': '',
+            'query_string': url.query.encode(), 'server': ('localhost', 80),
+            'headers': [(b'host', b'localhost')] + [(name.lower().encode(), value.encode()) for name, value in headers],
+        }
+        response = asyncio.run_coroutine_threadsafe(self._call(scope, body), self.loop).result(timeout=30)
+        # The Flask test client shares the test's session; here the test has
+        # to reload whatever the ASGI app committed
+        if has_app_context():
+            db.session.expire_all()
+        return response
+
+    async def _call(self, scope, body):
+        messages = []
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if requested:
+                await asyncio.Event().wait()
+            requested = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await self.application(scope, receive, send)
+        start = messages[0]
+        headers = Headers([(name.decode(), value.decode()) for name, value in start['headers']])
+        return AsgiResponse(start['status'], headers, b''.join(m.get('body', b'') for m in messages[1:]))
+
+    def get(self, path, **kwargs):
+        return self.open(path, method='GET', **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.open(path, method='POST', **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.open(path, method='PATCH', **kwargs)
+
+
+@pytest.fixture(scope='module')
+def asgi_client():
+    '''Runs asgi.application on an event loop in a background thread.'''
+    from asgi import application
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield AsgiClient(application, loop)
+    asyncio.run_coroutine_threadsafe(application.dispose(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+@pytest.fixture(autouse=True)
+def serve_with_asgi(monkeypatch, asgi_client):
+    '''Points app.test_client() at the ASGI app so inherited tests run against it.'''
+    monkeypatch.setattr(app, 'test_client', lambda **kwargs: asgi_client)
+
+
+class TestAsgiApp(app_test.TestApp):
+    '''ASGI application in asgi.py'''
+
+class TestAsgiPagination(pagination_test.TestPagination):
+    '''Keyset pagination and streaming in asgi.py'''
+
+class TestAsgiSearch(search_test.TestSearch):
+    '''Full-text search in asgi.py'''
+
+class TestAsgiEncoding(encoding_test.TestEncoding):
+    '''JSON encoding in asgi.py'''
+
+class TestAsgiIdempotency(idempotency_test.TestIdempotency):
+    '''Conflict-safe hero_power writes and Idempotency-Key replays in asgi.py'''
+
+class TestAsgiListing(listing_test.TestListing):
+    '''Fields, sorting and filters of list endpoints in asgi.py'''
+
+class TestAsgiStats(stats_test.TestStats):
+    '''Aggregate statistics in asgi.py'''
+
+class TestAsgiRouting(routing_test.TestRouting):
+    '''Read-replica routing with read-your-writes in asgi.py'''
+
+
+class TestAsgiBulk:
+    '''Bulk hero_power creation in asgi.py'''
+
+    def test_creates_bulk_hero_powers(self, factory):
+        '''Reports per-item results with 207 when some items are rejected.'''
+
+        with app.app_context():
+            hero, power = factory.hero(), factory.power()
+
+            response = app.test_client().post('/hero_powers', json=[
+                {'hero_id': hero.id, 'power_id': power.id, 'strength': 'Strong'},
+                {'hero_id': hero.id, 'power_id': 10**9, 'strength': 'Weak'},
+            ])
+
+            assert response.status_code == 207
+            assert [item['status'] for item in response.json] == [201, 404]
+            assert response.json[0]['hero_power']['hero_id'] == hero.id
@@ -0,0 +1,88 @@
+import json
+
+import bulk
+from app import app
+from models import db, HeroPower, HeroDocument
+
+
+class TestBulkHeroPowers:
+    '''Bulk hero_power creation in bulk.py'''
+
+    def test_creates_many_in_constant_queries(self, assert_num_queries, factory):
+        '''Creates 200 hero_powers from a JSON array in a constant number of queries.'''
+
+        with app.app_context():
+            hero_ids = [hero.id for hero in factory.heroes(200)]
+            power_ids = [power.id for power in factory.powers(200)]
+            items = [{'hero_id': hero_id, 'power_id': power_id, 'strength': 'Strong'}
+                     for hero_id, power_id in zip(hero_ids, power_ids)]
+
+            # Two IN lookups, one executemany insert, one version bump and
+            # three statements refreshing the 200 hero documents
+            with assert_num_queries(7):
+                response = app.test_client().post('/hero_powers', json=items)
+
+            assert response.status_code == 201
+            assert [result['status'] for result in response.json] == [201] * 200
+            created = [result['hero_power'] for result in response.json]
+            assert [hp['hero_id'] for hp in created] == hero_ids
+            stored = {hp.id: hp.power_id for hp in HeroPower.query.filter(HeroPower.hero_id.in_(hero_ids))}
+            assert {hp['id']: hp['power_id'] for hp in created} == stored
+
+    def test_reports_partial_failures(self, factory):
+        '''Reports per-item errors and still creates the valid items.'''
+
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            items = [
+                {'hero_id': hero_id, 'power_id': power_id, 'strength': 'Weak'},
+                {'hero_id': hero_id, 'power_id': power_id, 'strength': 'Cheese'},
+                {'hero_id': hero_id, 'power_id': 10**9, 'strength': 'Weak'},
+                {'hero_id': hero_id},
+            ]
+
+            response = app.test_client().post('/hero_powers', json=items)
+
+            assert response.status_code == 207
+            assert [result['status'] for result in response.json] == [201, 400, 404, 400]
+            assert response.json[1]['error'] == "Invalid strength value"
+            assert HeroPower.query.filter_by(hero_id=hero_id).count() == 1
+
+    def test_accepts_ndjson(self, factory):
+        '''Accepts an NDJSON body and reports unparseable lines.'''
+
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            body = json.dumps({'hero_id': hero_id, 'power_id': power_id, 'strength': 'Average'}) + '\n{oops\n'
+
+            response = app.test_client().post('/hero_powers', data=body,
+                                              content_type='application/x-ndjson')
+
+            assert response.status_code == 207
+            assert [result['status'] for result in response.json] == [201, 400]
+            assert response.json[0]['hero_power']['strength'] == 'Average'
+
+    def test_select_upsert_keeps_other_documents(self, monkeypatch, factory):
+        '''Refreshes only the documents of the updated links when writing without ON CONFLICT.'''
+
+        with app.app_context():
+            power = factory.power()
+            updated, other = factory.heroes(2)
+            factory.links(updated, [power])
+            factory.links(other, [power])
+            monkeypatch.setattr(bulk, 'upserts', lambda dialect_name: False)
+
+            response = app.test_client().post('/hero_powers', json=[
+                {'hero_id': updated.id, 'power_id': power.id, 'strength': 'Weak'}])
+
+            assert response.status_code == 201
+            db.session.expire_all()
+            document = json.loads(db.session.get(HeroDocument, updated.id).body)
+            assert [hp['strength'] for hp in document['hero_powers']] == ['Weak']
+            assert db.session.get(HeroDocument, other.id) is not None
+
+    def test_rejects_empty_batch(self):
+        '''Rejects an empty array.'''
+
+        with app.app_context():
+            assert app.test_client().post('/hero_powers', json=[]).status_code == 400
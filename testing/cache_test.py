@@ -0,0 +1,124 @@
+import time
+
+from sqlalchemy import update
+
+from app import app
+from models import db, Hero, Power, TableVersion
+from cache import ResponseCache, response_cache
+from versions import version_snapshot
+from routing import router
+
+
+class TestResponseCache:
+    '''Response cache in cache.py'''
+
+    def test_serves_repeated_reads_from_cache(self, assert_num_queries, factory):
+        '''Serves a repeated GET without touching the database.'''
+
+        with app.app_context():
+            power = factory.power()
+
+            client = app.test_client()
+            first = client.get(f'/powers/{power.id}')
+            assert first.headers['X-Cache'] == 'MISS'
+
+            hits = response_cache.stats()['hits']
+            with assert_num_queries(0):
+                second = client.get(f'/powers/{power.id}')
+            assert second.headers['X-Cache'] == 'HIT'
+            assert second.data == first.data
+            assert response_cache.stats()['hits'] == hits + 1
+
+    def test_patch_invalidates_power_and_heroes(self, factory):
+        '''Drops cached powers and heroes when a power is patched.'''
+
+        with app.app_context():
+            hero, power = factory.hero(), factory.power()
+            factory.link(hero, power, 'Weak')
+
+            client = app.test_client()
+            client.get(f'/powers/{power.id}')
+            client.get(f'/heroes/{hero.id}')
+
+            description = 'A freshly patched description for this power'
+            assert client.patch(f'/powers/{power.id}', json={'description': description}).status_code == 200
+
+            response = client.get(f'/powers/{power.id}')
+            assert response.headers['X-Cache'] == 'MISS'
+            assert response.json['description'] == description
+            response = client.get(f'/heroes/{hero.id}')
+            assert response.headers['X-Cache'] == 'MISS'
+            assert response.json['hero_powers'][0]['power']['description'] == description
+
+    def test_other_workers_commits_change_key(self, factory):
+        '''Reads anew once another worker's commit reaches the version snapshot, sending the matching ETag.'''
+
+        with app.app_context():
+            power = factory.power()
+            client = app.test_client()
+            client.get(f'/powers/{power.id}')
+            cached = client.get(f'/powers/{power.id}')
+            assert cached.headers['X-Cache'] == 'HIT'
+
+            # Committed outside this process's sessions, so no invalidation runs
+            with db.engine.begin() as connection:
+                connection.execute(update(Power).where(Power.id == power.id)
+                                   .values(description='Changed by another worker process'))
+                connection.execute(update(TableVersion).where(TableVersion.table_name == 'powers')
+                                   .values(version=TableVersion.version + 1))
+            # As when the snapshot TTL runs out
+            version_snapshot.invalidate()
+
+            response = client.get(f'/powers/{power.id}')
+            assert response.headers['X-Cache'] == 'MISS'
+            assert response.json['description'] == 'Changed by another worker process'
+            assert response.headers['ETag'] != cached.headers['ETag']
+            assert client.get(f'/powers/{power.id}', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    def test_rolled_back_writes_keep_cache(self):
+        '''Keeps cached entries when a write is rolled back.'''
+
+        with app.app_context():
+            client = app.test_client()
+            client.get('/powers')
+
+            db.session.add(Hero(name='Rolled', super_name='Back'))
+            db.session.flush()
+            db.session.rollback()
+
+            assert client.get('/powers').headers['X-Cache'] == 'HIT'
+
+    def test_evicts_least_recently_used(self):
+        '''Evicts the least recently used entry beyond maxsize.'''
+
+        cache = ResponseCache(maxsize=2, ttl=60)
+        cache.set('a', 1, cache.generation)
+        cache.set('b', 2, cache.generation)
+        cache.get('a')
+        cache.set('c', 3, cache.generation)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.stats()['evictions'] == 1
+
+    def test_expires_entries(self):
+        '''Misses once an entry has outlived its TTL.'''
+
+        cache = ResponseCache(maxsize=2, ttl=-1)
+        cache.set('a', 1, cache.generation)
+
+        assert cache.get('a') is None
+
+    def test_replica_reads_expire_with_window(self, replicate, monkeypatch, factory):
+        '''Keeps responses read from a replica for no longer than the read-your-writes window.'''
+
+        with app.app_context():
+            power = factory.power()
+            replicate()
+            monkeypatch.setattr(router, 'window', 0.2)
+
+            client = app.test_client(use_cookies=False)
+            assert client.get(f'/powers/{power.id}').headers['X-Cache'] == 'MISS'
+            assert client.get(f'/powers/{power.id}').headers['X-Cache'] == 'HIT'
+            time.sleep(0.3)
+            assert client.get(f'/powers/{power.id}').headers['X-Cache'] == 'MISS'
@@ -0,0 +1,150 @@
+import sys
+import threading
+import time
+
+from flask import Response, abort
+from werkzeug.exceptions import NotFound
+
+from app import app
+from cache import response_cache
+from coalescing import coalesced, coalescer
+
+
+def run_concurrently(call, count, monkeypatch):
+    """Start ``count`` calls, the first as leader, once the others joined its flight."""
+    joined = threading.Semaphore(0)
+    join = coalescer.join
+
+    def counted_join(key):
+        result = join(key)
+        joined.release()
+        return result
+
+    monkeypatch.setattr(coalescer, 'join', counted_join)
+    results = [None] * count
+
+    def work(index):
+        try:
+            results[index] = call()
+        except Exception as error:
+            results[index] = error
+
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+        joined.acquire()
+    return threads, results
+
+def blocked_view(release, calls, **response):
+    def view():
+        calls.append(1)
+        release.wait(5)
+        if response.get('status') == 404:
+            abort(404, description="Power not found")
+        return Response(b'{"shared":true}\n', mimetype='application/json')
+    return view
+
+
+class TestCoalescing:
+    '''Request coalescing in coalescing.py'''
+
+    def test_shares_one_computation(self, factory, monkeypatch):
+        '''Runs concurrent identical GETs once and counts the coalesced followers.'''
+
+        with app.app_context():
+            power_id = factory.power(name='herd').id
+
+        app_module = sys.modules['app']
+        release, calls, load = threading.Event(), [], app_module.load
+
+        def slow_load(*args):
+            calls.append(1)
+            release.wait(5)
+            return load(*args)
+
+        monkeypatch.setattr(app_module, 'load', slow_load)
+        monkeypatch.setattr(response_cache, 'maxsize', 0)
+        before = coalescer.stats()
+        threads, results = run_concurrently(lambda: app.test_client().get(f'/powers/{power_id}'), 4, monkeypatch)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert [response.status_code for response in results] == [200] * 4
+        assert all(response.data == results[0].data for response in results)
+        assert results[0].json['name'] == 'herd'
+        after = coalescer.stats()
+        assert after['leaders'] == before['leaders'] + 1
+        assert after['coalesced'] == before['coalesced'] + 3
+        assert after['in_flight'] == 0
+        assert 'request_coalescing_coalesced_total' in app.test_client().get('/metrics').get_data(as_text=True)
+
+    def test_followers_share_http_errors(self, monkeypatch):
+        '''Re-raises the leader's HTTP error in each follower.'''
+
+        release, calls = threading.Event(), []
+        view = coalesced('powers')(blocked_view(release, calls, status=404))
+
+        def call():
+            with app.test_request_context('/powers/123456789'):
+                return view()
+
+        threads, results = run_concurrently(call, 3, monkeypatch)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert all(isinstance(error, NotFound) and error.description == "Power not found" for error in results)
+
+    def test_waits_are_bounded(self, monkeypatch):
+        '''Runs the view itself when the leader takes longer than the timeout.'''
+
+        release, calls = threading.Event(), []
+        view = coalesced('powers')(blocked_view(release, calls))
+        monkeypatch.setattr(coalescer, 'timeout', 0.05)
+        before = coalescer.stats()['timeouts']
+
+        def call():
+            with app.test_request_context('/powers?slow=1'):
+                response = view()
+                return response.status_code
+
+        threads, results = run_concurrently(call, 2, monkeypatch)
+        started = time.monotonic()
+        while coalescer.stats()['timeouts'] == before and time.monotonic() - started < 5:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 2
+        assert results == [200, 200]
+        assert coalescer.stats()['timeouts'] == before + 1
+
+    def test_writes_start_new_flights(self, factory):
+        '''Keeps requests arriving after a commit out of flights that started before it.'''
+
+        key = ('powers', '/powers?after=write')
+        flight, leader = coalescer.join(key)
+        assert leader
+        try:
+            assert coalescer.join(key) == (flight, False)
+            with app.app_context():
+                factory.power(name='late')
+            second, leader = coalescer.join(key)
+            assert leader and second is not flight
+            coalescer.land(key, second)
+        finally:
+            coalescer.land(key, flight)
+
+    def test_streams_are_not_coalesced(self, monkeypatch):
+        '''Runs streamed formats without joining a flight.'''
+
+        joins = []
+        monkeypatch.setattr(coalescer, 'join', lambda key: joins.append(key))
+        view = coalesced('powers')(lambda: Response(b''))
+        with app.test_request_context('/powers?stream=ndjson'):
+            assert view().status_code == 200
+        assert joins == []
@@ -0,0 +1,99 @@
+import gzip
+
+import brotli
+
+import compression
+from app import app
+
+
+class TestCompression:
+    '''Response compression in compression.py'''
+
+    def test_gzip_list(self, factory):
+        '''Gzips large list responses for clients that accept gzip.'''
+
+        with app.app_context():
+            factory.heroes(30)
+            client = app.test_client()
+            plain = client.get('/heroes')
+            response = client.get('/heroes', headers={'Accept-Encoding': 'gzip'})
+
+            assert 'Content-Encoding' not in plain.headers
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'Accept-Encoding' in response.headers['Vary']
+            assert len(response.data) < len(plain.data)
+            assert gzip.decompress(response.data) == plain.data
+
+    def test_prefers_accepted_quality(self, factory):
+        '''Picks brotli on ties and otherwise the coding with the higher quality.'''
+
+        with app.app_context():
+            factory.heroes(30)
+            client = app.test_client()
+            plain = client.get('/heroes').data
+
+            response = client.get('/heroes', headers={'Accept-Encoding': 'gzip, deflate, br'})
+            assert response.headers['Content-Encoding'] == 'br'
+            assert brotli.decompress(response.data) == plain
+
+            response = client.get('/heroes', headers={'Accept-Encoding': 'gzip;q=1, br;q=0.5'})
+            assert response.headers['Content-Encoding'] == 'gzip'
+
+            response = client.get('/heroes', headers={'Accept-Encoding': 'identity'})
+            assert 'Content-Encoding' not in response.headers
+
+    def test_skips_small_responses(self, factory):
+        '''Sends bodies below the size threshold uncompressed.'''
+
+        with app.app_context():
+            hero = factory.hero(name='Tiny', super_name='Small')
+
+            response = app.test_client().get(f'/heroes/{hero.id}', headers={'Accept-Encoding': 'gzip'})
+
+            assert len(response.data) < compression.compression.min_size
+            assert 'Content-Encoding' not in response.headers
+
+    def test_streams_compressed(self, factory):
+        '''Compresses streamed lists chunk by chunk.'''
+
+        with app.app_context():
+            factory.heroes(30)
+            client = app.test_client()
+            plain = client.get('/heroes?stream=ndjson').data
+            response = client.get('/heroes?stream=ndjson', headers={'Accept-Encoding': 'gzip'})
+
+            assert response.is_streamed
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert gzip.decompress(response.data) == plain
+
+    def test_reuses_cached_compressed_body(self, monkeypatch, factory):
+        '''Keeps compressed bytes in the response cache so hits skip the compressor.'''
+
+        with app.app_context():
+            factory.heroes(30)
+            calls = []
+            compress = compression.compress
+            monkeypatch.setattr(compression, 'compress', lambda data, coding: calls.append(coding) or compress(data, coding))
+            client = app.test_client()
+            headers = {'Accept-Encoding': 'gzip'}
+
+            first = client.get('/heroes?cached=1', headers=headers)
+            second = client.get('/heroes?cached=1', headers=headers)
+
+            assert [first.headers['X-Cache'], second.headers['X-Cache']] == ['MISS', 'HIT']
+            assert second.headers['Content-Encoding'] == 'gzip'
+            assert second.data == first.data
+            assert calls == ['gzip']
+
+    def test_conditional_get_with_weak_etag(self, factory):
+        '''Weakens the ETag of compressed responses and still answers 304 for it.'''
+
+        with app.app_context():
+            factory.heroes(30)
+            client = app.test_client()
+            response = client.get('/heroes', headers={'Accept-Encoding': 'gzip'})
+            etag = response.headers['ETag']
+
+            assert etag.startswith('W/')
+            revalidated = client.get('/heroes', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+            assert revalidated.status_code == 304
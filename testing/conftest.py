@@ -1,9 +1,108 @@
 #!/usr/bin/env python3
 
+import os
+
+import pytest
+
+# Runs the suite on an empty database of its own instead of app.db, see
+# testing_config in app.py
+os.environ.setdefault('APP_CONFIG', 'testing')
+
 def pytest_itemcollected(item):
     par = item.parent.obj
     node = item.obj
     pref = par.__doc__.strip() if par.__doc__ else par.__class__.__name__
     suf = node.__doc__.strip() if node.__doc__ else node.__name__
     if pref or suf:
-        item._nodeid = ' '.join((pref, suf))
\ No newline at end of file
+        item._nodeid = ' '.join((pref, suf))
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    '''Creates the tables of the test database once, before the suite runs.'''
+    from app import app
+    from models import db
+
+    with app.app_context():
+        db.create_all()
+    yield
+
+@pytest.fixture
+def assert_num_queries():
+    '''Asserts that a block sends exactly the given number of SQL statements.'''
+    from contextlib import contextmanager
+    from loading import count_queries
+
+    @contextmanager
+    def check(expected):
+        with count_queries() as counter:
+            yield counter
+        assert counter.count == expected, \
+            f"expected {expected} queries, got {counter.count}:\n" + '\n'.join(counter.statements)
+
+    return check
+
+@pytest.fixture
+def replicate(tmp_path, monkeypatch):
+    '''Copies the database to SQLite files that routed GETs then read from.'''
+    import sqlite3
+    from sqlalchemy import create_engine
+    from app import app
+    from models import db
+    from routing import prepare_replica, router
+
+    engines = []
+
+    def copy(count=1):
+        with app.app_context():
+            source = sqlite3.connect(db.engine.url.database)
+        for number in range(count):
+            path = tmp_path / f'replica_{len(engines) + 1}.db'
+            target = sqlite3.connect(path)
+            source.backup(target)
+            target.close()
+            engine = create_engine(f'sqlite:///{path}')
+            prepare_replica(engine, app.config)
+            engines.append(engine)
+        source.close()
+        monkeypatch.setattr(router, 'replicas', engines[-count:])
+        return engines[-count:]
+
+    yield copy
+    for engine in engines:
+        engine.dispose()
+
+@pytest.fixture
+def factory():
+    '''Adds and commits heroes, powers and hero_powers, with Faker values for the fields a test leaves out.'''
+    from faker import Faker
+    from models import db, Hero, Power, HeroPower
+
+    fake = Faker()
+
+    class Factory:
+        def add(self, rows):
+            db.session.add_all(rows)
+            db.session.commit()
+            return rows
+
+        def heroes(self, count, **fields):
+            return self.add([Hero(**{'name': fake.name(), 'super_name': fake.name(), **fields})
+                             for _ in range(count)])
+
+        def powers(self, count, **fields):
+            return self.add([Power(**{'name': fake.name(), 'description': fake.sentence(nb_words=10), **fields})
+                             for _ in range(count)])
+
+        def links(self, hero, powers, strength='Strong'):
+            return self.add([HeroPower(hero=hero, power=power, strength=strength) for power in powers])
+
+        def hero(self, **fields):
+            return self.heroes(1, **fields)[0]
+
+        def power(self, **fields):
+            return self.powers(1, **fields)[0]
+
+        def link(self, hero, power, strength='Strong'):
+            return self.links(hero, [power], strength)[0]
+
+    return Factory()
@@ -0,0 +1,51 @@
+import json
+
+import encoding
+from app import app
+from encoding import JSONProvider, dumps
+
+
+class TestEncoding:
+    '''JSON provider in encoding.py'''
+
+    def test_compact_by_default(self, factory):
+        '''Serves compact JSON unless ?pretty=1 asks for indentation.'''
+
+        with app.app_context():
+            hero = factory.hero()
+
+            client = app.test_client()
+            for path in ('/heroes', f'/heroes/{hero.id}', '/heroes?limit=2'):
+                compact = client.get(path)
+                pretty = client.get(path + ('&' if '?' in path else '?') + 'pretty=1')
+
+                assert b'\n  ' not in compact.data
+                assert compact.data.endswith(b'\n')
+                assert b'\n  ' in pretty.data
+                assert json.loads(pretty.data) == json.loads(compact.data)
+
+    def test_backends_encode_identically(self):
+        '''Encodes the same bytes with orjson and the stdlib.'''
+
+        obj = {'name': 'Zoë', 'hero_powers': [], 'id': 1, 'quote': 'say "hi"\\', 'power': None}
+        for pretty in (False, True):
+            assert dumps(obj, pretty, backend='orjson') == dumps(obj, pretty, backend='json')
+        assert dumps(obj) == json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode()
+
+    def test_falls_back_to_stdlib(self, monkeypatch):
+        '''Uses the stdlib json module when orjson is not installed.'''
+
+        monkeypatch.setattr(encoding, 'orjson', None)
+        provider = JSONProvider(app)
+
+        assert provider.backend == 'json'
+        assert provider.dumps_bytes({'b': 1, 'a': [2]}) == b'{"a":[2],"b":1}'
+        assert provider.loads('{"a": 1}') == {'a': 1}
+
+    def test_rejects_invalid_json(self):
+        '''Returns 400 for a malformed JSON request body.'''
+
+        response = app.test_client().post('/hero_powers', data='{"hero_id": ',
+                                          content_type='application/json')
+
+        assert response.status_code == 400
@@ -0,0 +1,214 @@
+import threading
+
+from sqlalchemy import insert
+
+import bulk
+import idempotency
+from app import app
+from bulk import plan_upsert
+from models import db, HeroPower, IdempotencyKey
+from serializers import run
+
+
+def links(hero_id, power_id):
+    db.session.expire_all()
+    return HeroPower.query.filter_by(hero_id=hero_id, power_id=power_id).all()
+
+def post_concurrently(json, count, headers=None):
+    barrier = threading.Barrier(count)
+    responses = [None] * count
+
+    def work(index):
+        barrier.wait()
+        responses[index] = app.test_client().post('/hero_powers', json=json, headers=headers)
+
+    threads = [threading.Thread(target=work, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+class RacingSession:
+    '''Runs ``race`` once, just before the first INSERT of a plan.'''
+
+    def __init__(self, race):
+        self.race = race
+
+    def execute(self, statement, *args):
+        if self.race is not None and statement.is_insert:
+            race, self.race = self.race, None
+            race()
+        return db.session.execute(statement, *args)
+
+
+class TestIdempotency:
+    '''Conflict-safe hero_power writes and Idempotency-Key replays in idempotency.py'''
+
+    def test_repeated_post_updates_link(self, factory):
+        '''Answers a repeated POST with the existing link, updated to the new strength.'''
+
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            client = app.test_client()
+
+            first = client.post('/hero_powers', json={'hero_id': hero_id, 'power_id': power_id, 'strength': 'Weak'})
+            second = client.post('/hero_powers', json={'hero_id': hero_id, 'power_id': power_id,
+                                                       'strength': 'Strong'})
+
+            assert first.status_code == second.status_code == 201
+            assert second.json['id'] == first.json['id']
+            assert second.json['strength'] == 'Strong'
+            assert second.json['hero']['id'] == hero_id
+            assert second.json['power']['id'] == power_id
+            assert [link.strength for link in links(hero_id, power_id)] == ['Strong']
+            assert len(client.get(f'/heroes/{hero_id}').json['hero_powers']) == 1
+
+    def test_upsert_is_one_statement(self, assert_num_queries, factory):
+        '''Writes an existing link again with a single statement.'''
+
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            rows = [{'hero_id': hero_id, 'power_id': power_id, 'strength': 'Average'}]
+            created = run(plan_upsert(rows, db.engine.dialect.name))[hero_id, power_id]
+            with assert_num_queries(1):
+                again = run(plan_upsert(rows, db.engine.dialect.name))[hero_id, power_id]
+            db.session.commit()
+            assert again.id == created.id
+
+    def test_bulk_collapses_repeated_pairs(self, factory):
+        '''Reports every bulk item naming the same pair with the link as finally written.'''
+
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            response = app.test_client().post('/hero_powers', json=[
+                {'hero_id': hero_id, 'power_id': power_id, 'strength': 'Weak'},
+                {'hero_id': hero_id, 'power_id': power_id, 'strength': 'Average'},
+            ])
+
+            assert response.status_code == 201
+            first, second = (item['hero_power'] for item in response.json)
+            assert first == second
+            assert first['strength'] == 'Average'
+            assert [link.id for link in links(hero_id, power_id)] == [first['id']]
+
+    def test_replays_stored_response(self, factory):
+        '''Replays the stored response to a repeated Idempotency-Key and rejects reuse with another body.'''
+
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            client = app.test_client()
+            body = {'hero_id': hero_id, 'power_id': power_id, 'strength': 'Weak'}
+            headers = {'Idempotency-Key': f'keyed-{hero_id}'}
+
+            first = client.post('/hero_powers', json=body, headers=headers)
+            assert first.status_code == 201
+            assert 'Idempotent-Replayed' not in first.headers
+
+            # A replay does not write, so the strength set meanwhile stays
+            client.post('/hero_powers', json={**body, 'strength': 'Strong'})
+            replayed = client.post('/hero_powers', json=body, headers=headers)
+            assert replayed.status_code == 201
+            assert replayed.headers['Idempotent-Replayed'] == 'true'
+            assert replayed.data == first.data
+            assert [link.strength for link in links(hero_id, power_id)] == ['Strong']
+
+            reused = client.post('/hero_powers', json={**body, 'strength': 'Average'}, headers=headers)
+            assert reused.status_code == 422
+
+            invalid = client.post('/hero_powers', json=body, headers={'Idempotency-Key': 'x' * 256})
+            assert invalid.status_code == 400
+
+    def test_rejected_requests_are_not_stored(self, factory):
+        '''Runs a retry again when the keyed request was rejected.'''
+
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            client = app.test_client()
+            headers = {'Idempotency-Key': f'late-{hero_id}'}
+            body = {'hero_id': hero_id, 'power_id': 10**9, 'strength': 'Weak'}
+
+            assert client.post('/hero_powers', json=body, headers=headers).status_code == 404
+            assert db.session.get(IdempotencyKey, f'late-{hero_id}') is None
+
+    def test_concurrent_posts_of_one_link(self, factory):
+        '''Keeps a single link when many threads post it at once, with and without a shared key.'''
+
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            body = {'hero_id': hero_id, 'power_id': power_id, 'strength': 'Strong'}
+
+            responses = post_concurrently(body, 12)
+            assert [response.status_code for response in responses] == [201] * 12
+            assert len({response.json['id'] for response in responses}) == 1
+
+            keyed = post_concurrently({**body, 'strength': 'Weak'}, 12, {'Idempotency-Key': f'herd-{hero_id}'})
+            assert [response.status_code for response in keyed] == [201] * 12
+            assert all(response.data == keyed[0].data for response in keyed)
+            assert keyed[0].json['id'] == responses[0].json['id']
+            assert [link.strength for link in links(hero_id, power_id)] == ['Weak']
+
+    def test_purge_cli(self, factory):
+        '''Deletes stored responses older than IDEMPOTENCY_TTL.'''
+
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            key = f'purged-{hero_id}'
+            app.test_client().post('/hero_powers', json={'hero_id': hero_id, 'power_id': power_id, 'strength': 'Weak'},
+                                   headers={'Idempotency-Key': key})
+            assert db.session.get(IdempotencyKey, key) is not None
+
+            ttl = app.config['IDEMPOTENCY_TTL']
+            app.config['IDEMPOTENCY_TTL'] = -1
+            try:
+                result = app.test_cli_runner().invoke(args=['idempotency', 'purge'])
+            finally:
+                app.config['IDEMPOTENCY_TTL'] = ttl
+
+            assert result.exit_code == 0
+            db.session.expire_all()
+            assert db.session.get(IdempotencyKey, key) is None
+
+    def test_upsert_without_on_conflict(self, factory):
+        '''Updates a link inserted after the SELECT of an upsert written without ON CONFLICT.'''
+
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            other_id = factory.power().id
+            raced = []
+
+            def race():
+                raced.extend(db.session.execute(insert(HeroPower).returning(HeroPower.id),
+                                                [{'hero_id': hero_id, 'power_id': power_id, 'strength': 'Weak'}]))
+
+            rows = [{'hero_id': hero_id, 'power_id': power_id, 'strength': 'Strong'},
+                    {'hero_id': hero_id, 'power_id': other_id, 'strength': 'Average'}]
+            written = run(plan_upsert(rows, 'mysql'), RacingSession(race))
+            db.session.commit()
+
+            assert written[hero_id, power_id].id == raced[0].id
+            assert [link.strength for link in links(hero_id, power_id)] == ['Strong']
+            assert [link.id for link in links(hero_id, other_id)] == [written[hero_id, other_id].id]
+
+    def test_replays_without_on_conflict(self, monkeypatch, factory):
+        '''Stores and replays Idempotency-Key responses on backends without ON CONFLICT.'''
+
+        monkeypatch.setattr(bulk, 'upserts', lambda dialect_name: False)
+        monkeypatch.setattr(idempotency, 'upserts', lambda dialect_name: False)
+        with app.app_context():
+            hero_id, power_id = factory.hero().id, factory.power().id
+            client = app.test_client()
+            key = f'portable-{hero_id}'
+            json = {'hero_id': hero_id, 'power_id': power_id, 'strength': 'Weak'}
+
+            first = client.post('/hero_powers', json=json, headers={'Idempotency-Key': key})
+            second = client.post('/hero_powers', json=json, headers={'Idempotency-Key': key})
+            assert first.status_code == second.status_code == 201
+            assert second.headers['Idempotent-Replayed'] == 'true'
+            assert second.json == first.json
+
+            stored = run(idempotency.plan_store(key, 'digest', 201, b'{}', -1, 'mysql'))
+            db.session.commit()
+            assert stored
+            assert run(idempotency.plan_store(key, 'digest', 201, b'{}', 60, 'mysql')) is False
+            db.session.rollback()
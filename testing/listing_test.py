@@ -0,0 +1,112 @@
+from werkzeug.datastructures import MultiDict
+
+from app import app
+from listing import list_query
+from pagination import encode_cursor
+from serializers import HERO, HERO_POWER
+
+
+def make_team(factory, strengths=('Strong', 'Weak', 'Strong')):
+    power = factory.power(name='teamwork')
+    heroes = [factory.hero(name=f'Member {name}') for name in 'CAB'[:len(strengths)]]
+    for hero, strength in zip(heroes, strengths):
+        factory.link(hero, power, strength)
+    return power, heroes
+
+
+class TestListing:
+    '''Fields, sorting and filters of list endpoints in listing.py'''
+
+    def test_projects_fields(self, factory):
+        '''Returns only the requested fields, plus id.'''
+
+        with app.app_context():
+            power, heroes = make_team(factory)
+            client = app.test_client()
+
+            response = client.get(f'/heroes?fields=name&power_id={power.id}')
+
+            assert response.status_code == 200
+            assert response.json == [{'id': hero.id, 'name': hero.name} for hero in heroes]
+            assert client.get('/heroes?fields=name,secret').status_code == 400
+
+    def test_selects_only_requested_columns(self):
+        '''Compiles ?fields into a statement selecting only those columns and relations.'''
+
+        serializer, statement, order = list_query(HERO, MultiDict({'fields': 'name', 'sort': '-name'}))
+        assert [column.name for column in statement.selected_columns] == ['id', 'name']
+        assert serializer.children == ()
+        assert list_query(HERO, MultiDict({'fields': 'name'}))[0] is serializer
+
+        serializer, statement, order = list_query(HERO_POWER, MultiDict({'fields': 'strength,hero'}))
+        assert [str(column) for column in statement.selected_columns] == [
+            'hero_powers.id', 'hero_powers.strength', 'heroes.id', 'heroes.name', 'heroes.super_name']
+
+    def test_filters_through_hero_powers(self, factory):
+        '''Filters heroes, powers and hero_powers by hero_id, power_id and strength.'''
+
+        with app.app_context():
+            power, heroes = make_team(factory)
+            client = app.test_client()
+
+            strong = client.get(f'/heroes?power_id={power.id}&strength=Strong&fields=id').json
+            assert [hero['id'] for hero in strong] == [heroes[0].id, heroes[2].id]
+
+            powers = client.get(f'/powers?hero_id={heroes[1].id}').json
+            assert [p['id'] for p in powers] == [power.id]
+
+            hero_powers = client.get(f'/hero_powers?power_id={power.id}&strength=Weak,Average').json
+            assert [(hp['hero']['id'], hp['power']['id']) for hp in hero_powers] == [(heroes[1].id, power.id)]
+
+            assert client.get('/heroes?strength=Mighty').status_code == 400
+            assert client.get('/powers?hero_id=one').status_code == 400
+
+    def test_sorts_and_pages(self, factory):
+        '''Pages through a sorted list with cursors that carry the sort value.'''
+
+        with app.app_context():
+            power, heroes = make_team(factory)
+            client = app.test_client()
+            path = f'/heroes?power_id={power.id}&sort=-name&fields=name&limit=2'
+
+            first = client.get(path)
+            second = client.get(f'{path}&after={first.headers["X-Next-Cursor"]}')
+
+            names = [hero['name'] for hero in first.json + second.json]
+            assert names == ['Member C', 'Member B', 'Member A']
+            assert 'Link' not in second.headers
+            assert client.get(f'/heroes?power_id={power.id}&sort=name').json[0]['name'] == 'Member A'
+
+            # Cursors only apply to the order they were issued for
+            cursor = first.headers['X-Next-Cursor']
+            assert client.get(f'/heroes?sort=name&limit=2&after={cursor}').status_code == 400
+            assert client.get(f'/heroes?sort=-name&limit=2&after={encode_cursor([1])}').status_code == 400
+            assert client.get('/heroes?sort=super_name').status_code == 400
+
+    def test_streams_projected_sorted_list(self, factory):
+        '''Streams a filtered, sorted and projected list as NDJSON.'''
+
+        with app.app_context():
+            app.config['STREAM_BATCH_SIZE'] = 2
+            try:
+                power, heroes = make_team(factory)
+                response = app.test_client().get(f'/heroes?power_id={power.id}&sort=name&fields=name&stream=ndjson')
+                lines = response.data.decode().splitlines()
+            finally:
+                app.config['STREAM_BATCH_SIZE'] = 500
+
+            assert lines == [f'{{"id":{hero.id},"name":"{hero.name}"}}'
+                             for hero in sorted(heroes, key=lambda hero: hero.name)]
+
+    def test_filtered_powers_follow_hero_powers(self, factory):
+        '''Refreshes cached filtered power lists when hero_powers change.'''
+
+        with app.app_context():
+            power, heroes = make_team(factory, ('Strong',))
+            other = factory.power(name='late bloomer')
+            client = app.test_client()
+            path = f'/powers?hero_id={heroes[0].id}&fields=id'
+
+            assert client.get(path).json == [{'id': power.id}]
+            client.post('/hero_powers', json={'hero_id': heroes[0].id, 'power_id': other.id, 'strength': 'Weak'})
+            assert client.get(path).json == [{'id': power.id}, {'id': other.id}]
@@ -0,0 +1,64 @@
+import pytest
+from flask import jsonify
+
+from app import app
+from models import db
+from loading import load
+from serializers import HERO
+from versions import version_snapshot
+
+
+@pytest.fixture
+def policies():
+    original = app.config['LOADING_POLICIES']
+    yield app.config.__setitem__
+    app.config['LOADING_POLICIES'] = original
+
+@pytest.fixture
+def hero_with_50_powers(factory):
+    with app.app_context():
+        hero = factory.hero()
+        factory.links(hero, factory.powers(50), 'Average')
+        expected = jsonify(hero.to_dict()).data
+        yield hero.id, expected
+
+
+class TestLoadingPolicies:
+    '''Loading policies in loading.py'''
+
+    @pytest.mark.parametrize('policy, queries', [
+        ('join', 1),
+        ('joined', 1),
+        ('in', 2),
+        ('selectin', 3),
+        ('lazy', 52),
+    ])
+    def test_hero_detail_round_trips(self, hero_with_50_powers, assert_num_queries, policies, policy, queries):
+        '''Loads a hero with 50 powers in the expected number of queries per policy.'''
+
+        hero_id, expected = hero_with_50_powers
+        policies('LOADING_POLICIES', {'hero_detail': policy})
+        with app.test_request_context():
+            db.session.expunge_all()
+            with assert_num_queries(queries):
+                hero = load('hero_detail', HERO, hero_id)
+            assert jsonify(hero).data == expected
+
+    def test_endpoint_uses_single_query(self, hero_with_50_powers, assert_num_queries):
+        '''Serves GET /heroes/<id> in one query under the default policy.'''
+
+        hero_id, expected = hero_with_50_powers
+        with app.app_context():
+            db.session.expunge_all()
+            version_snapshot.get()
+            with assert_num_queries(1):
+                response = app.test_client().get(f'/heroes/{hero_id}')
+            assert response.data == expected
+
+    def test_rejects_unknown_policy(self, policies):
+        '''Raises on an unknown policy name.'''
+
+        policies('LOADING_POLICIES', {'power_detail': 'eager'})
+        with app.app_context():
+            with pytest.raises(ValueError):
+                load('power_detail', None, 1)
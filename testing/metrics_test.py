@@ -0,0 +1,86 @@
+import logging
+import threading
+
+from app import app
+from metrics import Registry, RequestMetrics
+
+
+class TestMetrics:
+    '''Request instrumentation in metrics.py'''
+
+    def test_adds_server_timing(self, factory):
+        '''Reports database and serialization time in a Server-Timing header.'''
+
+        with app.app_context():
+            hero = factory.hero()
+
+            response = app.test_client().get(f'/heroes/{hero.id}?timing=1')
+
+            timing = response.headers['Server-Timing']
+            assert 'db;dur=' in timing and 'ser;dur=' in timing and 'total;dur=' in timing
+            assert 'desc="0 queries"' not in timing
+
+    def test_exports_prometheus_text(self):
+        '''Exports per-route histograms and cache counters on /metrics.'''
+
+        with app.app_context():
+            client = app.test_client()
+            client.get('/powers')
+
+            response = client.get('/metrics')
+
+            assert response.status_code == 200
+            assert response.mimetype == 'text/plain'
+            body = response.data.decode()
+            assert 'http_request_duration_seconds_count{route="/powers",method="GET"}' in body
+            assert 'http_request_duration_seconds_bucket{route="/powers",method="GET",le="+Inf"}' in body
+            assert 'http_request_db_statements_total{route="/powers",method="GET"}' in body
+            assert 'response_cache_hits_total' in body
+
+    def test_logs_requests_over_query_threshold(self, caplog):
+        '''Logs a warning for requests that run more queries than the threshold.'''
+
+        original = app.config['METRICS_QUERY_LOG_THRESHOLD']
+        app.config['METRICS_QUERY_LOG_THRESHOLD'] = 1
+        try:
+            with app.app_context(), caplog.at_level(logging.WARNING):
+                app.test_client().patch('/powers/1', json={'description': 'x'})
+                app.test_client().get('/heroes?fresh=1')
+        finally:
+            app.config['METRICS_QUERY_LOG_THRESHOLD'] = original
+
+        assert any('queries' in record.getMessage() for record in caplog.records)
+
+    def test_keeps_counts_of_finished_threads(self):
+        '''Keeps the counts recorded by threads that have exited.'''
+
+        registry = Registry(buckets=(0.1, 1.0))
+
+        def work():
+            for _ in range(3):
+                registry.observe(('/x', 'GET'), 0.5, RequestMetrics())
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = registry.snapshot()[('/x', 'GET')]
+        assert stats.count == 12
+        assert stats.buckets == [0, 12, 0]
+
+    def test_new_buckets_drop_old_counts(self):
+        '''Drops counts recorded under other bucket bounds when the bounds change.'''
+
+        registry = Registry(buckets=(0.1, 1.0))
+        registry.observe(('/x', 'GET'), 0.5, RequestMetrics())
+
+        registry.set_buckets((0.1, 1.0))
+        assert registry.snapshot()[('/x', 'GET')].buckets == [0, 1, 0]
+
+        registry.set_buckets((0.25, 0.5, 1.0))
+        registry.observe(('/x', 'GET'), 0.75, RequestMetrics())
+        stats = registry.snapshot()[('/x', 'GET')]
+        assert stats.count == 1
+        assert stats.buckets == [0, 0, 1, 0]
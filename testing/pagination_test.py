@@ -0,0 +1,77 @@
+import json
+
+from app import app
+from models import Hero
+from pagination import encode_cursor
+
+
+class TestPagination:
+    '''Keyset pagination and streaming in pagination.py'''
+
+    def test_paginates_heroes_with_cursor(self, factory):
+        '''Pages through /heroes with limit and the next cursor.'''
+
+        with app.app_context():
+            heroes = factory.heroes(5)
+            ids = [hero.id for hero in heroes]
+
+            client = app.test_client()
+            start = encode_cursor([ids[0] - 1])
+            response = client.get(f'/heroes?limit=2&after={start}')
+
+            assert response.status_code == 200
+            assert [hero['id'] for hero in response.json] == ids[:2]
+            cursor = response.headers['X-Next-Cursor']
+            assert 'rel="next"' in response.headers['Link']
+
+            response = client.get(f'/heroes?limit=2&after={cursor}')
+            assert [hero['id'] for hero in response.json] == ids[2:4]
+
+    def test_last_page_has_no_next_link(self, factory):
+        '''Omits the next link on the last page.'''
+
+        with app.app_context():
+            power = factory.power()
+
+            response = app.test_client().get(f'/powers?limit=5&after={encode_cursor([power.id - 1])}')
+
+            assert response.status_code == 200
+            assert [p['id'] for p in response.json] == [power.id]
+            assert 'Link' not in response.headers
+
+    def test_rejects_bad_parameters(self):
+        '''Returns 400 for an invalid limit or cursor.'''
+
+        with app.app_context():
+            client = app.test_client()
+            assert client.get('/heroes?limit=0').status_code == 400
+            assert client.get('/heroes?limit=abc').status_code == 400
+            assert client.get('/heroes?after=not-a-cursor').status_code == 400
+
+    def test_streams_json_array(self):
+        '''Streams /powers as a JSON array matching the full list.'''
+
+        with app.app_context():
+            app.config['STREAM_BATCH_SIZE'] = 2
+            try:
+                client = app.test_client()
+                full = client.get('/powers').json
+                response = client.get('/powers?stream=1')
+                assert response.status_code == 200
+                assert response.is_streamed
+                assert json.loads(response.data) == sorted(full, key=lambda p: p['id'])
+            finally:
+                app.config['STREAM_BATCH_SIZE'] = 500
+
+    def test_streams_ndjson(self, factory):
+        '''Streams /heroes as NDJSON when asked through the Accept header.'''
+
+        with app.app_context():
+            factory.hero()
+
+            response = app.test_client().get('/heroes', headers={'Accept': 'application/x-ndjson'})
+
+            assert response.content_type == 'application/x-ndjson'
+            lines = response.data.decode().splitlines()
+            assert len(lines) == Hero.query.count()
+            assert all('super_name' in json.loads(line) for line in lines)
@@ -0,0 +1,119 @@
+import json
+
+import readmodel
+from app import app
+from models import db, Hero, HeroDocument
+from readmodel import check, read_model, rebuild
+
+
+def stored(hero_id):
+    body = db.session.get(HeroDocument, hero_id)
+    return json.loads(body.body) if body else None
+
+
+class TestReadModel:
+    '''Hero documents read model in readmodel.py'''
+
+    def test_serves_stored_document(self, assert_num_queries, factory):
+        '''Serves GET /heroes/<id> from its document in one query after the ETag check, matching the live body.'''
+
+        with app.app_context():
+            hero = factory.hero(name='Doc Reader', super_name='Stored')
+            power = factory.power(name='memory', description='Remembers everything it has ever read')
+            factory.link(hero, power)
+
+            client, hero_id = app.test_client(), hero.id
+            # The table versions read for the ETag, then the document
+            with assert_num_queries(2):
+                response = client.get(f'/heroes/{hero_id}')
+
+            assert response.status_code == 200
+            assert response.json['hero_powers'][0]['power']['name'] == 'memory'
+            read_model.enabled = False
+            try:
+                assert client.get(f'/heroes/{hero_id}').json == response.json
+            finally:
+                read_model.enabled = True
+
+    def test_refreshes_on_hero_power_create(self, factory):
+        '''Recomputes the hero's document when a hero_power is posted.'''
+
+        with app.app_context():
+            hero = factory.hero(name='Growing Hero', super_name='Learner')
+            power = factory.power(name='growth', description='Gets a little stronger every day')
+            assert stored(hero.id)['hero_powers'] == []
+
+            app.test_client().post('/hero_powers', json={'hero_id': hero.id, 'power_id': power.id,
+                                                         'strength': 'Weak'})
+
+            db.session.expire_all()
+            assert [hp['power']['id'] for hp in stored(hero.id)['hero_powers']] == [power.id]
+
+    def test_power_change_fans_out_to_holders(self, monkeypatch, factory):
+        '''Refreshes only the documents of heroes holding a patched power.'''
+
+        with app.app_context():
+            holder = factory.hero(name='Holder', super_name='Has It')
+            factory.hero(name='Other', super_name='Lacks It')
+            power = factory.power(name='shared', description='A power that a single hero holds')
+            factory.link(holder, power, strength='Average')
+
+            refreshed = []
+            write = readmodel.write
+            monkeypatch.setattr(readmodel, 'write', lambda session, hero_ids, documents: (
+                refreshed.append(set(hero_ids)), write(session, hero_ids, documents)))
+            app.test_client().patch(f'/powers/{power.id}', json={'description': 'A power that was just renamed'})
+
+            assert refreshed == [{holder.id}]
+            db.session.expire_all()
+            assert stored(holder.id)['hero_powers'][0]['power']['description'] == 'A power that was just renamed'
+
+    def test_overwrites_concurrent_document(self, monkeypatch, factory):
+        '''Upserts a document that a concurrent commit stored after this transaction began.'''
+
+        with app.app_context():
+            hero = factory.hero(name='Raced Hero', super_name='Concurrent')
+            power = factory.power(name='race', description='Written by two transactions at once')
+            factory.link(hero, power)
+            # The document committed by the other transaction stays in place
+            monkeypatch.setattr(readmodel, 'invalidate', lambda session, hero_ids: None)
+
+            response = app.test_client().patch(f'/powers/{power.id}', json={'description': 'Refreshed by the later commit'})
+
+            assert response.status_code == 200
+            db.session.expire_all()
+            assert stored(hero.id)['hero_powers'][0]['power']['description'] == 'Refreshed by the later commit'
+
+    def test_invalidates_large_writes(self, monkeypatch, factory):
+        '''Drops documents past the refresh limit and serves those heroes live until rebuilt.'''
+
+        with app.app_context():
+            heroes = factory.heroes(3, super_name='Invalidated')
+            power = factory.power(name='numbers', description='Strength in numbers for every hero')
+
+            monkeypatch.setattr(read_model, 'refresh_limit', 2)
+            response = app.test_client().post('/hero_powers', json=[
+                {'hero_id': hero.id, 'power_id': power.id, 'strength': 'Strong'} for hero in heroes])
+            assert response.status_code == 201
+
+            db.session.expire_all()
+            assert [stored(hero.id) for hero in heroes] == [None] * 3
+            live = app.test_client().get(f'/heroes/{heroes[0].id}').json
+            assert [hp['power']['id'] for hp in live['hero_powers']] == [power.id]
+            assert check()['missing'] >= 3
+
+            rebuild()
+            assert check() == {'checked': Hero.query.count(), 'missing': 0, 'stale': 0, 'orphaned': 0}
+            assert stored(heroes[0].id) == live
+
+    def test_documents_cli(self):
+        '''Rebuilds and checks documents from the command line.'''
+
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['documents', 'rebuild'])
+        assert result.exit_code == 0
+        assert 'Rebuilt' in result.output
+
+        result = runner.invoke(args=['documents', 'check'])
+        assert result.exit_code == 0
+        assert 'missing=0 stale=0 orphaned=0' in result.output
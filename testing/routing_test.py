@@ -0,0 +1,113 @@
+import time
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import OperationalError
+
+from app import app
+from models import db, Power
+from routing import STICKY_COOKIE, replica_reads, router
+
+
+# Description of the powers written before the replicas were copied
+COPIED = 'Written before the replicas were copied'
+
+def pin(response):
+    # Sent by hand, like the ASGI test client does
+    return {'Cookie': response.headers['Set-Cookie'].split(';')[0]}
+
+
+class TestRouting:
+    '''Read-replica routing with read-your-writes in routing.py'''
+
+    def test_reads_come_from_replicas(self, replicate, factory):
+        '''Serves GETs of heroes and powers from the replicas in turn.'''
+
+        with app.app_context():
+            power_id = factory.power(name='replicated', description=COPIED).id
+            replicate(2)
+            before = router.stats()['replica_reads']
+
+            # Written on the primary after the copies were taken
+            db.session.get(Power, power_id).description = 'Changed on the primary only'
+            hero = factory.hero(name='Unreplicated Hero', super_name='Lag')
+
+            client = app.test_client(use_cookies=False)
+            for _ in range(2):
+                response = client.get(f'/powers/{power_id}')
+                assert response.json['description'] == COPIED
+            assert client.get(f'/heroes/{hero.id}').status_code == 404
+            assert 'Set-Cookie' not in response.headers
+            assert router.stats()['replica_reads'] == before + 3
+
+    def test_writes_pin_client_to_primary(self, replicate, factory):
+        '''Reads a client's own writes from the primary until its pin expires.'''
+
+        with app.app_context():
+            power_id = factory.power(name='pinned', description=COPIED).id
+            hero_id = factory.hero(name='Pinned Hero', super_name='Sticky').id
+            replicate()
+
+            patched = app.test_client(use_cookies=False).patch(f'/powers/{power_id}', json={'description': 'Patched while replicas lag'})
+            assert patched.status_code == 200
+            assert f'{STICKY_COOKIE}=' in patched.headers['Set-Cookie']
+
+            response = app.test_client(use_cookies=False).get(f'/powers/{power_id}', headers=pin(patched))
+            assert response.json['description'] == 'Patched while replicas lag'
+            response = app.test_client(use_cookies=False).get(f'/powers/{power_id}')
+            assert response.json['description'] == COPIED
+            expired = {'Cookie': f'{STICKY_COOKIE}={time.time() - 1:.3f}'}
+            response = app.test_client(use_cookies=False).get(f'/powers/{power_id}', headers=expired)
+            assert response.json['description'] == COPIED
+
+            posted = app.test_client(use_cookies=False).post('/hero_powers', json={'hero_id': hero_id, 'power_id': power_id,
+                                                                  'strength': 'Strong'})
+            assert posted.status_code == 201
+            response = app.test_client(use_cookies=False).get(f'/heroes/{hero_id}', headers=pin(posted))
+            assert [link['power']['id'] for link in response.json['hero_powers']] == [power_id]
+            assert app.test_client(use_cookies=False).get(f'/heroes/{hero_id}').json['hero_powers'] == []
+
+
+class TestRoutingSession:
+    '''Per-request replica sessions and pin cookies in models.py and routing.py'''
+
+    def test_session_reads_its_writes(self, replicate, factory):
+        '''Sends reads to the replica until the session writes, and writes only to the primary.'''
+
+        with app.app_context():
+            (replica,) = replicate()
+            factory.power(name='unreplicated', description=COPIED)
+            count = select(func.count(Power.id))
+            with replica.connect() as connection:
+                replicated = connection.scalar(count)
+            current = db.session.scalar(count)
+
+            @replica_reads
+            def view():
+                before = db.session.scalar(count)
+                db.session.add(Power(name='own write', description='Read back by the session that wrote it'))
+                db.session.flush()
+                after = db.session.scalar(count)
+                db.session.commit()
+                return before, after
+
+            with app.test_request_context('/powers'):
+                assert view() == (replicated, current + 1)
+            assert 'replica' not in db.session.info
+
+            with replica.connect() as connection, pytest.raises(OperationalError, match='readonly'):
+                connection.execute(text('DELETE FROM powers'))
+            assert 'db_routing_replica_reads_total' in app.test_client(use_cookies=False).get('/metrics').get_data(as_text=True)
+
+    def test_cookie_jar_keeps_pin(self, replicate, factory):
+        '''Sends a pin that a client keeping cookies returns until it expires.'''
+
+        with app.app_context():
+            power_id = factory.power(name='jarred', description=COPIED).id
+            replicate()
+            client = app.test_client()
+            client.patch(f'/powers/{power_id}', json={'description': 'Patched by a client with cookies'})
+            before = router.stats()['pinned_reads']
+
+            assert client.get(f'/powers/{power_id}').json['description'] == 'Patched by a client with cookies'
+            assert router.stats()['pinned_reads'] == before + 1
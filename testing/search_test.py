@@ -0,0 +1,81 @@
+import uuid
+
+from app import app
+from models import db
+from search import plan_search
+from serializers import POWER, run
+
+
+def token():
+    return 'tok' + uuid.uuid4().hex[:8]
+
+
+class TestSearch:
+    '''Full-text search in search.py'''
+
+    def test_ranks_name_matches_first(self, factory):
+        '''Finds heroes by word prefix, ranking name matches above super_name matches.'''
+
+        with app.app_context():
+            word = token()
+            by_super_name = factory.hero(name='Plain Name', super_name=f'{word} Prime')
+            by_name = factory.hero(name=f'{word} Smith', super_name='Other')
+
+            response = app.test_client().get(f'/heroes/search?q={word[:6]}')
+
+            assert response.status_code == 200
+            assert [hero['id'] for hero in response.json] == [by_name.id, by_super_name.id]
+            assert 'hero_powers' in response.json[0]
+
+    def test_paginates_results(self, factory):
+        '''Pages through ranked results with the next cursor.'''
+
+        with app.app_context():
+            word = token()
+            powers = factory.powers(3, description=f'Grants {word} abilities to the wielder')
+
+            client = app.test_client()
+            first = client.get(f'/powers/search?q={word}&limit=2')
+            assert len(first.json) == 2
+            assert 'rel="next"' in first.headers['Link']
+
+            second = client.get(f'/powers/search?q={word}&limit=2&after={first.headers["X-Next-Cursor"]}')
+            assert len(second.json) == 1
+            assert 'Link' not in second.headers
+            assert {p['id'] for p in first.json + second.json} == {p.id for p in powers}
+
+    def test_index_follows_writes(self, factory):
+        '''Keeps the index in sync with updates and deletes.'''
+
+        with app.app_context():
+            word = token()
+            power = factory.power(name='flight', description='Lets the wielder fly over cities')
+            hero = factory.hero(name=f'{word} Jones', super_name='Gone')
+
+            client = app.test_client()
+            client.patch(f'/powers/{power.id}', json={'description': f'Lets the wielder {word} over cities'})
+            assert [p['id'] for p in client.get(f'/powers/search?q={word}').json] == [power.id]
+
+            db.session.delete(hero)
+            db.session.commit()
+            assert client.get(f'/heroes/search?q={word}').json == []
+
+    def test_requires_query(self):
+        '''Returns 400 without a query word.'''
+
+        with app.app_context():
+            assert app.test_client().get('/heroes/search').status_code == 400
+            assert app.test_client().get('/powers/search?q=%20-').status_code == 400
+
+    def test_like_fallback(self, factory):
+        '''Matches the same rows through the LIKE fallback used off SQLite.'''
+
+        with app.app_context():
+            word = token()
+            powers = [factory.power(name=f'{word} blast', description='A blast of energy from the hands'),
+                      factory.power(name='shield', description=f'Raises a {word} shield of force')]
+
+            items, has_next = run(plan_search(POWER, [word[:7]], 10, 0, 'postgresql'))
+
+            assert [item['id'] for item in items] == [powers[0].id, powers[1].id]
+            assert not has_next
@@ -0,0 +1,43 @@
+from app import app
+from models import Hero, HeroPower
+from seeding import Generator, seed_command
+
+
+class TestSeeding:
+    '''Synthetic data generator in seeding.py'''
+
+    def test_generator_is_deterministic(self):
+        '''Generates the same rows for the same seed.'''
+
+        def dataset(seed):
+            generator = Generator(seed)
+            return (list(generator.heroes(1, 50)), list(generator.powers(1, 10)),
+                    list(generator.hero_powers(range(1, 51), range(1, 11), 3)))
+
+        assert dataset(7) == dataset(7)
+        assert dataset(7) != dataset(8)
+
+    def test_generated_rows_are_valid(self):
+        '''Generates descriptions and strengths the models accept.'''
+
+        generator = Generator(0)
+        assert all(len(power['description']) >= 20 for power in generator.powers(1, 200))
+        links = list(generator.hero_powers(range(1, 101), range(1, 6), 2))
+        assert {link['strength'] for link in links} <= {'Strong', 'Weak', 'Average'}
+        assert len({(link['hero_id'], link['power_id']) for link in links}) == len(links)
+
+    def test_seed_command_appends_rows(self):
+        '''Bulk loads heroes, powers and hero_powers through the CLI.'''
+
+        with app.app_context():
+            heroes, links = Hero.query.count(), HeroPower.query.count()
+
+            result = app.test_cli_runner().invoke(seed_command, [
+                '--heroes', '30', '--powers', '5', '--powers-per-hero', '2',
+                '--chunk-size', '7', '--append', '--fast',
+            ])
+
+            assert result.exit_code == 0, result.output
+            assert 'rows/sec' in result.output
+            assert Hero.query.count() == heroes + 30
+            assert HeroPower.query.count() > links
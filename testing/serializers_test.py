@@ -0,0 +1,51 @@
+from flask import jsonify
+
+from app import app
+from models import Hero
+from serializers import HERO, POWER, HERO_POWER
+
+
+def make_hero_with_powers(factory, count=3):
+    hero = factory.hero()
+    factory.links(hero, factory.powers(count))
+    return hero
+
+
+class TestSerializers:
+    '''Precompiled serializers in serializers.py'''
+
+    def test_hero_matches_to_dict(self, factory):
+        '''Serializes a hero with its powers exactly like Hero.to_dict().'''
+
+        with app.test_request_context():
+            hero = make_hero_with_powers(factory)
+
+            assert jsonify(HERO.get(hero.id)).data == jsonify(hero.to_dict()).data
+            assert jsonify(HERO.dump_object(hero)).data == jsonify(hero.to_dict()).data
+
+    def test_hero_list_matches_to_dict(self, factory):
+        '''Serializes the /heroes list exactly like Hero.to_dict().'''
+
+        with app.app_context():
+            make_hero_with_powers(factory)
+            client = app.test_client()
+            expected = jsonify([hero.to_dict() for hero in Hero.query.all()]).data
+
+            assert client.get('/heroes').data == expected
+
+    def test_power_and_hero_power_match_to_dict(self, factory):
+        '''Serializes powers and hero_powers exactly like to_dict().'''
+
+        with app.test_request_context():
+            hero = make_hero_with_powers(factory, 1)
+            hero_power = hero.hero_powers[0]
+
+            assert jsonify(POWER.get(hero_power.power_id)).data == jsonify(hero_power.power.to_dict()).data
+            assert jsonify(HERO_POWER.dump_object(hero_power)).data == jsonify(hero_power.to_dict()).data
+
+    def test_missing_row_is_none(self):
+        '''Returns None for an id that does not exist.'''
+
+        with app.app_context():
+            assert HERO.get(0) is None
+            assert POWER.get(0) is None
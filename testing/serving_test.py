@@ -0,0 +1,43 @@
+from sqlalchemy import text
+
+from app import app
+from models import db
+from serving import engine_options, serve_command
+
+
+class TestServing:
+    '''Engine settings and the serve command in serving.py'''
+
+    def test_engine_options(self):
+        '''Sizes the pool for file databases but not for in-memory SQLite.'''
+
+        options = engine_options('sqlite:////tmp/app.db', pool_size=10, max_overflow=20,
+                                 pool_pre_ping=True, pool_recycle=3600)
+        assert options['pool_size'] == 10
+        assert options['max_overflow'] == 20
+        assert options['pool_pre_ping'] is True
+
+        options = engine_options('sqlite://', pool_size=10, max_overflow=20,
+                                 pool_pre_ping=True, pool_recycle=3600)
+        assert 'pool_size' not in options
+        assert options['pool_recycle'] == 3600
+
+    def test_sqlite_pragmas(self):
+        '''Opens SQLite connections in WAL mode with a busy timeout.'''
+
+        with app.app_context():
+            pragma = lambda name: db.session.execute(text(f'PRAGMA {name}')).scalar()
+            assert pragma('journal_mode') == 'wal'
+            assert pragma('synchronous') == 1
+            assert pragma('busy_timeout') == 5000
+            assert pragma('mmap_size') == 268435456
+
+    def test_serve_command_registered(self):
+        '''Registers the serve command with worker and thread options.'''
+
+        result = app.test_cli_runner().invoke(args=['serve', '--help'])
+
+        assert result.exit_code == 0
+        assert '--workers' in result.output
+        assert '--threads' in result.output
+        assert app.cli.get_command(None, 'serve') is serve_command
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+from app import app
+
+# Runs in a fresh interpreter, so the imports it counts are its own
+FACTORY_SCRIPT = '''
+import json, sys
+from app import create_app, testing_config
+from models import db
+
+app = create_app(testing_config())
+with app.app_context():
+    db.create_all()
+response = app.test_client().get('/heroes')
+print(json.dumps({
+    'status': response.status_code,
+    'heroes': response.json,
+    'testing': app.config['TESTING'],
+    'loaded': [name for name in ('flask_migrate', 'alembic', 'pyarrow') if name in sys.modules],
+}))
+'''
+
+
+class TestStartup:
+    '''Application factory and lazy imports in app.py'''
+
+    def test_factory_creates_isolated_app(self):
+        '''Serves an empty database of its own without importing the packages of CLI commands.'''
+
+        output = subprocess.run([sys.executable, '-c', FACTORY_SCRIPT], check=True, capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+        result = json.loads(output)
+
+        assert result == {'status': 200, 'heroes': [], 'testing': True, 'loaded': []}
+
+    def test_migrate_commands_load_on_use(self):
+        '''Keeps the flask db commands of Flask-Migrate.'''
+
+        result = app.test_cli_runner().invoke(args=['db', '--help'])
+
+        assert result.exit_code == 0, result.output
+        assert 'upgrade' in result.output
+        assert 'migrate' in app.extensions
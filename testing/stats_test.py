@@ -0,0 +1,119 @@
+import pytest
+from sqlalchemy import update
+
+from app import app
+from models import db, Hero, HeroPower, StatCounter
+from serializers import run
+from stats import check, plan_power_stats, plan_summary, plan_top_powers, rebuild, require_triggers
+
+
+class TestStats:
+    '''Aggregate statistics in stats.py'''
+
+    def test_summary_follows_writes(self, factory):
+        '''Moves /stats with posted hero_powers and cascading hero deletes.'''
+
+        with app.app_context():
+            client = app.test_client()
+            before = client.get('/stats').json
+            hero = factory.hero(name='Counted Hero', super_name='Tally')
+            power = factory.power(name='counting')
+
+            response = client.post('/hero_powers', json={'hero_id': hero.id, 'power_id': power.id,
+                                                         'strength': 'Strong'})
+            assert response.status_code == 201
+            after = client.get('/stats').json
+            assert after['heroes'] == before['heroes'] + 1
+            assert after['powers'] == before['powers'] + 1
+            assert after['hero_powers'] == before['hero_powers'] + 1
+            assert after['strengths']['Strong'] == before['strengths']['Strong'] + 1
+            assert after['strengths']['Weak'] == before['strengths']['Weak']
+
+            db.session.delete(hero)
+            db.session.commit()
+            final = client.get('/stats').json
+            assert final['heroes'] == before['heroes']
+            assert final['hero_powers'] == before['hero_powers']
+            assert final['strengths'] == before['strengths']
+
+    def test_power_stats(self, factory):
+        '''Counts the heroes holding a power by strength, and 404s unknown powers.'''
+
+        with app.app_context():
+            power = factory.power(name='tallied')
+            heroes = factory.heroes(3, super_name='Counted')
+            client = app.test_client()
+
+            response = client.post('/hero_powers', json=[
+                {'hero_id': hero.id, 'power_id': power.id, 'strength': strength}
+                for hero, strength in zip(heroes, ('Strong', 'Weak', 'Weak'))
+            ])
+            assert response.status_code == 201
+
+            stats = client.get(f'/stats/powers/{power.id}').json
+            assert stats == {'power_id': power.id, 'name': 'tallied', 'heroes': 3,
+                             'strengths': {'Strong': 1, 'Weak': 2, 'Average': 0}}
+            assert stats in client.get('/stats/powers').json
+
+            db.session.execute(update(HeroPower).where(HeroPower.power_id == power.id, HeroPower.strength == 'Weak')
+                               .values(strength='Average'))
+            db.session.commit()
+            stats = client.get(f'/stats/powers/{power.id}').json
+            assert stats['strengths'] == {'Strong': 1, 'Weak': 0, 'Average': 2}
+
+            response = client.get('/stats/powers/1000000000')
+            assert response.status_code == 404
+            assert response.json == {'message': 'Power not found'}
+
+    def test_top_powers(self, factory):
+        '''Lists the powers held by the most heroes first, honouring ?limit.'''
+
+        with app.app_context():
+            client = app.test_client()
+            most = max([item['heroes'] for item in client.get('/stats/powers/top?limit=1').json], default=0)
+            power = factory.power(name='popular')
+            heroes = factory.heroes(most + 1, super_name='Follower')
+            factory.add([HeroPower(hero=hero, power=power, strength='Average') for hero in heroes])
+
+            top = client.get('/stats/powers/top?limit=3').json
+            assert top[0]['power_id'] == power.id
+            assert top[0]['heroes'] == most + 1
+            assert len(top) <= 3
+            keys = [(item['heroes'], item['power_id']) for item in top]
+            assert keys == sorted(keys, reverse=True)
+            assert client.get('/stats/powers/top?limit=0').status_code == 400
+
+    def test_counters_match_group_by(self):
+        '''Serves the same stats from the counter tables as from GROUP BY queries.'''
+
+        with app.app_context():
+            assert run(plan_summary()) == run(plan_summary(maintained=False))
+            assert run(plan_power_stats()) == run(plan_power_stats(maintained=False))
+            assert run(plan_top_powers(5)) == run(plan_top_powers(5, maintained=False))
+            assert check() == {'counters': [], 'powers': 0}
+
+    def test_rejects_backends_without_triggers(self):
+        '''Refuses to serve /stats on a backend whose counters nothing would keep current.'''
+
+        require_triggers('sqlite')
+        require_triggers('postgresql')
+        with pytest.raises(RuntimeError, match='not on mysql'):
+            require_triggers('mysql')
+
+    def test_check_and_rebuild(self):
+        '''Reports drifted counters from `flask stats check` and repairs them with rebuild.'''
+
+        with app.app_context():
+            db.session.execute(update(StatCounter).where(StatCounter.name == 'heroes')
+                               .values(value=StatCounter.value + 7))
+            db.session.commit()
+            runner = app.test_cli_runner()
+
+            result = runner.invoke(args=['stats', 'check'])
+            assert result.exit_code == 1
+            assert 'counters=heroes ' in result.output
+
+            counters = rebuild()
+            assert counters['heroes'] == db.session.query(Hero).count()
+            assert check() == {'counters': [], 'powers': 0}
+            assert runner.invoke(args=['stats', 'check']).exit_code == 0
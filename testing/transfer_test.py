@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+import transfer
+from app import app
+from models import HeroPower
+from stats import check
+from transfer import READERS, TABLES, export_tables, import_tables
+
+
+def read_rows(directory, fmt):
+    with open(directory / 'manifest.json') as f:
+        files = {name: entry['file'] for name, entry in json.load(f)['tables'].items()}
+    return {name: [row for rows in READERS[fmt](str(directory / files[name]), 7) for row in rows] for name in TABLES}
+
+
+class TestTransfer:
+    '''Dataset export and import in transfer.py'''
+
+    def test_formats_hold_the_same_rows(self, tmp_path, factory):
+        '''Exports identical rows in id order to NDJSON, Arrow IPC and Parquet.'''
+
+        with app.app_context():
+            hero = factory.hero(name='Exported Hero', super_name='Snapshot')
+            counts = {fmt: export_tables(str(tmp_path / fmt), fmt, batch_size=3, echo=lambda message: None)
+                      for fmt in transfer.FORMATS}
+
+            rows = read_rows(tmp_path / 'ndjson', 'ndjson')
+            assert counts['ndjson'] == {name: len(rows[name]) for name in TABLES}
+            assert {'id': hero.id, 'name': 'Exported Hero', 'super_name': 'Snapshot'} in rows['heroes']
+            assert all([row['id'] for row in rows[name]] == sorted(row['id'] for row in rows[name]) for name in TABLES)
+            assert read_rows(tmp_path / 'arrow', 'arrow') == rows
+            assert read_rows(tmp_path / 'parquet', 'parquet') == rows
+
+    def test_interrupted_import_resumes(self, tmp_path, monkeypatch, factory):
+        '''Keeps the chunks committed before an interruption and resumes after them.'''
+
+        with app.app_context():
+            hero = factory.hero(name='Resumed Hero', super_name='Restarter')
+            factory.links(hero, factory.powers(3), strength='Weak')
+
+            export_tables(str(tmp_path / 'before'), 'ndjson', echo=lambda message: None)
+            expected = read_rows(tmp_path / 'before', 'ndjson')
+
+            read_ndjson = READERS['ndjson']
+
+            def interrupted(path, batch_size):
+                for index, rows in enumerate(read_ndjson(path, batch_size)):
+                    if path.endswith('hero_powers.ndjson') and index == 1:
+                        raise KeyboardInterrupt
+                    yield rows
+
+            monkeypatch.setitem(READERS, 'ndjson', interrupted)
+            with pytest.raises(KeyboardInterrupt):
+                import_tables(str(tmp_path / 'before'), chunk_size=2, replace=True, echo=lambda message: None)
+            assert HeroPower.query.count() == 2
+            monkeypatch.setitem(READERS, 'ndjson', read_ndjson)
+
+            messages = []
+            counts = import_tables(str(tmp_path / 'before'), chunk_size=2, resume=True, echo=messages.append)
+            assert counts == {'powers': 0, 'heroes': 0, 'hero_powers': len(expected['hero_powers']) - 2}
+            assert any(message.endswith('(100%)') for message in messages)
+
+            export_tables(str(tmp_path / 'after'), 'ndjson', echo=lambda message: None)
+            assert read_rows(tmp_path / 'after', 'ndjson') == expected
+            assert check() == {'counters': [], 'powers': 0}
+
+    def test_import_cli_guards(self, tmp_path):
+        '''Refuses incomplete exports and, without --replace or --resume, non-empty tables.'''
+
+        with app.app_context():
+            runner = app.test_cli_runner()
+            result = runner.invoke(args=['data', 'export', str(tmp_path / 'export'), '--format', 'parquet'])
+            assert result.exit_code == 0, result.output
+            assert 'Done exporting!' in result.output
+
+            result = runner.invoke(args=['data', 'import', str(tmp_path / 'export')])
+            assert result.exit_code == 1
+            assert 'not empty' in result.output
+
+            (tmp_path / 'export' / 'manifest.json').unlink()
+            result = runner.invoke(args=['data', 'import', str(tmp_path / 'export'), '--resume'])
+            assert result.exit_code == 1
+            assert 'incomplete' in result.output
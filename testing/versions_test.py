@@ -0,0 +1,90 @@
+from datetime import timedelta, timezone
+
+from sqlalchemy import update
+from werkzeug.http import http_date
+
+import versions
+from app import app
+from models import db, TableVersion
+
+
+class TestConditionalRequests:
+    '''ETag and Last-Modified handling in versions.py'''
+
+    def test_returns_304_for_matching_etag(self, assert_num_queries, monkeypatch):
+        '''Answers a matching If-None-Match with 304 and no queries.'''
+
+        with app.app_context():
+            later = versions.current_second() + timedelta(minutes=1)
+            monkeypatch.setattr(versions, 'current_second', lambda: later)
+            client = app.test_client()
+            response = client.get('/powers')
+            etag = response.headers['ETag']
+            assert response.headers['Last-Modified']
+
+            with assert_num_queries(0):
+                response = client.get('/powers', headers={'If-None-Match': etag})
+            assert response.status_code == 304
+            assert response.data == b''
+            assert response.headers['ETag'] == etag
+
+    def test_write_changes_etag(self, factory):
+        '''Bumps the table version and the ETag when a power is written.'''
+
+        with app.app_context():
+            client = app.test_client()
+            etag = client.get('/powers').headers['ETag']
+            version = db.session.get(TableVersion, 'powers').version
+
+            factory.power()
+
+            assert db.session.get(TableVersion, 'powers').version == version + 1
+            response = client.get('/powers', headers={'If-None-Match': etag})
+            assert response.status_code == 200
+            assert response.headers['ETag'] != etag
+
+    def test_etag_depends_on_query(self):
+        '''Gives different query strings different ETags.'''
+
+        with app.app_context():
+            client = app.test_client()
+            assert client.get('/heroes').headers['ETag'] != client.get('/heroes?limit=1').headers['ETag']
+
+    def test_honours_if_modified_since(self, monkeypatch):
+        '''Answers an If-Modified-Since at or after Last-Modified with 304.'''
+
+        with app.app_context():
+            # Past the second of any write made by earlier tests
+            later = versions.current_second() + timedelta(minutes=1)
+            monkeypatch.setattr(versions, 'current_second', lambda: later)
+            client = app.test_client()
+            modified = client.get('/heroes').headers['Last-Modified']
+
+            response = client.get('/heroes', headers={'If-Modified-Since': modified})
+            assert response.status_code == 304
+
+    def test_same_second_writes_are_modified(self, monkeypatch, factory):
+        '''Sends no Last-Modified while a write in the same second could still follow.'''
+
+        with app.app_context():
+            client = app.test_client()
+            factory.power()
+            written = db.session.get(TableVersion, 'powers').updated_at
+            second = written.replace(tzinfo=timezone.utc)
+            monkeypatch.setattr(versions, 'current_second', lambda: second)
+
+            assert 'Last-Modified' not in client.get('/powers').headers
+
+            # A second write in the same second leaves updated_at unchanged
+            factory.power()
+            db.session.execute(update(TableVersion).where(TableVersion.table_name == 'powers')
+                               .values(updated_at=written))
+            db.session.commit()
+
+            response = client.get('/powers', headers={'If-Modified-Since': http_date(second)})
+            assert response.status_code == 200
+            assert 'Last-Modified' not in response.headers
+
+            monkeypatch.setattr(versions, 'current_second', lambda: second + timedelta(seconds=1))
+            response = client.get('/powers', headers={'If-Modified-Since': http_date(second)})
+            assert response.status_code == 304
@@ -0,0 +1,75 @@
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Sentinel for "some unknown set of rows in this table changed"
+ALL_ROWS = None
+
+# Tables each read resource is built from
+RESOURCE_TABLES = {
+    'heroes': ('heroes', 'hero_powers', 'powers'),
+    'powers': ('powers',),
+    # /powers filtered by hero_id or strength
+    'filtered_powers': ('powers', 'hero_powers'),
+    'hero_powers': ('hero_powers', 'heroes', 'powers'),
+    'stats': ('heroes', 'powers', 'hero_powers'),
+}
+
+_commit_listeners = []
+
+
+def on_commit(listener):
+    """Register ``listener(changes)`` to run after every commit that wrote rows.
+
+    ``changes`` maps table names to the set of primary keys written in the
+    transaction, or to ``ALL_ROWS`` when the rows are not known (bulk
+    statements). Listeners run after the commit, so they must not use the
+    session.
+    """
+    _commit_listeners.append(listener)
+    return listener
+
+def pending_changes(session):
+    return session.info.setdefault('changes', {})
+
+def changed_tables(session):
+    """Names of the tables written so far in the session's transaction,
+    including objects that are still waiting to be flushed."""
+    tables = set(pending_changes(session))
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, '__table__', None)
+        if table is not None:
+            tables.add(table.name)
+    return tables
+
+def record(session, table_name, ids=ALL_ROWS):
+    changes = pending_changes(session)
+    if ids is ALL_ROWS:
+        changes[table_name] = ALL_ROWS
+    elif changes.get(table_name, set()) is not ALL_ROWS:
+        changes.setdefault(table_name, set()).update(ids)
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flush(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, '__table__', None)
+        if table is not None:
+            record(session, table.name, {obj.id})
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        record(orm_execute_state.session, orm_execute_state.statement.table.name)
+
+@event.listens_for(Session, 'after_commit')
+def _notify_commit(session):
+    changes = session.info.pop('changes', None)
+    if changes:
+        for listener in _commit_listeners:
+            listener(changes)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('changes', None)
@@ -0,0 +1,254 @@
+import importlib.util
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, insert, select, text
+
+from encoding import dumps
+from models import db
+from readmodel import read_model
+from seeding import chunked
+
+# Default settings
+DEFAULT_BATCH_SIZE = 10000
+
+# Exported tables in foreign key order: each only references the ones before it
+TABLES = ('powers', 'heroes', 'hero_powers')
+
+FORMATS = ('ndjson', 'arrow', 'parquet')
+MANIFEST = 'manifest.json'
+
+
+def arrow():
+    # Imported on first use, since pyarrow adds tens of milliseconds to every start
+    import pyarrow.ipc
+    import pyarrow.parquet
+    return pyarrow
+
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise click.UsageError(f"format must be one of {', '.join(FORMATS)}")
+    if fmt != 'ndjson' and importlib.util.find_spec('pyarrow') is None:
+        raise click.UsageError(f"The {fmt} format needs the pyarrow package")
+
+def arrow_schema(table):
+    pyarrow = arrow()
+    types = {int: pyarrow.int64(), str: pyarrow.string(), bytes: pyarrow.binary(), datetime: pyarrow.timestamp('us')}
+    return pyarrow.schema([pyarrow.field(column.name, types[column.type.python_type], nullable=column.nullable)
+                           for column in table.columns])
+
+@contextmanager
+def replaced(path):
+    """Write to a temporary file that only replaces ``path`` once complete."""
+    partial = f'{path}.partial'
+    try:
+        yield partial
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+
+# Writers take batches of rows as tuples in column order and return the row count
+
+def write_ndjson(path, table, batches):
+    names = table.columns.keys()
+    count = 0
+    with open(path, 'wb') as f:
+        for rows in batches:
+            f.write(b''.join(dumps(dict(zip(names, row)), sort_keys=False) + b'\n' for row in rows))
+            count += len(rows)
+    return count
+
+def write_arrow(path, table, batches, writer_class=None):
+    pyarrow = arrow()
+    schema = arrow_schema(table)
+    count = 0
+    with (writer_class or pyarrow.ipc.new_file)(path, schema) as writer:
+        for rows in batches:
+            columns = zip(*rows)
+            writer.write_batch(pyarrow.record_batch(
+                [pyarrow.array(values, field.type) for values, field in zip(columns, schema)], schema=schema))
+            count += len(rows)
+    return count
+
+def write_parquet(path, table, batches):
+    return write_arrow(path, table, batches, arrow().parquet.ParquetWriter)
+
+WRITERS = {'ndjson': write_ndjson, 'arrow': write_arrow, 'parquet': write_parquet}
+
+
+# Readers yield batches of rows as dicts, in file order
+
+def read_ndjson(path, batch_size):
+    with open(path, 'rb') as f:
+        yield from chunked((json.loads(line) for line in f if line.strip()), batch_size)
+
+def read_arrow(path, batch_size):
+    pyarrow = arrow()
+    with pyarrow.memory_map(path) as source:
+        reader = pyarrow.ipc.open_file(source)
+        for index in range(reader.num_record_batches):
+            rows = reader.get_batch(index).to_pylist()
+            for offset in range(0, len(rows), batch_size):
+                yield rows[offset:offset + batch_size]
+
+def read_parquet(path, batch_size):
+    for batch in arrow().parquet.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield batch.to_pylist()
+
+READERS = {'ndjson': read_ndjson, 'arrow': read_arrow, 'parquet': read_parquet}
+
+
+def schema_revision():
+    try:
+        return db.session.scalar(text('SELECT version_num FROM alembic_version'))
+    except Exception:
+        db.session.rollback()
+        return None
+
+def export_tables(directory, fmt='ndjson', batch_size=DEFAULT_BATCH_SIZE, echo=print):
+    """Write every table of TABLES to ``directory``; return rows per table.
+
+    Rows stream from a server-side cursor ``batch_size`` at a time, so memory
+    stays flat whatever the table size. All tables are read in one
+    transaction, giving a consistent snapshot. The manifest is written last:
+    a directory without one holds an incomplete export.
+    """
+    check_format(fmt)
+    os.makedirs(directory, exist_ok=True)
+    manifest = {'format': fmt, 'revision': schema_revision(),
+                'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'tables': {}}
+    started = time.perf_counter()
+    try:
+        for name in TABLES:
+            table = db.metadata.tables[name]
+            filename = f'{name}.{fmt}'
+            table_started = time.perf_counter()
+            result = db.session.execute(select(table).order_by(table.c.id).execution_options(yield_per=batch_size))
+            with replaced(os.path.join(directory, filename)) as path:
+                count = WRITERS[fmt](path, table, result.partitions())
+            elapsed = time.perf_counter() - table_started
+            echo(f"Exported {count} {name} in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} rows/sec)")
+            manifest['tables'][name] = {'file': filename, 'rows': count, 'columns': table.columns.keys()}
+    finally:
+        db.session.rollback()
+
+    with replaced(os.path.join(directory, MANIFEST)) as path:
+        with open(path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    total = sum(table['rows'] for table in manifest['tables'].values())
+    echo(f"Done exporting! {total} rows in {time.perf_counter() - started:.2f}s")
+    return {name: table['rows'] for name, table in manifest['tables'].items()}
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        raise click.ClickException(f"{directory} holds no {MANIFEST}; the export is missing or incomplete")
+    with open(path) as f:
+        manifest = json.load(f)
+    check_format(manifest['format'])
+    for name in TABLES:
+        columns = manifest['tables'].get(name, {}).get('columns')
+        if columns != db.metadata.tables[name].columns.keys():
+            raise click.ClickException(f"The {name} columns of the export do not match this schema")
+    return manifest
+
+def imported_up_to(table):
+    return db.session.scalar(select(func.max(table.c.id))) or 0
+
+def reset_sequences():
+    # SQLite picks new ids after the largest one; PostgreSQL sequences must be moved
+    if db.engine.dialect.name == 'postgresql':
+        for name in TABLES:
+            db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                                    f"(SELECT coalesce(max(id), 1) FROM {name}))"))
+        db.session.commit()
+
+def import_tables(directory, chunk_size=DEFAULT_BATCH_SIZE, resume=False, replace=False, echo=print):
+    """Load an export from ``directory`` in foreign key order; return rows inserted per table.
+
+    Every chunk commits on its own, so an interrupted import keeps what it
+    loaded. With ``resume`` it continues after the largest id already in
+    each table, which is exact since exports are written in id order.
+    Without it the tables must be empty, or are cleared first with
+    ``replace``.
+    """
+    manifest = read_manifest(directory)
+    tables = [db.metadata.tables[name] for name in TABLES]
+    if replace:
+        echo("Clearing tables...")
+        for table in reversed(tables):
+            db.session.execute(delete(table))
+        db.session.commit()
+    elif not resume and any(imported_up_to(table) for table in tables):
+        raise click.ClickException("The tables are not empty; pass --replace to clear them or --resume to continue")
+
+    counts = {}
+    started = time.perf_counter()
+    # Documents of imported heroes would be recomputed on every chunk commit;
+    # those heroes are served live until `flask documents rebuild` instead
+    enabled, read_model.enabled = read_model.enabled, False
+    try:
+        for table in tables:
+            entry = manifest['tables'][table.name]
+            after = imported_up_to(table) if resume else 0
+            total, count, done = entry['rows'], 0, 0
+            table_started = time.perf_counter()
+            batches = READERS[manifest['format']](os.path.join(directory, entry['file']), chunk_size)
+            for rows in batches:
+                done += len(rows)
+                if after:
+                    if rows[-1]['id'] <= after:
+                        continue
+                    rows = [row for row in rows if row['id'] > after]
+                db.session.execute(insert(table), rows)
+                db.session.commit()
+                count += len(rows)
+                echo(f"  {table.name}: {done}/{total} rows ({done / max(total, 1):.0%})")
+            counts[table.name] = count
+            elapsed = time.perf_counter() - table_started
+            echo(f"Imported {count} {table.name} in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} rows/sec)")
+    except BaseException:
+        db.session.rollback()
+        raise
+    finally:
+        read_model.enabled = enabled
+
+    reset_sequences()
+    total = sum(counts.values())
+    echo(f"Done importing! {total} rows in {time.perf_counter() - started:.2f}s")
+    return counts
+
+
+data_cli = AppGroup('data', help="Export and import the heroes, powers and hero_powers tables.")
+
+@data_cli.command('export')
+@click.argument('directory', type=click.Path(file_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='ndjson', show_default=True,
+              help="File format; arrow and parquet need pyarrow.")
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help="Rows fetched per batch.")
+def export_command(directory, fmt, batch_size):
+    """Stream every table to DIRECTORY."""
+    export_tables(directory, fmt, batch_size, echo=click.echo)
+
+@data_cli.command('import')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--chunk-size', default=DEFAULT_BATCH_SIZE, show_default=True, help="Rows per insert and commit.")
+@click.option('--resume', is_flag=True, help="Continue an interrupted import after the rows already loaded.")
+@click.option('--replace', is_flag=True, help="Clear the tables before loading.")
+def import_command(directory, chunk_size, resume, replace):
+    """Load an export from DIRECTORY in chunks."""
+    if resume and replace:
+        raise click.UsageError("--resume and --replace cannot be combined")
+    import_tables(directory, chunk_size, resume, replace, echo=click.echo)
+    click.echo("Run `flask documents rebuild` to precompute the imported hero documents.")
+
+def init_app(app):
+    app.cli.add_command(data_cli)
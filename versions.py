@@ -0,0 +1,155 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, request
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+
+import routing
+from models import db, TableVersion, VERSIONED_TABLES
+from pagination import stream_format
+from tracking import RESOURCE_TABLES, changed_tables, on_commit
+
+# Default settings, overridable through app.config
+DEFAULT_VERSION_TTL = 1.0
+
+
+@event.listens_for(Session, 'before_commit')
+def bump_versions(session):
+    """Bump the version row of every table written in this transaction.
+
+    Runs inside the transaction, so the new versions commit atomically with
+    the rows they describe.
+    """
+    tables = sorted(changed_tables(session).intersection(VERSIONED_TABLES))
+    if tables:
+        session.execute(
+            update(TableVersion)
+            .where(TableVersion.table_name.in_(tables))
+            .values(version=TableVersion.version + 1, updated_at=func.current_timestamp())
+        )
+
+
+class VersionSnapshot:
+    """Process-local copy of ``table_versions``.
+
+    Reloaded after local commits and at most ``ttl`` seconds after the last
+    load, which bounds how long writes from other processes go unnoticed.
+    One copy is kept per read source, so ETags match the data a request
+    reads, whether from the primary or a replica.
+    """
+
+    def __init__(self, ttl=DEFAULT_VERSION_TTL):
+        self.ttl = ttl
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def get(self):
+        source = routing.source()
+        with self._lock:
+            versions, expires = self._snapshots.get(source, (None, 0))
+            if versions is not None and time.monotonic() < expires:
+                return versions
+        rows = db.session.execute(
+            select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+        ).all()
+        versions = {name: (version, updated_at) for name, version, updated_at in rows}
+        with self._lock:
+            self._snapshots[source] = (versions, time.monotonic() + self.ttl)
+        return versions
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshots.clear()
+
+
+version_snapshot = VersionSnapshot()
+
+@on_commit
+def invalidate_snapshot(changes):
+    version_snapshot.invalidate()
+
+
+def version_key(resource):
+    """The snapshot's versions of the tables behind ``resource``.
+
+    Part of the response cache and coalescing keys, so a body read before
+    another worker's commit is never sent with the ETag of the versions
+    after it: once the snapshot reloads, the request misses and reads anew.
+    """
+    versions = version_snapshot.get()
+    return tuple(versions.get(table_name, (0, None))[0] for table_name in RESOURCE_TABLES[resource])
+
+def entity_tag(resource, versions):
+    """Strong ETag of the current representation of a GET on ``resource``."""
+    parts = [request.path, request.query_string.decode(), stream_format() or '']
+    for table_name in RESOURCE_TABLES[resource]:
+        parts.append(f'{table_name}:{versions.get(table_name, (0, None))[0]}')
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:32]
+
+def last_modified(resource, versions):
+    stamps = [versions[name][1] for name in RESOURCE_TABLES[resource]
+              if name in versions and versions[name][1] is not None]
+    return max(stamps).replace(tzinfo=timezone.utc) if stamps else None
+
+def current_second():
+    return datetime.now(timezone.utc).replace(microsecond=0)
+
+def settled(modified):
+    """Whether no later write can still share the Last-Modified ``modified``.
+
+    ``updated_at`` has whole-second resolution, so a second write in the same
+    second leaves it unchanged. Until that second is over the date is neither
+    sent nor compared, and clients revalidate by ETag alone.
+    """
+    return modified is not None and modified.replace(microsecond=0) < current_second()
+
+def set_last_modified(response, modified):
+    # Werkzeug writes the current time for None
+    if modified is not None:
+        response.last_modified = modified
+
+def not_modified(etag, modified):
+    response = Response(status=304)
+    response.set_etag(etag)
+    set_last_modified(response, modified)
+    return response
+
+def conditional(resource):
+    """Answer If-None-Match / If-Modified-Since with 304 before running the view.
+
+    ``resource`` is a key of RESOURCE_TABLES, or a function returning the key
+    for the current request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            name = resource() if callable(resource) else resource
+            versions = version_snapshot.get()
+            etag = entity_tag(name, versions)
+            modified = last_modified(name, versions)
+            if not settled(modified):
+                modified = None
+
+            # If-Modified-Since is only consulted without If-None-Match, which
+            # compares weakly since compressed responses carry a weak ETag
+            if request.if_none_match:
+                if request.if_none_match.contains_weak(etag):
+                    return not_modified(etag, modified)
+            elif modified and request.if_modified_since and modified.replace(microsecond=0) <= request.if_modified_since:
+                return not_modified(etag, modified)
+
+            response = view(*args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                response.set_etag(etag)
+                set_last_modified(response, modified)
+            return response
+        return wrapper
+    return decorator
+
+def init_app(app):
+    version_snapshot.ttl = app.config.get('VERSION_SNAPSHOT_TTL', DEFAULT_VERSION_TTL)
+    version_snapshot.invalidate()